@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Return analytics of the holdings of a portfolio.
+
+The functions work on dates x holdings arrays, so every holding (and the total of
+the portfolio) is computed in the same vectorized call:
+
+    * timeWeightedReturns: cumulative time weighted return, chaining the daily
+      returns net of the cash flows, so that buying or selling does not move it.
+    * xirr: money weighted return (annualized internal rate of return) of cash
+      flows on arbitrary dates, solved for all the holdings at once by Newton
+      iterations kept inside a bracket of the root, falling back to bisection
+      when a Newton step leaves the bracket. irr is the same for periodic flows.
+
+Cash flows are seen from the holding: purchases (with commissions) and deposits
+are positive, sales and dividends paid out are negative. cashFlows builds them
+from a Valuation of ValuationEngine and FACT_TRANSACTIONS, sales and deposits
+(transactions giving nothing up) being valued at the price and rate of the
+valuation on their date.
+
+Created on Sun Oct 18 2026
+"""
+
+import numpy as np
+import pandas as pd
+import utils
+
+###############
+## Constants ##
+###############
+DAYS_PER_YEAR = 365.0
+MIN_RATE = -0.999999    # bracket of the rates searched by xirr
+MAX_RATE = 1e6
+TOLERANCE = 1e-10       # relative to the sum of the absolute cash flows
+MIN_VALUE = 1e-6        # smaller values (rounding residues of the holdings) count as 0
+MAX_ITERATIONS = 200
+
+# Dates x holdings matrix of the cash flows into the holdings of the valuation, in
+# the reporting currency: purchases with commissions (from the amounts spent) and
+# deposits less sales and dividends. The flows of the first date are part of its
+# value and are left out, as are the flows of the dates a holding has no price.
+def cashFlows(database, valuation):
+    db = database
+    dates = valuation.dates
+    flows = np.zeros_like(valuation.value)
+    if len(dates) < 2:
+        return flows
+    flows[1:] = np.diff(valuation.spent, axis = 0) - np.diff(valuation.dividends, axis = 0)
+    tickers = list(valuation.tickers)
+    startDate, endDate = str(dates[1]) + " 00:00:00", str(dates[-1]) + " 23:59:59"
+    sold = db.getTransactions(tickers, startDate, endDate, direction = "SOLD")
+    bought = db.getTransactions(tickers, startDate, endDate, direction = "BOUGHT")
+    # Deposits cost nothing in the amounts spent
+    deposits = bought[bought[db.QUANTITY_SOLD].fillna(0) == 0]
+    quantities = _quantityMatrix(sold, db.INSTRUMENT_SOLD, -sold[db.QUANTITY_SOLD].values, db.DATE, dates, tickers) \
+        + _quantityMatrix(deposits, db.INSTRUMENT_BOUGHT, deposits[db.QUANTITY_BOUGHT].values, db.DATE, dates, tickers)
+    flows += np.nan_to_num(quantities * valuation.prices * valuation.fx)
+    # Holdings without a price or rate yet are worth 0, so are their flows
+    return np.where(np.isfinite(valuation.prices * valuation.fx), flows, 0.0)
+
+# Dates x tickers matrix of the quantities of the transactions, summed by date
+def _quantityMatrix(transactions, instrumentColumn, quantities, dateColumn, dates, tickers):
+    matrix = np.zeros((len(dates), len(tickers)))
+    if not transactions.empty:
+        rows = (utils.toDays(transactions[dateColumn].values) - dates[0]).astype(int)
+        columns = transactions[instrumentColumn].map({ticker: i for i, ticker in enumerate(tickers)}).values.astype(int)
+        np.add.at(matrix, (rows, columns), np.asarray(quantities, dtype = float))
+    return matrix
+
+# Cumulative time weighted return on each date, from the values at the end of each
+# day and the cash flows of each day (1-D for one holding or dates x holdings).
+# Days starting from a value of 0 (below MIN_VALUE) have a return of 0.
+def timeWeightedReturns(values, flows):
+    values = np.asarray(values, dtype = float)
+    flows = np.asarray(flows, dtype = float)
+    growth = np.ones_like(values)
+    previous = values[:-1]
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        growth[1:] = np.where(np.abs(previous) > MIN_VALUE, (values[1:] - flows[1:]) / previous, 1.0)
+    return np.cumprod(growth, axis = 0) - 1
+
+# Annualized internal rate of return of the cash flows (dates x holdings, or 1-D for
+# one holding) on the days (datetime64[D] or anything utils.toDays reads). All the
+# holdings are solved together. NaN where the flows do not change sign.
+def xirr(flows, days):
+    days = utils.toDays(days)
+    years = (days - days[0]).astype(float) / DAYS_PER_YEAR
+    return _solveRates(flows, years)
+
+# Internal rate of return per period of cash flows at regular periods (periods x
+# holdings, or 1-D for one holding)
+def irr(flows):
+    flows = np.asarray(flows, dtype = float)
+    return _solveRates(flows, np.arange(flows.shape[0], dtype = float))
+
+# Net present value of the flows at the rates and its derivative, one per column
+def _presentValue(rates, flows, times):
+    discount = (1 + rates) ** -times[:, np.newaxis]
+    presentValue = (flows * discount).sum(axis = 0)
+    derivative = -(times[:, np.newaxis] * flows * discount).sum(axis = 0) / (1 + rates)
+    return presentValue, derivative
+
+# Rates zeroing the present value of each column of flows at the times (in periods)
+def _solveRates(flows, times):
+    flows = np.asarray(flows, dtype = float)
+    single = flows.ndim == 1
+    flows = np.nan_to_num(flows.reshape(len(times), -1))
+    holdings = flows.shape[1]
+    low = np.full(holdings, MIN_RATE)
+    high = np.full(holdings, MAX_RATE)
+    with np.errstate(over = "ignore", divide = "ignore", invalid = "ignore"):
+        lowValue, _ = _presentValue(low, flows, times)
+        highValue, _ = _presentValue(high, flows, times)
+        rates = np.full(holdings, np.nan)
+        solvable = np.sign(lowValue) * np.sign(highValue) < 0
+        active = solvable.copy()
+        rates[solvable] = 0.1
+        scale = np.abs(flows).sum(axis = 0)
+        for _ in range(MAX_ITERATIONS):
+            if not active.any():
+                break
+            columns = np.flatnonzero(active)
+            value, derivative = _presentValue(rates[columns], flows[:, columns], times)
+            converged = np.abs(value) <= TOLERANCE * scale[columns]
+            active[columns[converged]] = False
+            # Keep the root between low and high
+            belowRoot = np.sign(value) == np.sign(lowValue[columns])
+            low[columns] = np.where(belowRoot, rates[columns], low[columns])
+            lowValue[columns] = np.where(belowRoot, value, lowValue[columns])
+            high[columns] = np.where(belowRoot, high[columns], rates[columns])
+            # Newton step, bisection (of the logarithm of 1 + rate) when it leaves the bracket
+            step = rates[columns] - value / derivative
+            bisection = np.exp((np.log1p(low[columns]) + np.log1p(high[columns])) / 2) - 1
+            outside = ~np.isfinite(step) | (step <= low[columns]) | (step >= high[columns])
+            nextRates = np.where(outside, bisection, step)
+            rates[columns] = np.where(converged, rates[columns], nextRates)
+            # Bracket narrower than the precision of the rates
+            collapsed = (high[columns] - low[columns]) <= TOLERANCE * (1 + np.abs(rates[columns]))
+            active[columns[collapsed]] = False
+    return rates[0] if single else rates
+
+# Dataframe with, for each holding of the valuation and for their total (utils.PORTFOLIO),
+# the time weighted return over the valuation range, its annualized value and the
+# money weighted return (XIRR, annualized). flows are the cash flows of cashFlows.
+def returnsSummary(valuation, flows):
+    values = np.column_stack([valuation.value, valuation.value.sum(axis = 1)])
+    flows = np.column_stack([flows, flows.sum(axis = 1)])
+    years = (valuation.dates[-1] - valuation.dates[0]).astype(float) / DAYS_PER_YEAR
+    twr = timeWeightedReturns(values, flows)[-1]
+    # The holding is bought at its first value and sold at its last one
+    investorFlows = -flows
+    investorFlows[0] = -values[0]
+    investorFlows[-1] += values[-1]
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        annualized = (1 + twr) ** (1 / years) - 1 if years > 0 else np.full_like(twr, np.nan)
+    return pd.DataFrame({"Stock Code": list(valuation.tickers) + [utils.PORTFOLIO],
+                         "TWR": twr,
+                         "TWR annualized": annualized,
+                         "XIRR": xirr(investorFlows, valuation.dates)})
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the portfolio tracker.
+
+Generates synthetic databases (SyntheticData.py) at several scales and times
+Stock.update, every Stock.*Range method, Portfolio.getValue, Portfolio.valuePath
+and the data preparation of Portfolio.plotPortfolio. Each timing is the fastest of
+REPEAT runs after one warm-up run, the least affected by the load of the machine.
+
+Each timing is divided by the time of a fixed numpy and pandas reference workload,
+run alternately with the benchmark, so that the ratios depend neither on the
+speed of the machine nor on its load during the run. The ratios can be saved as
+baselines (BenchmarkBaseline.json) and are compared with them: a benchmark slower
+than its baseline ratio by more than THRESHOLD is reported as a regression and
+the script exits with status 1.
+
+With --profile the sql queries are recorded by the QueryProfiler and summarized
+at the end, the timings are then not comparable with the baselines.
+
+Usage: python Benchmark.py [--scales small,medium] [--save] [--threshold 0.25] [--profile]
+
+Created on Sun Oct 18 2026
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import utils
+import SyntheticData
+from Stock import Stock
+from PortfolioTracker import Portfolio
+from PriceStore import PRICE_STORE
+from QueryProfiler import QUERY_PROFILER
+
+###############
+## Constants ##
+###############
+# scale -> (instruments, years of daily prices, transactions)
+SCALES = {"small": (10, 2, 200),
+          "medium": (50, 5, 2000),
+          "large": (200, 10, 20000)}
+DEFAULT_SCALES = ["small", "medium"]
+REPEAT = 7
+STOCKS_SAMPLE = 5               # stocks timed by the Stock benchmarks
+THRESHOLD = 0.25                # allowed slowdown over the baseline
+MIN_REGRESSION_SECONDS = 0.01   # slowdowns smaller than this are timing noise
+REFERENCE_SIZE = 50000          # rows of the reference workload
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "BenchmarkBaseline.json")
+RANGE_METHODS = ["getPriceRange", "getPositionsRange", "getOwnedRange", "getSoldRange", "getBoughtRange",
+                 "getPricePaidRange", "getCommissionsRange", "getSpentRange", "getValueRange",
+                 "getDividendRange", "Profits_LossesRange"]
+
+# Fastest time in seconds of REPEAT calls of function and median ratio of the time of
+# each call to the time of the reference workload run just before it, after a
+# warm-up call of each
+def timeit(function):
+    times = {function: [], referenceWorkload: []}
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+        referenceWorkload()
+        # As timeit, without the pauses of the garbage collector
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(REPEAT):
+                for timed in times:
+                    started = time.perf_counter()
+                    timed()
+                    times[timed].append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+    return min(times[function]), float(np.median(np.divide(times[function], times[referenceWorkload])))
+
+# Fixed workload of the kind of work done by the benchmarks (sorting, grouping,
+# cumulative sums and merges of dataframes), the unit of the baseline ratios
+def referenceWorkload():
+    random = np.random.default_rng(0)
+    values = random.random(REFERENCE_SIZE)
+    frame = pd.DataFrame({"KEY": (values * 1000).astype(int), "VALUE": values})
+    frame["CUMSUM"] = frame.groupby("KEY")["VALUE"].cumsum()
+    pd.merge(frame, frame.drop_duplicates("KEY"), how = "left", on = "KEY")
+    np.sort(values)
+
+# Runs the benchmarks on a synthetic database of the scale created in directory.
+# Returns a dictionary benchmark name -> (seconds, ratio to the reference workload).
+def runScale(scale, directory):
+    instruments, years, transactions = SCALES[scale]
+    name = os.path.join(directory, scale)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tickers = SyntheticData.generate(name + ".db", instruments, years, transactions)
+        portfolio = Portfolio(name)
+        # Whole percentages, so that they sum to exactly 100
+        for i, ticker in enumerate(tickers):
+            portfolio.addStock(ticker, 100 // len(tickers) + (i < 100 % len(tickers)), updateData = False)
+    database = portfolio.stockDatabase
+    startDate = str(utils.toDays(utils.DEFAULT_DATE) - int(365.25 * years)) + " 00:00:00"
+    sample = tickers[:STOCKS_SAMPLE]
+
+    # Fresh objects, so that the cached events of the stocks are rebuilt
+    def update():
+        for ticker in sample:
+            Stock(ticker, database, updateData = False).update()
+
+    results = {"Stock.update": timeit(update)}
+    stocks = [Stock(ticker, database, updateData = False) for ticker in sample]
+    for method in RANGE_METHODS:
+        results["Stock." + method] = timeit(lambda: [getattr(stock, method)(startDate) for stock in stocks])
+    results["Portfolio.getValue"] = timeit(portfolio.getValue)
+    results["Portfolio.valuePath"] = timeit(lambda: (portfolio.getCurrentPercentages(),
+                                                     portfolio.valuePath(10000, False, 500)))
+    # plotPortfolio without the drawing
+    results["Portfolio.plotPortfolio data"] = timeit(lambda: portfolio.getValuation(startDate).totals())
+    database.close()
+    PRICE_STORE.invalidate(database.databasePath)
+    return results
+
+def loadBaseline(path = BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+# Ratios of the timings of runScale to the time of the reference workload
+def toRatios(results):
+    return {name: ratio for name, (_, ratio) in results.items()}
+
+# Prints the timings and their ratios next to the baseline ratios and returns the regressions
+def compare(scale, results, baseline, threshold = THRESHOLD):
+    regressions = []
+    print("\n{} {}".format(scale, SCALES[scale]))
+    print("{:<36}{:>12}{:>10}{:>10}{:>9}".format("benchmark", "ms", "ratio", "baseline", "change"))
+    for name, (seconds, ratio) in results.items():
+        baselineRatio = baseline.get(scale, {}).get(name)
+        if baselineRatio is None:
+            print("{:<36}{:>12.2f}{:>10.3f}{:>10}{:>9}".format(name, 1000 * seconds, ratio, "-", "-"))
+            continue
+        change = ratio / baselineRatio - 1 if baselineRatio else np.inf
+        regression = change > threshold and seconds * change / (1 + change) > MIN_REGRESSION_SECONDS
+        print("{:<36}{:>12.2f}{:>10.3f}{:>10.3f}{:>8.0f}%{}".format(name, 1000 * seconds, ratio, baselineRatio,
+                                                                   100 * change, "  REGRESSION" if regression else ""))
+        if regression:
+            regressions.append((scale, name))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark suite of the portfolio tracker.")
+    parser.add_argument("--scales", default = ",".join(DEFAULT_SCALES),
+                        help = "comma separated scales among {}".format(", ".join(SCALES)))
+    parser.add_argument("--save", action = "store_true", help = "save the ratios as the new baselines")
+    parser.add_argument("--threshold", type = float, default = THRESHOLD, help = "allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--baseline", default = BASELINE_PATH, help = "baseline file")
+    parser.add_argument("--profile", action = "store_true", help = "summarize the sql queries run by the benchmarks")
+    arguments = parser.parse_args()
+    if arguments.profile:
+        QUERY_PROFILER.enable()
+
+    baseline = loadBaseline(arguments.baseline)
+    regressions = []
+    directory = tempfile.mkdtemp()
+    try:
+        for scale in arguments.scales.split(","):
+            results = runScale(scale, directory)
+            regressions += compare(scale, results, baseline, arguments.threshold)
+            if arguments.save:
+                baseline[scale] = toRatios(results)
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+
+    if arguments.save:
+        with open(arguments.baseline, "w") as file:
+            json.dump(baseline, file, indent = 2, sort_keys = True)
+        print("\nBaselines saved to {}.".format(arguments.baseline))
+    elif regressions:
+        print("\n{} regression(s) over {:.0f}%.".format(len(regressions), 100 * arguments.threshold))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Batch import of Interactive Brokers trades into FACT_TRANSACTIONS.
+
+Reads the Trades section of an activity statement exported as csv, or a Flex
+query exported as csv, as a stream of chunks of CHUNK_SIZE rows, so that files
+larger than memory can be imported. For each chunk the rows are validated and
+converted with vectorized operations, the trades already in FACT_TRANSACTIONS are
+skipped, and the new ones are written. The whole file is imported in a single
+transaction and the positions, risk metrics and snapshot are brought up to date
+once at the end (see PortfolioDB.afterWrite).
+
+A buy of quantity q of an instrument for proceeds p in currency c is recorded as
+INSTRUMENT_BOUGHT = instrument, QUANTITY_BOUGHT = q, INSTRUMENT_SOLD = c,
+QUANTITY_SOLD = -p (and the reverse for a sell). Forex trades (e.g. EUR.USD)
+buy or sell the base currency against the quote currency. Commissions are
+converted to the COMMISSION_CURRENCY of the database.
+
+Created on Sun Oct 18 2026
+"""
+
+import csv
+import time
+from collections import Counter
+import numpy as np
+import pandas as pd
+import utils
+from Database import Database
+
+###############
+## Constants ##
+###############
+CHUNK_SIZE = 50000 # rows read, validated and written at a time
+
+# Normalized columns of a trade
+ASSET = "ASSET"
+CURRENCY = "CURRENCY"
+SYMBOL = "SYMBOL"
+DATE = "DATE"
+QUANTITY = "QUANTITY"
+PROCEEDS = "PROCEEDS"
+COMMISSION = "COMMISSION"
+COMMISSION_CURRENCY = "COMMISSION_CURRENCY"
+TRADE_COLUMNS = [ASSET, CURRENCY, SYMBOL, DATE, QUANTITY, PROCEEDS, COMMISSION, COMMISSION_CURRENCY]
+
+# Columns of the Trades section of an activity statement, and of a Flex query
+ACTIVITY_COLUMNS = {"Asset Category": ASSET, "Currency": CURRENCY, "Symbol": SYMBOL, "Date/Time": DATE,
+                    "Quantity": QUANTITY, "Proceeds": PROCEEDS, "Comm/Fee": COMMISSION}
+FLEX_COLUMNS = {"AssetClass": ASSET, "CurrencyPrimary": CURRENCY, "Symbol": SYMBOL, "TradeDate": DATE,
+                "Quantity": QUANTITY, "Proceeds": PROCEEDS, "IBCommission": COMMISSION,
+                "IBCommissionCurrency": COMMISSION_CURRENCY}
+# DataDiscriminator of the rows of the activity statement that are single orders
+# (the others are closed lots)
+ACTIVITY_ORDERS = ("Order", "Trade", "")
+FOREX_ASSETS = ("Forex", "CASH")
+
+class IBImporter:
+    # Class initializer
+    def __init__(self, database, chunkSize = CHUNK_SIZE):
+        self.database = database
+        self.chunkSize = chunkSize
+
+    # Imports the trades of the csv file at path. Returns a report with the number of
+    # rows read, added, already in the database and rejected (by reason), and the speed.
+    def importFile(self, path):
+        db = self.database
+        started = time.perf_counter()
+        tickers = set(db.readDatabase("SELECT {} FROM {}".format(db.IB_TICKER, db.STOCKS_TABLE_NAME))[db.IB_TICKER])
+        report = {"rowsRead": 0, "rowsAdded": 0, "duplicates": 0, "rejected": Counter()}
+        seen = Counter()      # trades of the file in the previous chunks, by key
+        inserted = Counter()  # trades written by the previous chunks, by key
+        instruments = set()
+        minDate = None
+
+        with db.transaction():
+            for trades in self._readChunks(path):
+                report["rowsRead"] += len(trades)
+                transactions, rejected = self._toTransactions(trades, tickers)
+                report["rejected"].update(rejected)
+                if transactions.empty:
+                    continue
+                transactions = self._newTransactions(transactions, seen, inserted)
+                report["duplicates"] += len(trades) - sum(rejected.values()) - len(transactions)
+                if transactions.empty:
+                    continue
+                # What is derived from the transactions is brought up to date once, after the last chunk
+                Database.addToDatabase(db, transactions, db.TRANSACTIONS_TABLE_NAME)
+                report["rowsAdded"] += len(transactions)
+                instruments.update(transactions[db.INSTRUMENT_BOUGHT])
+                instruments.update(transactions[db.INSTRUMENT_SOLD])
+                chunkMinDate = db._minDate(transactions[db.DATE])
+                minDate = chunkMinDate if minDate is None else min(minDate, chunkMinDate)
+            if instruments:
+                db.afterWrite(db.TRANSACTIONS_TABLE_NAME, sorted(instruments), minDate)
+
+        report["rejected"] = dict(report["rejected"])
+        report["seconds"] = time.perf_counter() - started
+        report["rowsPerSecond"] = report["rowsRead"] / report["seconds"] if report["seconds"] else 0.0
+        print("Imported {} of {} rows ({} already in the database, {} rejected) at {:.0f} rows/s. Module: importFile."
+              .format(report["rowsAdded"], report["rowsRead"], report["duplicates"],
+                      sum(report["rejected"].values()), report["rowsPerSecond"]))
+        return report
+
+    # Reads the trades of the file as dataframes of at most chunkSize rows with the
+    # TRADE_COLUMNS (as strings). The format is detected from the first row.
+    def _readChunks(self, path):
+        with open(path, newline = "", encoding = "utf-8-sig") as file:
+            reader = csv.reader(file)
+            rows = []
+            columns = None
+            activity = None
+            extra = []
+            for row in reader:
+                if not row:
+                    continue
+                if activity is None:
+                    activity = len(row) > 1 and row[1] in ("Header", "Data")
+                if activity:
+                    # Several sections in one file, the Trades header can change
+                    if row[0] != "Trades":
+                        continue
+                    if row[1] == "Header":
+                        header = row[2:]
+                        # Forex trades have the commission in the base currency
+                        # of the account ("Comm in EUR"), added as a last column
+                        extra = [name[len("Comm in "):] for name in header if name.startswith("Comm in ")]
+                        if extra:
+                            header = ["Comm/Fee" if name.startswith("Comm in ") else name for name in header]
+                            header = header + ["IBCommissionCurrency"]
+                        columns = self._columnIndex(header, dict(ACTIVITY_COLUMNS, IBCommissionCurrency = COMMISSION_CURRENCY))
+                        discriminator = header.index("DataDiscriminator") if "DataDiscriminator" in header else None
+                        continue
+                    if row[1] != "Data" or columns is None:
+                        continue
+                    size = len(header) - len(extra)
+                    fields = row[2:2 + size] + [""] * (size - len(row[2:2 + size])) + extra
+                    if discriminator is not None and fields[discriminator] not in ACTIVITY_ORDERS:
+                        continue
+                else:
+                    if columns is None or row == header:
+                        # Flex queries repeat the header for each account
+                        header = row
+                        columns = self._columnIndex(row, FLEX_COLUMNS)
+                        continue
+                    fields = row
+                rows.append(tuple(fields[i] if i is not None and i < len(fields) else "" for i in columns))
+                if len(rows) == self.chunkSize:
+                    yield pd.DataFrame(rows, columns = TRADE_COLUMNS)
+                    rows = []
+            if rows:
+                yield pd.DataFrame(rows, columns = TRADE_COLUMNS)
+
+    # Position in header of each of the TRADE_COLUMNS (None when missing)
+    @staticmethod
+    def _columnIndex(header, names):
+        positions = {names[name]: i for i, name in enumerate(header) if name in names}
+        if SYMBOL not in positions or QUANTITY not in positions:
+            raise ValueError("Unknown trades file format, header: {}. Module: IBImporter.".format(header))
+        return [positions.get(column) for column in TRADE_COLUMNS]
+
+    # Validates the trades and converts them to rows of FACT_TRANSACTIONS. Returns the
+    # transactions and the number of rejected trades by reason.
+    def _toTransactions(self, trades, tickers):
+        db = self.database
+        # "2020-03-02, 10:15:00" (activity statement), "20200302" or "20200302;101500" (Flex)
+        dateStrings = trades[DATE].str.split(r"[,;]", regex = True).str[0].str.strip()
+        dates = pd.to_datetime(dateStrings, format = "%Y-%m-%d", errors = "coerce") \
+            .fillna(pd.to_datetime(dateStrings, format = "%Y%m%d", errors = "coerce")).values
+        quantity = self._toNumber(trades[QUANTITY])
+        proceeds = self._toNumber(trades[PROCEEDS])
+        commission = np.abs(np.nan_to_num(self._toNumber(trades[COMMISSION])))
+
+        # Forex trades are quoted as BASE.QUOTE
+        forex = trades[ASSET].isin(FOREX_ASSETS).values
+        pair = trades[SYMBOL].str.split(".", n = 1, expand = True).reindex(columns = [0, 1]).fillna("")
+        instrument = np.where(forex, pair[0].values, trades[SYMBOL].values)
+        cash = np.where(forex, pair[1].values, trades[CURRENCY].values)
+        commissionCurrency = trades[COMMISSION_CURRENCY].where(trades[COMMISSION_CURRENCY] != "", trades[CURRENCY]).values
+
+        checks = [("invalid date", np.isnat(dates)),
+                  ("invalid quantity", np.isnan(quantity) | (quantity == 0)),
+                  ("invalid proceeds", np.isnan(proceeds)),
+                  ("unknown instrument", ~np.isin(instrument, list(tickers))),
+                  ("unknown currency", ~np.isin(cash, list(tickers)))]
+        valid = np.ones(len(trades), dtype = bool)
+        rejected = Counter()
+        for reason, failed in checks:
+            failed = failed & valid
+            rejected[reason] += int(failed.sum())
+            valid &= ~failed
+
+        days = utils.toDays(dates[valid])
+        commission = commission[valid]
+        rate = db.getFXService().rate(commissionCurrency[valid], db.COMMISSION_CURRENCY, days)
+        commission = np.where(commission == 0, 0.0, commission * rate)
+        missingRate = np.isnan(commission)
+        rejected["missing exchange rate"] += int(missingRate.sum())
+        keep = ~missingRate
+
+        bought = quantity[valid] > 0
+        instrument, cash = instrument[valid], cash[valid]
+        quantity, proceeds = quantity[valid], proceeds[valid]
+        transactions = pd.DataFrame({db.DATE: utils.toDatetimes(days),
+                                     db.INSTRUMENT_BOUGHT: np.where(bought, instrument, cash),
+                                     db.QUANTITY_BOUGHT: np.where(bought, quantity, proceeds),
+                                     db.INSTRUMENT_SOLD: np.where(bought, cash, instrument),
+                                     db.QUANTITY_SOLD: np.where(bought, -proceeds, -quantity),
+                                     db.COMMISSION: commission})
+        return transactions[keep].reset_index(drop = True), +rejected
+
+    @staticmethod
+    def _toNumber(values):
+        return pd.to_numeric(values.str.replace(",", "", regex = False), errors = "coerce").values.astype(float)
+
+    # Drops the transactions already in FACT_TRANSACTIONS. Identical trades can be
+    # genuine (e.g. two fills of the same size), so the n-th occurrence of a trade in
+    # the file is new only if the database held fewer than n of them before the import.
+    def _newTransactions(self, transactions, seen, inserted):
+        db = self.database
+        keys = self._keys(transactions)
+        existing = db.getTransactions(transactions[db.INSTRUMENT_BOUGHT].unique().tolist(),
+                                      db._minDate(transactions[db.DATE]),
+                                      str(utils.toDays(transactions[db.DATE].values).max()) + " 00:00:00")
+        existing = Counter(self._keys(existing))
+        before = keys.map(lambda key: existing[key] - inserted[key]).values
+        occurrence = keys.map(seen).fillna(0).values + keys.groupby(keys).cumcount().values
+        new = occurrence >= before
+        seen.update(keys)
+        inserted.update(keys[new])
+        return transactions[new].reset_index(drop = True)
+
+    # Key identifying a transaction: date, instruments and quantities
+    def _keys(self, transactions):
+        db = self.database
+        days = pd.Series(utils.toDays(transactions[db.DATE].values).astype(str))
+        return days + "|" + transactions[db.INSTRUMENT_BOUGHT].astype(str).values \
+            + "|" + transactions[db.QUANTITY_BOUGHT].astype(float).round(6).astype(str).values \
+            + "|" + transactions[db.INSTRUMENT_SOLD].fillna("").astype(str).values \
+            + "|" + transactions[db.QUANTITY_SOLD].astype(float).round(6).astype(str).values
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Import time check of the modules used by headless runs (cron jobs valuing the
+portfolio). Imports them in a fresh interpreter with python -X importtime, fails
+if any of the heavy optional dependencies (plotting, data providers) is loaded
+or if the import takes longer than the budget.
+
+Usage: python CheckImportTime.py [budget in ms]
+
+Created on Sun Oct 18 2026
+"""
+
+import os
+import subprocess
+import sys
+
+###############
+## Constants ##
+###############
+HEADLESS_MODULES = ["Database", "PortfolioDB", "Stock", "ValueStock", "ValuationEngine",
+                    "PortfolioTracker", "BrokerImport", "GoogleSheetData"]
+# Must only be imported when plotting or downloading from the corresponding source
+FORBIDDEN_MODULES = ["matplotlib", "seaborn", "yfinance", "urllib.request", "googleapiclient",
+                     "google_auth_oauthlib", "Plotting", "YahooFinance"]
+IMPORT_BUDGET_MS = 1500
+REPEAT = 3 # the fastest of REPEAT runs is compared with the budget
+
+# Imports the modules in a new interpreter. Returns the total import time in ms and
+# the names of all the modules imported.
+def measureImport(modules):
+    code = "import " + ", ".join(modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd = os.path.dirname(os.path.abspath(__file__)),
+                            capture_output = True, text = True)
+    if result.returncode != 0:
+        raise RuntimeError("Import failed:\n{}".format(result.stderr[-2000:]))
+    total = 0
+    imported = []
+    # Lines are "import time: self [us] | cumulative | imported package", nested
+    # imports are indented under the module that imports them
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imported.append(name.strip())
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return total / 1000, imported
+
+def main(budget = IMPORT_BUDGET_MS):
+    times = []
+    for _ in range(REPEAT):
+        total, imported = measureImport(HEADLESS_MODULES)
+        times.append(total)
+    loaded = [module for module in FORBIDDEN_MODULES if module in imported]
+    print("Import time of {}: {:.0f} ms (budget {} ms).".format(", ".join(HEADLESS_MODULES), min(times), budget))
+    ok = True
+    if loaded:
+        print("FAILED: heavy modules imported: {}.".format(", ".join(loaded)))
+        ok = False
+    if min(times) > budget:
+        print("FAILED: import time over budget.")
+        ok = False
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if main(float(sys.argv[1]) if len(sys.argv) > 1 else IMPORT_BUDGET_MS) else 1)
@@ -1,80 +1,200 @@
 '''                   databaseFunctions.py
 Created: 28/11/2016
-    Python script that holds the functions for creating, reading and loading from 
+    Python script that holds the functions for creating, reading and loading from
     sqlite databases.
+
+Modified 18/10/2026:
+    * The database now keeps one long-lived connection per thread instead of
+    opening and closing a connection for every call. Connections are tuned with
+    WAL journaling, a sized page cache, memory mapping and a statement cache.
+    * Added the transaction() context manager to group several writes in one
+    transaction. Methods called inside it do not commit on their own.
+    * addToDatabase writes in batches with executemany and can ignore or update
+    the rows that already exist (onConflict = "IGNORE" or "UPDATE"), so that
+    writing the same data twice is safe.
+    * The queries can be timed by the QueryProfiler (see QueryProfiler.py), off
+    by default.
 '''
 
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 import pandas as pd
+from QueryProfiler import QUERY_PROFILER
+
+###############
+## Constants ##
+###############
+CACHE_SIZE_KB = 64000           # page cache per connection (PRAGMA cache_size, in KiB)
+MMAP_SIZE = 256 * 1024 * 1024   # bytes of the database file mapped in memory (PRAGMA mmap_size)
+CACHED_STATEMENTS = 256         # number of prepared statements kept per connection
+BUSY_TIMEOUT = 30               # seconds to wait for a lock held by another connection
+BATCH_SIZE = 10000              # rows bound per executemany call in addToDatabase
 
 # Database class to create a new database at the file location given in databasePath.
 # Includes methods for creating tables, clearing and removing tables. Adding to and
 # querying the database.
 class Database():
     # Class initializer
-    def __init__(self, databasePath, googledatatable):
+    def __init__(self, databasePath, googledatatable, cacheSize = CACHE_SIZE_KB, mmapSize = MMAP_SIZE, cachedStatements = CACHED_STATEMENTS):
       self.googledatatable = googledatatable
       self.databasePath = databasePath
-      conn = sqlite3.connect(self.databasePath)
-      conn.close()
-         
+      self.cacheSize = cacheSize
+      self.mmapSize = mmapSize
+      self.cachedStatements = cachedStatements
+      # One connection per thread: sqlite3 connections must not be shared between threads
+      self._local = threading.local()
+      self._connections = []
+      self._connectionsLock = threading.Lock()
+      self.getConnection()
+
+    # Opens a new connection to the database and applies the tuning pragmas.
+    # isolation_level = None puts the connection in autocommit mode, transactions
+    # are opened explicitly by transaction().
+    def _connect(self):
+        conn = sqlite3.connect(self.databasePath, timeout = BUSY_TIMEOUT, isolation_level = None,
+                               check_same_thread = False, cached_statements = self.cachedStatements)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -{}".format(int(self.cacheSize)))
+        conn.execute("PRAGMA mmap_size = {}".format(int(self.mmapSize)))
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    # Returns the connection of the calling thread, opening it on first use. When the
+    # query profiler is enabled the connection records the statements run on it.
+    def getConnection(self):
+        conn = self._getRawConnection()
+        return QUERY_PROFILER.wrap(conn) if QUERY_PROFILER.enabled else conn
+
+    def _getRawConnection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._connectionsLock:
+                self._connections.append(conn)
+        return conn
+
+    # Context manager that runs the enclosed statements in a single transaction.
+    # Commits on exit and rolls back if an exception is raised. Nested calls join
+    # the outermost transaction.
+    @contextmanager
+    def transaction(self):
+        conn = self.getConnection()
+        outermost = self._local.depth == 0
+        if outermost:
+            conn.execute("BEGIN")
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if outermost:
+                conn.rollback()
+            raise
+        else:
+            self._local.depth -= 1
+            if outermost:
+                conn.commit()
+
+    # Closes the connections opened by every thread
+    def close(self):
+        with self._connectionsLock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
     # function which creates the table (tableName) (if it doesn't already exist)
     # with the columns in columnList
     def createTable(self, tableName, columnList):
-        conn = sqlite3.connect(self.databasePath)
-        cursor = conn.cursor()        
         sql_command = """ CREATE TABLE IF NOT EXISTS {} ({}) """.format(tableName, columnList)
-        cursor.execute(sql_command)
-        conn.commit()
-        conn.close()
-        print("Table created") 
-    
+        with self.transaction() as conn:
+            conn.execute(sql_command)
+        print("Table created")
+
     # Deletes all rows from the table
     def clearTable(self, tableName):
-        conn = sqlite3.connect(self.databasePath)
-        cursor = conn.cursor()    
-        sql_command = """ DELETE FROM {} """.format(tableName) 
-        cursor.execute(sql_command)
-        conn.commit()
-        conn.close()
+        sql_command = """ DELETE FROM {} """.format(tableName)
+        with self.transaction() as conn:
+            conn.execute(sql_command)
         print("Table cleared")
 
-        
+
     # function which removes the table (tableName) from the database db
     def removeTable(self, tableName):
-        conn = sqlite3.connect(self.databasePath)
-        cursor = conn.cursor()        
         #Remove database
-        sql_command = """ DROP TABLE IF EXISTS {} """.format(tableName) 
-        cursor.execute(sql_command)
-        conn.commit()
-        conn.close()
+        sql_command = """ DROP TABLE IF EXISTS {} """.format(tableName)
+        with self.transaction() as conn:
+            conn.execute(sql_command)
         print("Table removed")
-        
-            
-    # function which adds data in dataframe to table
-    def addToDatabase(self, dataFrame, tableName):
-        conn = sqlite3.connect(self.databasePath)
-        dataFrame.to_sql(name = tableName, con = conn, if_exists = 'append', index = False)       
-        conn.commit()
-        conn.close()
-    
-            
+
+
+    # function which adds data in dataframe to table, in one transaction and in
+    # batches of batchSize rows. onConflict sets what happens to the rows clashing
+    # with a primary key or unique constraint: None raises an error, "IGNORE" keeps
+    # the rows in the table and "UPDATE" overwrites them with the new values.
+    # conflictColumns defaults to the primary key of the table.
+    # Returns the number of rows inserted or updated.
+    def addToDatabase(self, dataFrame, tableName, onConflict = None, conflictColumns = None, batchSize = BATCH_SIZE):
+        if dataFrame.empty:
+            return 0
+        columns = list(dataFrame.columns)
+        sql_command = """ INSERT {}INTO {} ({}) VALUES ({}) """ \
+            .format("OR IGNORE " if onConflict == "IGNORE" else "", tableName,
+                    ", ".join(columns), ", ".join(["?"] * len(columns)))
+        if onConflict == "UPDATE":
+            conflictColumns = self.getPrimaryKey(tableName) if conflictColumns is None else conflictColumns
+            updates = [column for column in columns if column not in conflictColumns]
+            sql_command += """ ON CONFLICT ({}) DO {} """ \
+                .format(", ".join(conflictColumns),
+                        "UPDATE SET " + ", ".join("{0} = excluded.{0}".format(column) for column in updates) if updates else "NOTHING")
+        elif onConflict not in (None, "IGNORE"):
+            raise ValueError("Invalid option provided")
+        with self.transaction() as conn:
+            changes = conn.total_changes
+            for first in range(0, len(dataFrame), batchSize):
+                conn.executemany(sql_command, self._toRecords(dataFrame.iloc[first:first + batchSize]))
+            return conn.total_changes - changes
+
+    # Returns the primary key columns of the table
+    def getPrimaryKey(self, tableName):
+        columns = self.getConnection().execute("PRAGMA table_info({})".format(tableName)).fetchall()
+        # Rows are (cid, name, type, notnull, dflt_value, pk), pk is the position in the key
+        return [column[1] for column in sorted(columns, key = lambda column: column[5]) if column[5] > 0]
+
+    # Converts a dataframe in a list of tuples that sqlite3 can bind. Datetime columns
+    # are written as "yyyy-mm-dd hh:mm:ss" strings, as pandas.to_sql used to do.
+    @staticmethod
+    def _toRecords(dataFrame):
+        data = dataFrame.copy()
+        for column in data.columns:
+            if pd.api.types.is_datetime64_any_dtype(data[column]):
+                data[column] = data[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+        data = data.astype(object).where(data.notna(), None)
+        return list(data.itertuples(index = False, name = None))
+
     # Uses the query sqlQuery to read the database
-    def readDatabase(self, sqlQuery):
-        conn = sqlite3.connect(self.databasePath)               
-        dataFrame = pd.read_sql(sqlQuery, conn)
-        conn.close()
+    def readDatabase(self, sqlQuery, params = None):
+        if not QUERY_PROFILER.enabled:
+            return pd.read_sql(sqlQuery, self._getRawConnection(), params = params)
+        started = time.perf_counter()
+        dataFrame = pd.read_sql(sqlQuery, self._getRawConnection(), params = params)
+        QUERY_PROFILER.record(sqlQuery, time.perf_counter() - started, len(dataFrame))
         return dataFrame
-        
+
     # Executes a custom sql command. Can be used for removing rows etc
-    def executeCommand(self, sql_command):
-        conn = sqlite3.connect(self.databasePath)
-        cursor = conn.cursor()    
-        cursor.execute(sql_command)
-        rowsAffected = cursor.rowcount
-        conn.commit()
-        conn.close()
+    def executeCommand(self, sql_command, params = ()):
+        with self.transaction() as conn:
+            cursor = conn.execute(sql_command, params)
+            rowsAffected = cursor.rowcount
         print("Command executed")
         return rowsAffected
-    
+
+    # Returns the query plan chosen by sqlite for sqlQuery (EXPLAIN QUERY PLAN)
+    def explainQuery(self, sqlQuery, params = None):
+        return self.readDatabase("EXPLAIN QUERY PLAN " + sqlQuery, params = params)
+
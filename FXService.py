@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Shared currency conversion service.
+
+The exchange rates are stored in FACT_HISTPRICES as the price of each currency in the
+base currency (e.g. ticker CHF holds the CHFEUR rate). The service loads each
+currency series once, forward fills it onto a canonical calendar date axis and
+converts any array of amounts between any two currencies by triangulating through
+the base currency (e.g. CHF -> USD = CHFEUR / USDEUR).
+
+PortfolioDB.getFXService() returns the service shared by all the stocks of a
+database, so the rates are read and aligned once per run.
+
+Created on Sun Oct 18 2026
+"""
+
+import threading
+import numpy as np
+import utils
+
+###############
+## Constants ##
+###############
+BASE_CURRENCY = "EUR"       # currency in which the rates are stored
+AXIS_MARGIN_DAYS = 366      # extra days loaded when the date axis has to grow
+
+class FXService:
+    # Class initializer. reportingCurrency is the default target of convert().
+    def __init__(self, database, reportingCurrency = BASE_CURRENCY, baseCurrency = BASE_CURRENCY):
+        self.database = database
+        self.baseCurrency = baseCurrency
+        self.reportingCurrency = reportingCurrency
+        self._lock = threading.RLock()
+        self._dates = np.array([], dtype = 'datetime64[D]')
+        self._rates = {}  # currency -> rate to baseCurrency on each day of _dates
+
+    # Date axis covering dates. It is extended (and the loaded series dropped) when
+    # a date falls outside of it.
+    def _ensureAxis(self, dates):
+        first = dates.min()
+        last = dates.max()
+        if len(self._dates) and first >= self._dates[0] and last <= self._dates[-1]:
+            return
+        if len(self._dates):
+            first = min(first, self._dates[0])
+            last = max(last, self._dates[-1])
+        last = max(last, utils.toDays(utils.DEFAULT_DATE))
+        self._dates = np.arange(first - AXIS_MARGIN_DAYS, last + 1)
+        self._rates = {}
+
+    # Loads the rates to baseCurrency of the currencies that are not loaded yet,
+    # with one getPriceMatrix call
+    def _load(self, currencies):
+        missing = [currency for currency in currencies if currency not in self._rates]
+        if not missing:
+            return
+        startDate = str(self._dates[0]) + " 00:00:00"
+        endDate = str(self._dates[-1]) + " 00:00:00"
+        _, tickers, rates = self.database.getPriceMatrix(missing, startDate, endDate)
+        for i, currency in enumerate(tickers):
+            self._rates[currency] = rates[:, i]
+        if self.baseCurrency in missing:
+            self._rates[self.baseCurrency] = np.ones(len(self._dates))
+
+    # Rate to convert one unit of each currency into baseCurrency on each date
+    # (NaN before the first available rate). currencies and dates are broadcast.
+    def toBase(self, currencies, dates):
+        currencies = np.asarray(currencies, dtype = object)
+        dates = utils.toDays(dates)
+        currencies, dates = np.broadcast_arrays(currencies, dates)
+        result = np.full(currencies.shape, np.nan)
+        if currencies.size == 0:
+            return result
+        with self._lock:
+            self._ensureAxis(dates)
+            uniqueCurrencies = list(dict.fromkeys(currencies.ravel().tolist()))
+            self._load(uniqueCurrencies)
+            index = (dates - self._dates[0]).astype(int)
+            for currency in uniqueCurrencies:
+                mask = currencies == currency
+                result[mask] = self._rates[currency][index[mask]]
+        return result
+
+    # Rate to convert one unit of fromCurrency into toCurrency on each date
+    def rate(self, fromCurrencies, toCurrencies, dates):
+        return self.toBase(fromCurrencies, dates) / self.toBase(toCurrencies, dates)
+
+    # Converts amounts in currencies on dates into toCurrency (reportingCurrency by default)
+    def convert(self, amounts, currencies, dates, toCurrency = None):
+        toCurrency = self.reportingCurrency if toCurrency is None else toCurrency
+        return np.asarray(amounts, dtype = float) * self.rate(currencies, toCurrency, dates)
+
+    # Dates x currencies matrix of the rates into toCurrency (reportingCurrency by default)
+    def rateMatrix(self, currencies, dates, toCurrency = None):
+        toCurrency = self.reportingCurrency if toCurrency is None else toCurrency
+        dates = utils.toDays(dates)
+        return self.rate(np.asarray(currencies, dtype = object)[np.newaxis, :], toCurrency, dates[:, np.newaxis])
+
+    # Drops the loaded series of currencies (all of them if currencies is None)
+    def invalidate(self, currencies = None):
+        with self._lock:
+            if currencies is None:
+                self._rates = {}
+            else:
+                for currency in currencies:
+                    self._rates.pop(currency, None)
@@ -3,12 +3,18 @@
 Created on Tue Mar 10 12:09:03 2020
 
 @author: fega
+
+Modified 18/10/2026:
+    * The authorized Sheets service is built once and reused by every call.
+    * getGoogleSheetData reads the spreadsheet and range it is given.
+    * Added updateGoogleSheetData and getGoogleSheetCache for an incremental fetch:
+    only the rows from the last date with prices and the columns that are not in
+    the local SheetStore are requested, then merged into it.
 """
 
 import pandas as pd
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow,Flow
-from google.auth.transport.requests import Request
+from SheetStore import SheetStore
+import numpy as np
 import os
 import pickle
 
@@ -17,11 +23,23 @@ SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 # here enter the id of your google sheet
 SAMPLE_SPREADSHEET_ID = '1AZUfiTU8WYlmJFB1FriZ37hzBc1v-vzLd-EzITFGs_g'
 SAMPLE_RANGE_NAME = 'Data!A1:U8767'
+SAMPLE_SHEET_NAME = 'Data'
 
-def getGoogleSheetData(spreadsheet = SAMPLE_SPREADSHEET_ID, sheetdatarange = SAMPLE_RANGE_NAME):
-    """Shows basic usage of the Sheets API.
-    Prints values from a sample spreadsheet.
+# Sheets service shared by all the calls, built by getService on first use
+_service = None
+
+def getService():
+    """Returns the authorized Sheets service, running the authorization flow
+    only the first time.
     """
+    global _service
+    if _service is not None:
+        return _service
+
+    from googleapiclient.discovery import build
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
     creds = None
     # The file token.pickle stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first
@@ -41,23 +59,102 @@ def getGoogleSheetData(spreadsheet = SAMPLE_SPREADSHEET_ID, sheetdatarange = SAM
         with open('token.pickle', 'wb') as token:
             pickle.dump(creds, token)
 
-    service = build('sheets', 'v4', credentials=creds)
+    _service = build('sheets', 'v4', credentials=creds)
+    return _service
+
+def getValues(spreadsheet, sheetdatarange, service = None):
+    """Returns the cells of the range as a list of rows. service defaults to the
+    shared service of getService and can be replaced by any object with the same
+    spreadsheets().values().get(...).execute() interface.
+    """
+    service = getService() if service is None else service
+    result = service.spreadsheets().values().get(spreadsheetId=spreadsheet,
+                                                 range=sheetdatarange).execute()
+    return result.get('values', [])
+
+def getGoogleSheetData(spreadsheet = SAMPLE_SPREADSHEET_ID, sheetdatarange = SAMPLE_RANGE_NAME, service = None):
+    """Shows basic usage of the Sheets API.
+    Prints values from a sample spreadsheet.
+    """
+    values = getValues(spreadsheet, sheetdatarange, service)
 
-    # Call the Sheets API
-    sheet = service.spreadsheets()
-    result = sheet.values().get(spreadsheetId=SAMPLE_SPREADSHEET_ID,
-                                range=SAMPLE_RANGE_NAME).execute()
-    values = result.get('values', [])
-   
     if not values:
         print('No data found.')
         return 0
     else:
         print('Data dumped. Returning data frame')
         column_names = values.pop(0)
-        df = pd.DataFrame(values, columns=column_names)
+        df = toDataFrame(values, column_names)
         return df
-    
+
+def toDataFrame(rows, column_names):
+    """Dataframe of the rows. The API leaves out the empty cells at the end of a
+    row, they are filled with empty strings.
+    """
+    rows = [row + [''] * (len(column_names) - len(row)) for row in rows]
+    return pd.DataFrame(rows, columns=column_names)
+
+def columnLetter(index):
+    """A1 notation letters of the column with 0-based index (0 -> A, 26 -> AA)."""
+    letters = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def updateGoogleSheetData(store = None, spreadsheet = SAMPLE_SPREADSHEET_ID, sheetname = SAMPLE_SHEET_NAME, service = None):
+    """Returns store updated with the new data of the sheet. The ranges requested are
+    the header row, the rows from the last date with prices in store
+    (so that prices added to rows that were already read are picked up) and, for
+    the columns that are not in store, the DATE column and the new columns up to
+    that row. Without a store the whole sheet is read.
+    The rows of the sheet are assumed to be sorted by date, with one row per date.
+    """
+    header = getValues(spreadsheet, '{}!1:1'.format(sheetname), service)
+    if not header:
+        print('No data found.')
+        return store
+    column_names = header[0]
+    lastColumn = columnLetter(len(column_names) - 1)
+
+    if store is None or len(store.dates) == 0:
+        rows = getValues(spreadsheet, '{}!A2:{}'.format(sheetname, lastColumn), service)
+        return SheetStore.fromDataFrame(toDataFrame(rows, column_names))
+
+    # Sheet row of the last date with prices (row 1 is the header)
+    filled = np.flatnonzero(~np.isnan(store.prices).all(axis = 0))
+    firstRow = (filled[-1] if len(filled) else 0) + 2
+
+    # Columns added to the sheet since the last fetch, read up to the first tail row
+    newColumns = [i for i, name in enumerate(column_names) if name != 'DATE' and name not in store.symbols]
+
+    rows = getValues(spreadsheet, '{}!A{}:{}'.format(sheetname, firstRow, lastColumn), service)
+    if rows:
+        store = store.merge(SheetStore.fromDataFrame(toDataFrame(rows, column_names)))
+
+    if newColumns and firstRow > 2:
+        first, last = columnLetter(newColumns[0]), columnLetter(newColumns[-1])
+        dates = getValues(spreadsheet, '{}!A2:A{}'.format(sheetname, firstRow - 1), service)
+        data = getValues(spreadsheet, '{}!{}2:{}{}'.format(sheetname, first, last, firstRow - 1), service)
+        data = data + [[]] * (len(dates) - len(data))
+        names = column_names[newColumns[0]:newColumns[-1] + 1]
+        block = toDataFrame(data, names)
+        block.insert(0, 'DATE', [row[0] if row else '' for row in dates])
+        block = block.loc[block['DATE'] != '', ['DATE'] + [column_names[i] for i in newColumns]]
+        store = store.merge(SheetStore.fromDataFrame(block))
+    print('Sheet data updated from row {}.'.format(firstRow))
+    return store
+
+def getGoogleSheetCache(cachePath, spreadsheet = SAMPLE_SPREADSHEET_ID, sheetname = SAMPLE_SHEET_NAME, service = None):
+    """Returns the sheet as a SheetStore kept in the binary file cachePath, which
+    is updated with the new data of the sheet.
+    """
+    store = SheetStore.load(cachePath) if os.path.exists(cachePath) else None
+    store = updateGoogleSheetData(store, spreadsheet, sheetname, service)
+    if store is not None:
+        store.save(cachePath)
+    return store
+
 
 #data = getGoogleSheetData(spreadsheet = SAMPLE_SPREADSHEET_ID, sheetdatarange = SAMPLE_RANGE_NAME)
-    
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Cost basis lots and realized / unrealized profit & loss of every instrument.
+
+The engine walks FACT_TRANSACTIONS once in date order (TRANSACTION_ID within a
+date) for all the instruments. Each transaction has two legs: the quantity of
+INSTRUMENT_BOUGHT received and the quantity of INSTRUMENT_SOLD given up. A leg in
+the direction of the open lots of its instrument opens a new lot, a leg in the
+opposite direction closes lots, FIFO (oldest first), LIFO (newest first) or
+AVERAGE (a single lot at the average cost) according to the method, and the
+difference between the proceeds and the cost basis of the closed quantity is
+realized. Quantities left after closing every lot open a lot in the other
+direction, so negative quantities (reversals, short positions) are handled.
+
+Amounts are in EUR at the rates of the transaction date, as in
+PortfolioDB.getTransactionsCostEUR. Both legs of a transaction are valued at the
+same amount: the value of its cash leg (a currency, EUR first) when it has one,
+otherwise the value of the instrument given up, or of the instrument received
+when the other value is missing (e.g. deposits, where nothing is given up). The
+commission adds to the cost of the lot received, except when cash is received
+for anything but EUR (sales, currency exchanges), where it is deducted from the
+proceeds of what is given up. EUR lots therefore never realize a profit or loss
+and the other currencies only realize their exchange rate changes.
+
+The state of the engine (open lots, realized totals and the history of the
+changes) can be saved to a json file and loaded back. update() then only walks
+the transactions added after the last one processed. If transactions were
+removed or added before it the history is replayed from the start.
+
+Created on Sun Oct 18 2026
+"""
+
+import json
+import os
+from collections import deque
+import numpy as np
+import pandas as pd
+import utils
+
+###############
+## Constants ##
+###############
+METHODS = ("FIFO", "LIFO", "AVERAGE")
+QUANTITY_TOLERANCE = 1e-9   # lots with a smaller quantity are closed
+STATE_VERSION = 2
+
+# Result of LotEngine.run. All the matrices have one row per calendar day in dates
+# and one column per instrument in tickers. Amounts are in EUR.
+class LotValuation:
+    # Class initializer
+    def __init__(self, dates, tickers, quantity, costBasis, realized, prices, fx):
+        self.dates = dates
+        self.tickers = tickers
+        self.quantity = quantity
+        self.costBasis = costBasis
+        self.realized = realized
+        # Dates before the first price or rate are worth 0
+        self.value = np.nan_to_num(quantity * prices * fx)
+        self.unrealized = self.value - costBasis
+
+    # Dataframe with the portfolio totals by date
+    def totals(self):
+        return pd.DataFrame({"DATE": utils.toDatetimes(self.dates),
+                             "COST_BASIS_EUR": self.costBasis.sum(axis = 1),
+                             "VALUE_EUR": self.value.sum(axis = 1),
+                             "REALIZED_EUR": self.realized.sum(axis = 1),
+                             "UNREALIZED_EUR": self.unrealized.sum(axis = 1)})
+
+    # Dataframe with the matrix (e.g. "unrealized") of each instrument by date
+    def byInstrument(self, name):
+        data = pd.DataFrame(getattr(self, name), columns = self.tickers)
+        data.insert(0, "DATE", utils.toDatetimes(self.dates))
+        return data
+
+
+class LotEngine:
+    # Class initializer. method is one of METHODS. currencyField is the DIM_STOCKS
+    # column holding the currency of the prices of each instrument.
+    def __init__(self, database, method = "FIFO", currencyField = None):
+        if method not in METHODS:
+            raise ValueError("Invalid method {}, expected one of {}.".format(method, ", ".join(METHODS)))
+        self.database = database
+        self.method = method
+        self.currencyField = currencyField if currencyField is not None else database.getCurrencyField()
+        self.reset()
+
+    # Class string method
+    def __str__(self):
+        return "LotEngine - {}, {} transactions, {} open lots." \
+            .format(self.method, self._processed, sum(len(lots) for lots in self._lots.values()))
+
+    # Forgets the transactions processed so far
+    def reset(self):
+        self._lots = {}         # ticker -> deque of [day, quantity, unit cost], oldest first
+        self._open = {}         # ticker -> [open quantity, cost basis] of the lots
+        self._realized = {}     # ticker -> realized profit & loss
+        self._history = []      # [day, ticker, open quantity, cost basis, realized] after each leg
+        self._sales = []        # [day, ticker, quantity closed, proceeds, cost, realized] of each closing leg
+        self._processed = 0     # transactions processed
+        self._last = None       # (DATE, TRANSACTION_ID) of the last transaction processed
+
+    # Processes the transactions added since the last update, replaying the full history
+    # if the transactions already processed changed. Returns the number of transactions
+    # processed.
+    def update(self):
+        db = self.database
+        if self._last is not None and self._countUpTo(*self._last) != self._processed:
+            print("Transactions changed, lots rebuilt from the start. Module: LotEngine.update.")
+            self.reset()
+        if self._last is None:
+            sqlQuery = "SELECT * FROM {} ORDER BY {}, {}".format(db.TRANSACTIONS_TABLE_NAME, db.DATE, db.TRANSACTION_ID)
+            transactions = db.readDatabase(sqlQuery)
+        else:
+            sqlQuery = '''
+                SELECT *
+                FROM {table}
+                WHERE {date} > ? OR ({date} = ? AND {id} > ?)
+                ORDER BY {date}, {id};
+            '''.format(table = db.TRANSACTIONS_TABLE_NAME, date = db.DATE, id = db.TRANSACTION_ID)
+            transactions = db.readDatabase(sqlQuery, params = [self._last[0], self._last[0], self._last[1]])
+        if transactions.empty:
+            return 0
+        self._walk(transactions)
+        return len(transactions)
+
+    # Number of transactions on or before the transaction (date, transactionId)
+    def _countUpTo(self, date, transactionId):
+        db = self.database
+        sqlQuery = "SELECT count(*) FROM {table} WHERE {date} < ? OR ({date} = ? AND {id} <= ?)" \
+            .format(table = db.TRANSACTIONS_TABLE_NAME, date = db.DATE, id = db.TRANSACTION_ID)
+        return db.getConnection().execute(sqlQuery, [date, date, transactionId]).fetchone()[0]
+
+    # Walks the transactions, sorted by date and TRANSACTION_ID, updating the lots
+    def _walk(self, transactions):
+        db = self.database
+        days = utils.toDays(transactions[db.DATE].values)
+        soldValue, commissions = db.getTransactionsCostEUR(transactions, self.currencyField)
+        boughtValue = self._legValues(transactions[db.INSTRUMENT_BOUGHT].values, transactions[db.QUANTITY_BOUGHT].values, days)
+        # Both legs at the value of the cash leg, EUR first, else of what is given up
+        currencies = db.getCurrencyTickers()
+        boughtCash = transactions[db.INSTRUMENT_BOUGHT].isin(currencies).values
+        soldCash = transactions[db.INSTRUMENT_SOLD].isin(currencies).values
+        useBought = (transactions[db.INSTRUMENT_BOUGHT].values == "EUR") | (boughtCash & ~soldCash)
+        value = np.where(useBought, boughtValue, soldValue)
+        value = np.where(value != 0, value, np.where(useBought, soldValue, boughtValue))
+        # Cash received for anything but EUR pays the commission out of the proceeds,
+        # other trades add it to the cost of the lot received
+        sale = boughtCash & (transactions[db.QUANTITY_SOLD].fillna(0).values != 0) \
+            & (transactions[db.INSTRUMENT_SOLD].values != "EUR")
+        cost = value + np.where(sale, 0.0, commissions)
+        proceeds = value - np.where(sale, commissions, 0.0)
+        for day, instrumentSold, quantitySold, instrumentBought, quantityBought, legCost, legProceeds in \
+                zip(days.astype(str), transactions[db.INSTRUMENT_SOLD].values, transactions[db.QUANTITY_SOLD].values.astype(float),
+                    transactions[db.INSTRUMENT_BOUGHT].values, transactions[db.QUANTITY_BOUGHT].values.astype(float), cost, proceeds):
+            if instrumentSold and quantitySold != 0:
+                self._applyLeg(day, instrumentSold, -quantitySold, -legProceeds)
+            if instrumentBought and quantityBought != 0:
+                self._applyLeg(day, instrumentBought, quantityBought, legCost)
+        self._processed += len(transactions)
+        self._last = (transactions[db.DATE].iloc[-1], int(transactions[db.TRANSACTION_ID].iloc[-1]))
+
+    # EUR value of quantities of the instruments on the days (0 where a price or rate is missing)
+    def _legValues(self, instruments, quantities, days):
+        db = self.database
+        prices, _ = db.getPricesAsOf(instruments, days)
+        currencies = db.getCurrencies(instruments, self.currencyField)
+        return np.nan_to_num(db.getFXService().convert(quantities.astype(float) * prices, currencies, days, "EUR"))
+
+    # Moves quantity (signed) of the instrument at the EUR amount (with the same sign)
+    def _applyLeg(self, day, ticker, quantity, amount):
+        lots = self._lots.setdefault(ticker, deque())
+        openTotals = self._open.setdefault(ticker, [0.0, 0.0])
+        openTotals[0] += quantity
+        unitValue = amount / quantity
+        realized = 0.0
+        closedQuantity = 0.0
+        closedCost = 0.0
+        # Close the lots in the opposite direction
+        while lots and abs(quantity) > QUANTITY_TOLERANCE and (lots[0][1] > 0) != (quantity > 0):
+            lot = lots[-1] if self.method == "LIFO" else lots[0]
+            closed = min(abs(quantity), abs(lot[1])) * (1.0 if lot[1] > 0 else -1.0)
+            realized += closed * (unitValue - lot[2])
+            closedQuantity += closed
+            closedCost += closed * lot[2]
+            lot[1] -= closed
+            quantity += closed
+            if abs(lot[1]) <= QUANTITY_TOLERANCE:
+                if self.method == "LIFO":
+                    lots.pop()
+                else:
+                    lots.popleft()
+        # What is left opens a lot, merged into the single lot with AVERAGE
+        if abs(quantity) > QUANTITY_TOLERANCE:
+            if self.method == "AVERAGE" and lots:
+                lot = lots[0]
+                lot[2] = (lot[1] * lot[2] + quantity * unitValue) / (lot[1] + quantity)
+                lot[1] += quantity
+            else:
+                lots.append([day, quantity, unitValue])
+            openTotals[1] += quantity * unitValue
+        openTotals[1] -= closedCost
+        if not lots:
+            # No rounding residue once every lot is closed
+            openTotals[:] = [0.0, 0.0]
+        if closedQuantity != 0:
+            self._realized[ticker] = self._realized.get(ticker, 0.0) + realized
+            self._sales.append([day, ticker, closedQuantity, closedQuantity * unitValue, closedCost, realized])
+        self._history.append([day, ticker, openTotals[0], openTotals[1], self._realized.get(ticker, 0.0)])
+
+    # Dataframe of the open lots of the tickers (all if None) with their cost basis in EUR
+    def getLots(self, tickers = None):
+        db = self.database
+        rows = [[ticker, day, quantity, quantity * unitCost, unitCost]
+                for ticker, lots in self._lots.items() if tickers is None or ticker in tickers
+                for day, quantity, unitCost in lots]
+        data = pd.DataFrame(rows, columns = [db.IB_TICKER, "LOT_DATE", "QUANTITY", "COST_BASIS_EUR", "UNIT_COST_EUR"])
+        data["LOT_DATE"] = utils.toDatetimes(utils.toDays(data["LOT_DATE"].values))
+        return data
+
+    # Dataframe of the closing legs (sales, or purchases covering short lots) of the
+    # tickers (all if None), with the proceeds, cost basis and realized profit & loss in EUR
+    def getRealized(self, tickers = None):
+        db = self.database
+        data = pd.DataFrame(self._sales, columns = [db.DATE, db.IB_TICKER, "QUANTITY", "PROCEEDS_EUR", "COST_BASIS_EUR", "REALIZED_EUR"])
+        if tickers is not None:
+            data = data[data[db.IB_TICKER].isin(tickers)].reset_index(drop = True)
+        data[db.DATE] = utils.toDatetimes(utils.toDays(data[db.DATE].values))
+        return data
+
+    # Quantity, cost basis, realized and unrealized profit & loss of the instruments in
+    # tickers (all those with transactions if None) for every day between startDate
+    # and endDate, after processing the new transactions
+    def run(self, tickers = None, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
+        db = self.database
+        self.update()
+        history = pd.DataFrame(self._history, columns = ["DAY", "TICKER", "QUANTITY", "COST", "REALIZED"])
+        tickers = list(dict.fromkeys(history["TICKER"] if tickers is None else tickers))
+        dates = np.arange(utils.toDays(startDate), utils.toDays(endDate) + 1)
+        shape = (len(dates), len(tickers))
+        quantity, costBasis, realized = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        # Each day takes the last change of each instrument on or before it
+        history["DAY"] = utils.toDays(history["DAY"].values)
+        for ticker, changes in history[history["TICKER"].isin(tickers)].groupby("TICKER", sort = False):
+            column = tickers.index(ticker)
+            index = np.searchsorted(changes["DAY"].values, dates, side = "right") - 1
+            known = index >= 0
+            for matrix, name in ((quantity, "QUANTITY"), (costBasis, "COST"), (realized, "REALIZED")):
+                matrix[known, column] = changes[name].values[index[known]]
+        _, _, prices = db.getPriceMatrix(tickers, str(dates[0]) + " 00:00:00", str(dates[-1]) + " 00:00:00")
+        fx = db.getFXService().rateMatrix(db.getCurrencies(tickers, self.currencyField), dates, "EUR")
+        return LotValuation(dates, np.array(tickers), quantity, costBasis, realized, prices, fx)
+
+    # Writes the state of the engine to the json file at path
+    def save(self, path):
+        state = {"version": STATE_VERSION,
+                 "method": self.method,
+                 "currencyField": self.currencyField,
+                 "processed": self._processed,
+                 "last": self._last,
+                 "lots": {ticker: list(lots) for ticker, lots in self._lots.items()},
+                 "realized": self._realized,
+                 "history": self._history,
+                 "sales": self._sales}
+        temporaryPath = path + ".tmp"
+        with open(temporaryPath, "w") as file:
+            json.dump(state, file)
+        os.replace(temporaryPath, path)
+
+    # Loads the state saved at path. Returns False, leaving the engine empty, if there
+    # is no state or it was saved for another method or currency field.
+    def load(self, path):
+        self.reset()
+        if not os.path.exists(path):
+            return False
+        with open(path) as file:
+            state = json.load(file)
+        if state.get("version") != STATE_VERSION or state["method"] != self.method or state["currencyField"] != self.currencyField:
+            return False
+        self._processed = state["processed"]
+        self._last = tuple(state["last"]) if state["last"] is not None else None
+        self._lots = {ticker: deque(lots) for ticker, lots in state["lots"].items()}
+        self._open = {ticker: [sum(lot[1] for lot in lots), sum(lot[1] * lot[2] for lot in lots)]
+                      for ticker, lots in self._lots.items()}
+        self._realized = state["realized"]
+        self._history = state["history"]
+        self._sales = state["sales"]
+        return True
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Plots of the portfolio, imported by PortfolioTracker only when something is
+plotted so that matplotlib and seaborn are not loaded by headless runs.
+
+Created on Sun Oct 18 2026
+"""
+
+import matplotlib.pyplot as plt
+import seaborn as sns
+import pandas as pd
+
+# Closes all the open figures
+def closeAll():
+    plt.close("all")
+
+# Plots the total portfolio value, amount spent and profit from the dataframe
+# returned by Valuation.totals()
+def plotPortfolio(totals):
+    closeAll()
+    spent = pd.DataFrame({"Total": totals["SPENT_EUR"]})
+    value = pd.DataFrame({"Total": totals["VALUE_EUR"]})
+    dividends = pd.DataFrame({"Total": totals["DIVIDEND_TOTAL"]})
+    
+    # Create date column for plotting
+    date = totals["DATE"].dt.to_pydatetime()
+    
+#         Do plotting
+    fig = plt.figure()
+    plt.clf()
+    
+    ax = fig.add_subplot(511)
+    plt.title("Portfolio Totals", fontsize = 16)
+    ax.plot(date, spent["Total"])
+    plt.ylabel("Spent ($)", fontsize = 14)
+    
+    ax = fig.add_subplot(512)
+    ax.plot(date, value["Total"])
+    plt.ylabel("Value ($)", fontsize = 14)
+    
+    ax = fig.add_subplot(513)
+    ax.plot(date, dividends["Total"])
+    plt.ylabel("Dividends ($)", fontsize = 14)
+    
+    ax = fig.add_subplot(514)
+    plt.plot(date, value["Total"] - spent["Total"])
+    plt.plot(date, value["Total"] - spent["Total"] + dividends["Total"])
+    plt.legend(["Share Value Profit", "Share Value Profit + Dividend"], loc = "upper left")
+    plt.ylabel("Profit ($)", fontsize = 14)
+    
+    ax = fig.add_subplot(515)
+    plt.plot(date, 100*(value["Total"] - spent["Total"])/spent["Total"])
+    plt.plot(date, 100*(value["Total"] - spent["Total"] + dividends["Total"])/spent["Total"])
+    plt.legend(["Share Value Profit", "Share Value Profit + Dividend"], loc = "upper left")
+    plt.ylabel("% Profit ($)", fontsize = 14)
+    plt.xlabel("Date", fontsize = 14)
+    
+    plt.show() 
@@ -9,113 +9,658 @@ Created on Sun Mar  8 11:50:49 2020
 
 import utils
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta, date
-import yfinance as yf # https://aroussi.com/post/python-yahoo-finance
-# pip install yfinance --upgrade --no-cache-dir
 from Database import Database
+from PriceStore import PRICE_STORE
+from FXService import FXService, BASE_CURRENCY as FX_BASE_CURRENCY
+from SheetStore import SheetStore
+from Snapshot import Snapshot
+from TradingCalendar import getCalendar, DAILY
 import math
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 ###############
 ## Constants ##
 ###############
 # utils.DEFAULT_DATE = str(date.today())+ " 00:00:00"
 # utils.DEFAULT_STARTDATE = "1975-01-01 00:00:00"
+REFRESH_WORKERS = 8 # maximum number of concurrent downloads in refreshAll
 
 class PortfolioDB(Database):
-    
-    # Filter transactions table FACT_TRANSACTIONS for a range of dates and tickers
-    def getTransactions(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE, direction = "BOUGHT"):
-        
-        tickers_str = ""
-        for ticker in tickers[:-1]:
-            tickers_str = tickers_str + '"' + ticker + '", '
-            
-        tickers_str = tickers_str + '"' + tickers[-1] + '"'
-        
+
+    # Class initializer, calls initializer from parent class and brings the schema
+    # up to date
+    def __init__(self, databasePath, googledatatable, **kwargs):
+        self._snapshot = None
+        self._snapshotPending = {}
+        self._calendars = None
+        self._currencyTickers = None
+        self._writeCount = 0
+        super().__init__(databasePath, googledatatable, **kwargs)
+        self.migrateSchema()
+
+    # Returns the "?, ?, ..." placeholder list for a parameterized IN clause
+    @staticmethod
+    def _placeholders(values):
+        return ", ".join(["?"] * len(values))
+
+    # SQL used by getTransactions. The date predicate compares the bare column with
+    # constants so that the (INSTRUMENT_x, DATE) indexes can be used.
+    def _transactionsQuery(self, tickers, direction):
         if direction == "BOUGHT":
-            sqlQuery = '''
-               	SELECT *
-            	FROM FACT_TRANSACTIONS 
-            	WHERE INSTRUMENT_BOUGHT in ({}) and datetime(DATE) BETWEEN date("{}") AND date("{}")
-            	ORDER BY TRANSACTION_ID;     
-            ''' \
-                .format(tickers_str, startDate, endDate)
+            instrument = self.INSTRUMENT_BOUGHT
         elif direction == "SOLD":
-            sqlQuery = '''
-               	SELECT *
-            	FROM FACT_TRANSACTIONS 
-            	WHERE INSTRUMENT_SOLD in ({}) and datetime(DATE) BETWEEN date("{}") AND date("{}")
-            	ORDER BY TRANSACTION_ID;     
-            ''' \
-                .format(tickers_str, startDate, endDate)
+            instrument = self.INSTRUMENT_SOLD
         else:
             raise ValueError("Invalid option provided")
-        data = self.readDatabase(sqlQuery) 
+        return '''
+            SELECT *
+            FROM {}
+            WHERE {} in ({}) and {} BETWEEN datetime(?) AND datetime(?)
+            ORDER BY {};
+        ''' \
+            .format(self.TRANSACTIONS_TABLE_NAME, instrument, self._placeholders(tickers),
+                    self.DATE, self.TRANSACTION_ID)
+
+    # SQL used by loadPriceSeries to read the full series of the tickers
+    def _pricesQuery(self, tickers):
+        return '''
+            SELECT {}, {}, {}
+            FROM {}
+            WHERE {} in ({})
+            ORDER BY {}, {};
+        ''' \
+            .format(self.IB_TICKER, self.DATE, self.PRICE, self.HISTORICAL_TABLE_NAME,
+                    self.IB_TICKER, self._placeholders(tickers), self.IB_TICKER, self.DATE)
+
+    # SQL used by getDividends
+    def _dividendsQuery(self, tickers):
+        return '''
+            SELECT *
+            FROM {}
+            WHERE {} in ({}) and {} BETWEEN datetime(?) AND datetime(?)
+            ORDER BY {}, {};
+        ''' \
+            .format(self.DIVIDEND_TABLE_NAME, self.IB_TICKER, self._placeholders(tickers),
+                    self.DIVIDEND_DATE, self.IB_TICKER, self.DIVIDEND_DATE)
+
+    # Filter transactions table FACT_TRANSACTIONS for a range of dates and tickers
+    def getTransactions(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE, direction = "BOUGHT"):
+        sqlQuery = self._transactionsQuery(tickers, direction)
+        data = self.readDatabase(sqlQuery, params = list(tickers) + [startDate, endDate])
         return data
-    
+
     # Filter stock information table DIM_STOCKS for a range of tickers
     def getStockInfo(self, tickers):
-        
-        tickers_str = ""
-        for ticker in tickers[:-1]:
-            tickers_str = tickers_str + '"' + ticker + '", '
-            
-        tickers_str = tickers_str + '"' + tickers[-1] + '"'
-        
         sqlQuery = '''
-           	SELECT *
-        	FROM DIM_STOCKS 
-        	WHERE IB_TICKER in ({});     
+            SELECT *
+            FROM {}
+            WHERE {} in ({});
         ''' \
-            .format(tickers_str)
-        data = self.readDatabase(sqlQuery) 
+            .format(self.STOCKS_TABLE_NAME, self.IB_TICKER, self._placeholders(tickers))
+        data = self.readDatabase(sqlQuery, params = list(tickers))
         return data
-    
-    # Filter historical prices table FACT_HISTPRICES for a range of dates and tickers
+
+    # Filter historical prices table FACT_HISTPRICES for a range of dates and tickers.
+    # The series are served from the in-memory PRICE_STORE.
     def getPrices(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
-        
-        tickers_str = ""
-        for ticker in tickers[:-1]:
-            tickers_str = tickers_str + '"' + ticker + '", '
-            
-        tickers_str = tickers_str + '"' + tickers[-1] + '"'
-        
-        sqlQuery = '''
-           	SELECT *
-        	FROM FACT_HISTPRICES 
-        	WHERE IB_TICKER in ({}) and datetime(DATE) BETWEEN date("{}") AND date("{}")
-        	ORDER BY IB_TICKER, DATE;     
-        ''' \
-            .format(tickers_str, startDate, endDate)
-        data = self.readDatabase(sqlQuery)
-        data[self.DATE] = pd.to_datetime(data[self.DATE], format = '%Y-%m-%d %H:%M:%S')
+        tickers = sorted(set(tickers))
+        series = PRICE_STORE.getSeries(self, tickers)
+        start = utils.toDays(startDate)
+        end = utils.toDays(endDate)
+        dates = []
+        prices = []
+        for ticker in tickers:
+            tickerDates, tickerPrices = series[ticker]
+            first = np.searchsorted(tickerDates, start, side = "left")
+            last = np.searchsorted(tickerDates, end, side = "right")
+            dates.append(tickerDates[first:last])
+            prices.append(tickerPrices[first:last])
+        counts = [len(d) for d in dates]
+        data = pd.DataFrame({self.DATE: utils.toDatetimes(np.concatenate(dates) if dates else []),
+                             self.IB_TICKER: np.repeat(tickers, counts).astype(object),
+                             self.PRICE: np.concatenate(prices) if prices else np.array([])})
         return data
-    
+
+    # Reads the full price series of each ticker with a single query. Returns a
+    # dictionary ticker -> (dates as datetime64[D], prices as float64), used to fill PRICE_STORE.
+    # Derived series (see isDerivedSeries) are computed from the stored series they depend on.
+    def loadPriceSeries(self, tickers):
+        derived = [ticker for ticker in tickers if self.isDerivedSeries(ticker)]
+        if not derived:
+            return self._loadStoredSeries(tickers)
+        components = {ticker: [ticker[:3], ticker[3:]] if len(ticker) == 6 else [] for ticker in derived}
+        stored = [ticker for ticker in tickers if ticker not in components]
+        stored += [currency for pair in components.values() for currency in pair if currency != FX_BASE_CURRENCY]
+        series = self._loadStoredSeries(list(dict.fromkeys(stored))) if stored else {}
+        series[FX_BASE_CURRENCY] = self._baseCurrencySeries()
+        for ticker, pair in components.items():
+            if pair:
+                series[ticker] = self._crossRateSeries(*[None if currency == FX_BASE_CURRENCY else series[currency] for currency in pair])
+        self._derivedLoaded = getattr(self, "_derivedLoaded", set()) | set(derived)
+        return {ticker: series[ticker] for ticker in tickers}
+
+    # True if the prices of ticker are computed rather than stored: the base currency
+    # of the rates (a constant 1) and the cross rates between two currencies of
+    # DIM_STOCKS named by joining their tickers (e.g. CHFUSD, the price of 1 CHF in USD)
+    def isDerivedSeries(self, ticker):
+        if ticker == FX_BASE_CURRENCY:
+            return True
+        currencies = self.getCurrencyTickers()
+        return len(ticker) == 6 and ticker[:3] != ticker[3:] \
+            and ticker[:3] in currencies and ticker[3:] in currencies
+
+    # Set of the tickers of the currencies: the DIM_STOCKS tickers quoted in themselves
+    # and the base currency of the rates. Kept until DIM_STOCKS changes.
+    def getCurrencyTickers(self):
+        if self._currencyTickers is None:
+            sqlQuery = """SELECT {} FROM {} WHERE {} = {}""" \
+                .format(self.IB_TICKER, self.STOCKS_TABLE_NAME, self.IB_TICKER, self.IB_CURRENCY)
+            self._currencyTickers = {row[0] for row in self.getConnection().execute(sqlQuery)} | {FX_BASE_CURRENCY}
+        return self._currencyTickers
+
+    # Constant series of the base currency, daily from the first stored price (or
+    # DEFAULT_STARTDATE if earlier) to today
+    def _baseCurrencySeries(self):
+        sqlQuery = """SELECT min({}) FROM {}""".format(self.DATE, self.HISTORICAL_TABLE_NAME)
+        firstDate = self.getConnection().execute(sqlQuery).fetchone()[0]
+        start = utils.toDays(utils.DEFAULT_STARTDATE)
+        if firstDate is not None:
+            start = min(start, utils.toDays(firstDate))
+        dates = np.arange(start, utils.toDays(utils.DEFAULT_DATE) + 1)
+        return dates, np.ones(len(dates))
+
+    # Price of the first currency in the second one from their series of rates to the
+    # base currency (None for the base currency itself), on the dates of either
+    # series with each rate taken as of that date
+    @staticmethod
+    def _crossRateSeries(numerator, denominator):
+        dates = np.unique(np.concatenate([series[0] for series in (numerator, denominator) if series is not None]))
+        rates = []
+        for series in (numerator, denominator):
+            rate = np.ones(len(dates))
+            if series is not None:
+                index = np.searchsorted(series[0], dates, side = "right") - 1
+                rate[index < 0] = np.nan
+                rate[index >= 0] = series[1][index[index >= 0]]
+            rates.append(rate)
+        prices = rates[0] / rates[1]
+        available = ~np.isnan(prices)
+        return dates[available], prices[available]
+
+    # Reads the stored price series of the tickers from the snapshot, if one is used,
+    # and from the database for the tickers with changes not yet in the snapshot
+    def _loadStoredSeries(self, tickers):
+        pending = self._snapshotPending.get(self.HISTORICAL_TABLE_NAME, set())
+        if self._snapshot is None or pending is True:
+            return self._queryStoredSeries(tickers)
+        series = self._snapshot.readPrices([ticker for ticker in tickers if ticker not in pending])
+        changed = [ticker for ticker in tickers if ticker in pending]
+        if changed:
+            series.update(self._queryStoredSeries(changed))
+        return series
+
+    # Reads the stored price series of the tickers with a single query
+    def _queryStoredSeries(self, tickers):
+        sqlQuery = self._pricesQuery(tickers)
+        rows = self.getConnection().execute(sqlQuery, list(tickers)).fetchall()
+        series = {ticker: (np.array([], dtype = 'datetime64[D]'), np.array([], dtype = float)) for ticker in tickers}
+        if rows:
+            rowTickers, rowDates, rowPrices = zip(*rows)
+            rowTickers = np.array(rowTickers)
+            rowDates = utils.toDays(rowDates)
+            rowPrices = np.array(rowPrices, dtype = float)
+            # Rows are sorted by ticker, split them at each change of ticker
+            splits = np.flatnonzero(rowTickers[1:] != rowTickers[:-1]) + 1
+            for first, last in zip(np.r_[0, splits], np.r_[splits, len(rowTickers)]):
+                series[rowTickers[first]] = (rowDates[first:last], rowPrices[first:last])
+        return series
+
+    # Adds the dataframe to the table and brings what is derived from it up to date
+    # (see afterWrite), from the earliest date written
+    def addToDatabase(self, dataFrame, tableName, **kwargs):
+        if dataFrame.empty:
+            return 0
+        with self.transaction():
+            rowsAdded = super().addToDatabase(dataFrame, tableName, **kwargs)
+            if tableName == self.TRANSACTIONS_TABLE_NAME:
+                tickers = pd.concat([dataFrame[self.INSTRUMENT_BOUGHT], dataFrame[self.INSTRUMENT_SOLD]]).dropna().unique().tolist()
+            else:
+                tickers = dataFrame[self.IB_TICKER].unique().tolist() if self.IB_TICKER in dataFrame else None
+            dateColumn = self.DIVIDEND_DATE if tableName == self.DIVIDEND_TABLE_NAME else self.DATE
+            fromDate = self._minDate(dataFrame[dateColumn]) if dateColumn in dataFrame else utils.MIN_DATE
+            self.afterWrite(tableName, tickers, fromDate)
+        return rowsAdded
+
+    # Post-write hook, run by every write to the tables (addToDatabase, clearTable,
+    # removeTransaction and the importers writing with Database.addToDatabase) for
+    # the rows of tickers (all of them if None) changed from fromDate onwards. For
+    # FACT_TRANSACTIONS tickers are the instruments bought and sold. Invalidates the
+    # cached price series, rates and calendars, refreshes or revalues FACT_POSITIONS, deletes
+    # the stale rows of FACT_RISK, marks the changes for the snapshot and bumps the
+    # write count.
+    def afterWrite(self, tableName, tickers = None, fromDate = utils.MIN_DATE):
+        self._writeCount += 1
+        self.markSnapshotChanged(tableName, tickers)
+        if tableName == self.HISTORICAL_TABLE_NAME:
+            PRICE_STORE.invalidate(self.databasePath, tickers)
+            # Derived series may depend on the new prices
+            PRICE_STORE.invalidate(self.databasePath, list(getattr(self, "_derivedLoaded", [])))
+            self.getFXService().invalidate(tickers)
+            self.invalidateRisk(tickers, fromDate)
+            self.revaluePositions(tickers, fromDate)
+        elif tableName == self.TRANSACTIONS_TABLE_NAME:
+            if tickers is None:
+                self.rebuildPositions()
+            else:
+                self.refreshPositions(tickers, fromDate)
+            self.invalidateRisk([] if tickers is None else tickers, fromDate)
+        elif tableName == self.DIVIDEND_TABLE_NAME:
+            # Dividends are cash flows of the portfolio
+            self.invalidateRisk([], fromDate)
+        elif tableName == self.STOCKS_TABLE_NAME:
+            self._calendars = None
+            self._currencyTickers = None
+
+    # Executes a custom sql command (see Database.executeCommand). The command can
+    # change any table, so it counts as a write.
+    def executeCommand(self, sql_command, params = ()):
+        rowsAffected = super().executeCommand(sql_command, params)
+        self._writeCount += 1
+        return rowsAffected
+
+    # Number of writes made through this PortfolioDB (see afterWrite and executeCommand).
+    # What is cached from the tables, e.g. the events of Stock, is valid while it is unchanged.
+    def getWriteCount(self):
+        return self._writeCount
+
+    # Earliest date of a column of dates, as a "yyyy-mm-dd 00:00:00" string
+    @staticmethod
+    def _minDate(dates):
+        return str(utils.toDays(dates.values).min()) + " 00:00:00"
+
+    # Deletes all rows from the table (see afterWrite)
+    def clearTable(self, tableName):
+        super().clearTable(tableName)
+        self.afterWrite(tableName)
+
+    # Get the prices of several tickers as a dense dates x tickers matrix. The date axis
+    # holds every calendar day between startDate and endDate. Each column is forward
+    # filled, starting from the last price on or before startDate. Tickers missing from
+    # PRICE_STORE are read with a single query.
+    # Returns the dates (datetime64[D]), the tickers and the price matrix (NaN where
+    # no price is available yet).
+    def getPriceMatrix(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
+        tickers = list(dict.fromkeys(tickers))
+        series = PRICE_STORE.getSeries(self, tickers)
+        dates = np.arange(utils.toDays(startDate), utils.toDays(endDate) + 1)
+        prices = np.full((len(dates), len(tickers)), np.nan)
+        for i, ticker in enumerate(tickers):
+            tickerDates, tickerPrices = series[ticker]
+            # Index of the last price on or before each date, -1 if there is none
+            index = np.searchsorted(tickerDates, dates, side = "right") - 1
+            available = index >= 0
+            prices[available, i] = tickerPrices[index[available]]
+        return dates, np.array(tickers), prices
+
+    # As-of price lookup: for each pair (tickers[i], dates[i]) returns the last price
+    # on or before dates[i] and the date of that price (NaN and NaT if there is none).
+    # Each ticker costs one binary search over its cached series.
+    def getPricesAsOf(self, tickers, dates):
+        tickers = np.asarray(tickers, dtype = object)
+        dates = np.broadcast_to(utils.toDays(dates), tickers.shape)
+        prices = np.full(tickers.shape, np.nan)
+        effectiveDates = np.full(tickers.shape, np.datetime64('NaT'), dtype = 'datetime64[D]')
+        uniqueTickers = list(dict.fromkeys(tickers.tolist()))
+        series = PRICE_STORE.getSeries(self, uniqueTickers)
+        for ticker in uniqueTickers:
+            tickerDates, tickerPrices = series[ticker]
+            mask = tickers == ticker
+            index = np.searchsorted(tickerDates, dates[mask], side = "right") - 1
+            available = index >= 0
+            prices[np.flatnonzero(mask)[available]] = tickerPrices[index[available]]
+            effectiveDates[np.flatnonzero(mask)[available]] = tickerDates[index[available]]
+        return prices, effectiveDates
+
+    # Cost in EUR of the transactions in the dataframe (rows of FACT_TRANSACTIONS).
+    # The price paid is the quantity of the instrument sold times its price, converted
+    # from its currency with the rate of the transaction date (or the last date before it).
+    # Commissions are paid in COMMISSION_CURRENCY. currencyField is the DIM_STOCKS
+    # currency column of the data source. Returns the price paid and commissions
+    # arrays (0 where a price or rate is missing).
+    def getTransactionsCostEUR(self, transactions, currencyField):
+        fx = self.getFXService()
+        dates = utils.toDays(transactions[self.DATE].values)
+        instrumentsSold = transactions[self.INSTRUMENT_SOLD].values
+        soldPrice, _ = self.getPricesAsOf(instrumentsSold, dates)
+        soldCurrencies = self.getCurrencies(instrumentsSold, currencyField)
+        pricePaid = fx.convert(transactions[self.QUANTITY_SOLD].values * soldPrice, soldCurrencies, dates, "EUR")
+        commissions = fx.convert(transactions[self.COMMISSION].values, self.COMMISSION_CURRENCY, dates, "EUR")
+        return np.nan_to_num(pricePaid), np.nan_to_num(commissions)
+
+    # Currency (DIM_STOCKS currencyField) of each ticker, "" if the ticker is unknown
+    def getCurrencies(self, tickers, currencyField):
+        tickers = list(tickers)
+        if not tickers:
+            return []
+        info = self.getStockInfo(list(set(tickers)))
+        currencies = dict(zip(info[self.IB_TICKER], info[currencyField]))
+        return [currencies.get(ticker, "") for ticker in tickers]
+
+    # Currency conversion service shared by everything reading this database
+    def getFXService(self):
+        if getattr(self, "_fxService", None) is None:
+            self._fxService = FXService(self)
+        return self._fxService
+
+    # Google Finance sheet parsed in a SheetStore. googledatatable can be a SheetStore
+    # (e.g. SheetStore.fromCSV) or the dataframe of the sheet, which is parsed once.
+    def getSheetStore(self):
+        if isinstance(self.googledatatable, SheetStore):
+            return self.googledatatable
+        if getattr(self, "_sheetStore", None) is None:
+            self._sheetStore = SheetStore.fromDataFrame(self.googledatatable)
+        return self._sheetStore
 
     # Filter historical dividends table FACT_DIVIDENDS for a range of dates and tickers
     def getDividends(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
-        
-        tickers_str = ""
-        for ticker in tickers[:-1]:
-            tickers_str = tickers_str + '"' + ticker + '", '
-            
-        tickers_str = tickers_str + '"' + tickers[-1] + '"'
-        
+        sqlQuery = self._dividendsQuery(tickers)
+        data = self.readDatabase(sqlQuery, params = list(tickers) + [startDate, endDate])
+        return data
+
+    ################ Positions ###########################
+
+    # Recomputes the rows of FACT_POSITIONS of the instruments in tickers from fromDate
+    # onwards, starting from their last position before fromDate. If tickers is None
+    # all the instruments with transactions on or after fromDate are refreshed.
+    def refreshPositions(self, tickers = None, fromDate = utils.MIN_DATE):
+        if not self._tableExists(self.POSITIONS_TABLE_NAME):
+            return
+        if tickers is None:
+            sqlQuery = '''
+                SELECT {bought} FROM {table} WHERE {date} >= datetime(?)
+                UNION
+                SELECT {sold} FROM {table} WHERE {date} >= datetime(?);
+            '''.format(bought = self.INSTRUMENT_BOUGHT, sold = self.INSTRUMENT_SOLD,
+                         table = self.TRANSACTIONS_TABLE_NAME, date = self.DATE)
+            rows = self.getConnection().execute(sqlQuery, [fromDate, fromDate]).fetchall()
+            tickers = [row[0] for row in rows]
+        tickers = [ticker for ticker in dict.fromkeys(tickers) if ticker]
+        if not tickers:
+            return
+
+        with self.transaction() as conn:
+            # Totals before fromDate, to carry forward
+            sqlQuery = '''
+                SELECT {ticker}, MAX({date}), {bought}, {sold}, {pricepaid}, {commission}
+                FROM {table}
+                WHERE {ticker} in ({placeholders}) and {date} < datetime(?)
+                GROUP BY {ticker};
+            '''.format(ticker = self.IB_TICKER, date = self.DATE, bought = self.TOTAL_BOUGHT,
+                         sold = self.TOTAL_SOLD, pricepaid = self.TOTAL_PRICEPAID_EUR,
+                         commission = self.TOTAL_COMMISSION_EUR, table = self.POSITIONS_TABLE_NAME,
+                         placeholders = self._placeholders(tickers))
+            base = {row[0]: row[2:] for row in conn.execute(sqlQuery, tickers + [fromDate]).fetchall()}
+
+            conn.execute("DELETE FROM {} WHERE {} in ({}) and {} >= datetime(?)"
+                         .format(self.POSITIONS_TABLE_NAME, self.IB_TICKER, self._placeholders(tickers), self.DATE),
+                         tickers + [fromDate])
+
+            bought = self.getTransactions(tickers, fromDate, utils.MAX_DATE, direction = "BOUGHT")
+            sold = self.getTransactions(tickers, fromDate, utils.MAX_DATE, direction = "SOLD")
+            pricePaid, commissions = self.getTransactionsCostEUR(bought, self.getCurrencyField())
+            flows = pd.concat([
+                pd.DataFrame({self.DATE: utils.toDays(bought[self.DATE].values),
+                              self.IB_TICKER: bought[self.INSTRUMENT_BOUGHT].values,
+                              self.TOTAL_BOUGHT: bought[self.QUANTITY_BOUGHT].values.astype(float),
+                              self.TOTAL_SOLD: 0.0,
+                              self.TOTAL_PRICEPAID_EUR: pricePaid,
+                              self.TOTAL_COMMISSION_EUR: commissions}),
+                pd.DataFrame({self.DATE: utils.toDays(sold[self.DATE].values),
+                              self.IB_TICKER: sold[self.INSTRUMENT_SOLD].values,
+                              self.TOTAL_BOUGHT: 0.0,
+                              self.TOTAL_SOLD: sold[self.QUANTITY_SOLD].values.astype(float),
+                              self.TOTAL_PRICEPAID_EUR: 0.0,
+                              self.TOTAL_COMMISSION_EUR: 0.0})])
+            flows = flows[flows[self.IB_TICKER].isin(tickers)]
+            if flows.empty:
+                return
+
+            # Daily flows per instrument, accumulated on top of the totals before fromDate
+            totalColumns = [self.TOTAL_BOUGHT, self.TOTAL_SOLD, self.TOTAL_PRICEPAID_EUR, self.TOTAL_COMMISSION_EUR]
+            positions = flows.groupby([self.IB_TICKER, self.DATE], as_index = False)[totalColumns].sum()
+            positions[totalColumns] = positions.groupby(self.IB_TICKER)[totalColumns].cumsum()
+            baseTotals = np.array([base.get(ticker, (0.0, 0.0, 0.0, 0.0)) for ticker in positions[self.IB_TICKER]], dtype = float)
+            positions[totalColumns] = positions[totalColumns].values + baseTotals.reshape(-1, len(totalColumns))
+            positions[self.TOTAL_OWNED] = positions[self.TOTAL_BOUGHT] - positions[self.TOTAL_SOLD]
+            positions[self.DATE] = utils.toDatetimes(positions[self.DATE].values)
+            Database.addToDatabase(self, positions[self.POSITIONS_COLUMNS], self.POSITIONS_TABLE_NAME)
+
+    # Values again the EUR amounts of FACT_POSITIONS after the prices of tickers (all
+    # of them if None) changed from fromDate onwards. The cost of a transaction uses
+    # the price of the instrument sold and the rates of the currencies as of its
+    # date, so the instruments bought with the tickers are refreshed from fromDate,
+    # and all the instruments when the tickers include a currency.
+    def revaluePositions(self, tickers = None, fromDate = utils.MIN_DATE):
+        if not self._tableExists(self.POSITIONS_TABLE_NAME):
+            return
+        if tickers is None or not self.getCurrencyTickers().isdisjoint(tickers):
+            self.refreshPositions(None, fromDate)
+            return
+        sqlQuery = "SELECT DISTINCT {} FROM {} WHERE {} in ({}) and {} >= datetime(?)" \
+            .format(self.INSTRUMENT_BOUGHT, self.TRANSACTIONS_TABLE_NAME, self.INSTRUMENT_SOLD,
+                    self._placeholders(tickers), self.DATE)
+        rows = self.getConnection().execute(sqlQuery, list(tickers) + [fromDate]).fetchall()
+        self.refreshPositions([row[0] for row in rows], fromDate)
+
+    # Rebuilds FACT_POSITIONS from the full transaction history
+    def rebuildPositions(self):
+        if not self._tableExists(self.POSITIONS_TABLE_NAME):
+            return
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM {}".format(self.POSITIONS_TABLE_NAME))
+            self.refreshPositions(None, utils.MIN_DATE)
+        print("Positions rebuilt")
+
+    # Filter positions table FACT_POSITIONS for a range of dates and tickers. The last
+    # position before startDate of each ticker is returned as well, so that the totals
+    # can be forward filled from startDate.
+    def getPositions(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
+        sqlQuery = self._positionsQuery(tickers)
+        data = self.readDatabase(sqlQuery, params = list(tickers) + [startDate, endDate] + list(tickers) + [startDate])
+        data[self.DATE] = utils.toDatetimes(utils.toDays(data[self.DATE].values))
+        return data
+
+    # SQL used by getPositions
+    def _positionsQuery(self, tickers):
+        columns = ", ".join(self.POSITIONS_COLUMNS)
+        return '''
+            SELECT {columns}
+            FROM {table}
+            WHERE {ticker} in ({placeholders}) and {date} BETWEEN datetime(?) AND datetime(?)
+            UNION ALL
+            SELECT {columns}
+            FROM (SELECT {ticker} AS T, MAX({date}) AS D FROM {table}
+                  WHERE {ticker} in ({placeholders}) and {date} < datetime(?)
+                  GROUP BY {ticker}) LAST
+            JOIN {table} ON {ticker} = LAST.T and {date} = LAST.D
+            ORDER BY {ticker}, {date};
+        '''.format(columns = columns, table = self.POSITIONS_TABLE_NAME, ticker = self.IB_TICKER,
+                     date = self.DATE, placeholders = self._placeholders(tickers))
+
+    ################ Risk metrics ###########################
+
+    # Filter risk table FACT_RISK for a range of dates and tickers (PORTFOLIO for the
+    # portfolio, see RiskMetrics.py)
+    def getRisk(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
         sqlQuery = '''
-           	SELECT *
-        	FROM FACT_DIVIDENDS 
-        	WHERE IB_TICKER in ({}) and datetime(DIVIDEND_DATE) BETWEEN date("{}") AND date("{}")
-        	ORDER BY IB_TICKER, DIVIDEND_DATE;     
+            SELECT {}
+            FROM {}
+            WHERE {} in ({}) and {} BETWEEN datetime(?) AND datetime(?)
+            ORDER BY {}, {};
         ''' \
-            .format(tickers_str, startDate, endDate)
-        data = self.readDatabase(sqlQuery) 
+            .format(", ".join(self.RISK_COLUMNS), self.RISK_TABLE_NAME, self.IB_TICKER, self._placeholders(tickers),
+                    self.DATE, self.IB_TICKER, self.DATE)
+        data = self.readDatabase(sqlQuery, params = list(tickers) + [startDate, endDate])
+        data[self.DATE] = utils.toDatetimes(utils.toDays(data[self.DATE].values))
         return data
-    
+
+    # Dictionary ticker -> last date in FACT_RISK, for the tickers with rows
+    def getLastRiskDates(self, tickers):
+        sqlQuery = "SELECT {0}, MAX({1}) FROM {2} WHERE {0} in ({3}) GROUP BY {0}" \
+            .format(self.IB_TICKER, self.DATE, self.RISK_TABLE_NAME, self._placeholders(tickers))
+        return dict(self.getConnection().execute(sqlQuery, list(tickers)).fetchall())
+
+    # Deletes the rows of FACT_RISK of the tickers and of the portfolio (all the rows
+    # if tickers is None) from fromDate onwards, so that they are computed again
+    def invalidateRisk(self, tickers, fromDate = utils.MIN_DATE):
+        if not self._tableExists(self.RISK_TABLE_NAME):
+            return
+        sqlCommand = "DELETE FROM {} WHERE {} >= datetime(?)".format(self.RISK_TABLE_NAME, self.DATE)
+        params = [fromDate]
+        if tickers is not None:
+            tickers = list(tickers) + [utils.PORTFOLIO]
+            sqlCommand += " AND {} in ({})".format(self.IB_TICKER, self._placeholders(tickers))
+            params += tickers
+        self.getConnection().execute(sqlCommand, params)
+
+    # Removes the transactions matching the given values and updates the positions of
+    # the instruments involved (see afterWrite). Returns the number of rows removed.
+    def removeTransaction(self, date, instrumentBought, quantityBought, instrumentSold, quantitySold):
+        sqlCommand = '''DELETE FROM {}
+            WHERE {} = datetime(?) AND {} = ? AND {} = ? AND {} = ? AND {} = ?''' \
+            .format(self.TRANSACTIONS_TABLE_NAME, self.DATE, self.INSTRUMENT_BOUGHT,
+                    self.QUANTITY_BOUGHT, self.INSTRUMENT_SOLD, self.QUANTITY_SOLD)
+        with self.transaction():
+            rowsRemoved = self.executeCommand(sqlCommand, [date, instrumentBought, quantityBought, instrumentSold, quantitySold])
+            if rowsRemoved:
+                self.afterWrite(self.TRANSACTIONS_TABLE_NAME, [instrumentBought, instrumentSold], date)
+        return rowsRemoved
+
+    ################ Columnar snapshot ###########################
+
+    # Reads the price series from the columnar snapshot at path (see Snapshot.py),
+    # written or brought up to date first. From then on the snapshot is refreshed
+    # with the changes of each write, once the write is committed. Returns the snapshot.
+    def useSnapshot(self, path = None):
+        self._snapshot = Snapshot(self, path)
+        self._snapshotPending = {}
+        self._snapshot.sync()
+        return self._snapshot
+
+    # Columnar snapshot in use, None if there is none
+    def getSnapshot(self):
+        return self._snapshot
+
+    # Records that the rows of tickers (all the rows if tickers is None) of a fact table
+    # changed, so that they are refreshed in the snapshot when the outermost
+    # transaction commits (immediately outside a transaction)
+    def markSnapshotChanged(self, tableName, tickers = None):
+        if self._snapshot is None or tableName not in self.FACT_TABLES:
+            return
+        pending = self._snapshotPending
+        if tickers is None or tableName == self.TRANSACTIONS_TABLE_NAME:
+            pending[tableName] = True
+        elif pending.get(tableName) is not True:
+            pending.setdefault(tableName, set()).update(tickers)
+        if getattr(self._local, "depth", 0) == 0:
+            self._refreshSnapshot()
+
+    # Writes the pending changes to the snapshot
+    def _refreshSnapshot(self):
+        pending, self._snapshotPending = self._snapshotPending, {}
+        if self._snapshot is not None and pending:
+            self._snapshot.refresh(pending.get(self.HISTORICAL_TABLE_NAME), pending.get(self.DIVIDEND_TABLE_NAME),
+                                   pending.get(self.TRANSACTIONS_TABLE_NAME, False))
+
+    # Context manager that runs the enclosed statements in a single transaction (see
+    # Database.transaction). The changes are written to the snapshot once the
+    # outermost transaction commits, and dropped if it rolls back.
+    @contextmanager
+    def transaction(self):
+        try:
+            with super().transaction() as conn:
+                yield conn
+        except BaseException:
+            if self._local.depth == 0:
+                self._snapshotPending = {}
+            raise
+        if self._local.depth == 0 and self._snapshotPending:
+            self._refreshSnapshot()
+
+    # DIM_STOCKS column with the currency of the prices of the data source
+    def getCurrencyField(self, source = None):
+        source = utils.datasource if source is None else source
+        if source == "YAHOOFINANCE":
+            return self.YAHOO_CURRENCY
+        return self.GOOGLE_FINANCE_CURRENCY
+
+    def _tableExists(self, tableName):
+        sqlQuery = "SELECT 1 FROM sqlite_master WHERE type = 'table' and name = ?"
+        return self.getConnection().execute(sqlQuery, [tableName]).fetchone() is not None
+
+    ################ Schema migrations ###########################
+
+    # Brings the schema up to SCHEMA_VERSION. The applied version is stored in
+    # PRAGMA user_version, so each migration runs once per database file.
+    # Nothing is done until the fact tables have been created.
+    def migrateSchema(self):
+        if not all(self._tableExists(table) for table in self.FACT_TABLES):
+            return
+        conn = self.getConnection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        with self.transaction() as conn:
+            for migrationVersion, statements, method in self.MIGRATIONS:
+                if migrationVersion <= version:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                # Data migrations are methods of PortfolioDB run after the statements
+                if method is not None:
+                    getattr(self, method)()
+            conn.execute("PRAGMA user_version = {}".format(self.SCHEMA_VERSION))
+        conn.execute("ANALYZE")
+        print("Schema migrated from version {} to {}.".format(version, self.SCHEMA_VERSION))
+
+    # Runs EXPLAIN QUERY PLAN on the range queries of the fact tables and raises
+    # an AssertionError if any of them falls back to a full table scan.
+    def checkQueryPlans(self, tickers = ("EUR", "USD")):
+        tickers = list(tickers)
+        dates = [utils.DEFAULT_STARTDATE, utils.DEFAULT_DATE]
+        queries = {"getTransactions BOUGHT": (self._transactionsQuery(tickers, "BOUGHT"), tickers + dates),
+                   "getTransactions SOLD": (self._transactionsQuery(tickers, "SOLD"), tickers + dates),
+                   "loadPriceSeries": (self._pricesQuery(tickers), tickers),
+                   "getDividends": (self._dividendsQuery(tickers), tickers + dates),
+                   "getPositions": (self._positionsQuery(tickers), tickers + dates + tickers + dates[:1])}
+        plans = []
+        for name, (sqlQuery, params) in queries.items():
+            plan = self.explainQuery(sqlQuery, params)
+            plan.insert(0, "QUERY", name)
+            plans.append(plan)
+        plans = pd.concat(plans, ignore_index = True)
+        scans = plans[plans["detail"].str.match(r"SCAN (TABLE )?FACT_")]
+        if not scans.empty:
+            raise AssertionError("Full table scan in {}. Module: checkQueryPlans.".format(scans["QUERY"].tolist()))
+        return plans
+
     # Checks whether stock is in database, if not it stockScrape to get all the data.
     # If it is in data base it checks whether the stock information is up to date and only fetches new data
     # Source can be GOOGLEFINANCE or YAHOOFINANCE
     
     def updateStockData(self, stockCode, source = "GOOGLEFINANCE"):
+        if self.isDerivedSeries(stockCode):
+            return
+        # The Google Finance sheet is ingested for all the tickers at the first call
+        if source == "GOOGLEFINANCE":
+            if getattr(self, "_ingested", None) is None:
+                self.ingestSheet()
+            if stockCode in self._ingested:
+                return
+        
         # Reads database
         sqlQuery = """SELECT {} FROM {} WHERE {} = '{}'; """ \
         .format(self.IB_TICKER, self.HISTORICAL_TABLE_NAME, self.IB_TICKER, stockCode)
@@ -137,8 +682,8 @@ class PortfolioDB(Database):
             
             y = self.readDatabase(sqlQuery)  
             minDate = y.Date[0]    # minDate is the earliest data of data that the program needs to download
-            # Increment date by 1 day
-            minDate = utils.incrementDate(minDate)
+            # First trading day of the exchange after the latest price
+            minDate = self.nextSessions({stockCode: minDate})[stockCode]
             
             today = datetime.now()
             today = today.replace(hour=0, minute=0, second=0, microsecond=0) # end date
@@ -175,27 +720,29 @@ class PortfolioDB(Database):
     # function which does the first time initialization of the stock and 
     #downloads all past stock data, returns array of dates, and array of data
     def stockScrape(self, stockCode, source = "GOOGLEFINANCE", minDate = utils.DEFAULT_STARTDATE):
+        stockDataFrame = self.fetchStockData(stockCode, source, minDate)
+               
+        # Add to SQL database
+        self.addToDatabase(stockDataFrame, self.HISTORICAL_TABLE_NAME, onConflict = "UPDATE")
+
+    # Downloads the prices of stockCode from minDate from the source and returns them
+    # as a dataframe with the HISTORICAL_COLUMNS. symbol is the code of the stock in
+    # the source, looked up in DIM_STOCKS if not given.
+    def fetchStockData(self, stockCode, source = "GOOGLEFINANCE", minDate = utils.DEFAULT_STARTDATE, symbol = None):
         # Initialize pandas dataframe to hold stock data    
         stockDataFrame =  pd.DataFrame({self.DATE: [], self.IB_TICKER: [], self.PRICE: []});
 
-        if stockCode == 'EUR':
-            sdate = utils.convertDate(minDate)  # start date
-            edate = datetime.now()
-            edate = edate.replace(hour=0, minute=0, second=0, microsecond=0) # end date
-            
-            delta = edate - sdate       # as timedelta
-            
-            for i in range(delta.days + 1):
-                day = sdate + timedelta(days=i)
-                day = datetime.combine(day, datetime.min.time())
-                stockDataFrame.loc[i] = [day] + ['EUR'] + [1] 
+        if self.isDerivedSeries(stockCode):
+            # Computed from the stored series when read, nothing to download
+            print("{} is a derived series, no data downloaded. Module: fetchStockData.".format(stockCode))
         else:
             if source == "YAHOOFINANCE":
-                YahooCode = self.getYahooCode(stockCode)
-                stock = yf.Ticker(YahooCode)
+                # yfinance is only loaded when needed
+                import YahooFinance
+                YahooCode = self.getYahooCode(stockCode) if symbol is None else symbol
                 
                 sdate = utils.convertDate(minDate)  # start date
-                dowloaded_data = stock.history(interval="1d", start = sdate)
+                dowloaded_data = YahooFinance.getHistory(YahooCode, sdate)
             
                 # Manipulate the output
                 Dates = dowloaded_data.index.to_frame()
@@ -205,31 +752,156 @@ class PortfolioDB(Database):
                 Ticker = pd.DataFrame([stockCode] * len(dowloaded_data['Close']),columns=['Ticker'])
                 
             if source == "GOOGLEFINANCE":
-                googleticker = self.getGoogleCode(stockCode)
-                data = self.googledatatable.copy()
+                googleticker = self.getGoogleCode(stockCode) if symbol is None else symbol
                 
-                sdate = utils.convertDate(minDate)  # start date
                 edate = datetime.now()
                 edate = edate.replace(hour=0, minute=0, second=0, microsecond=0) # end date
                 
-                data.DATE = pd.to_datetime(data.DATE, format = '%d/%m/%Y')
-                dates_mask = ((data.DATE >= sdate) & (data.DATE <= edate))
-                data = data.loc[dates_mask, [self.DATE, googleticker]]
-                
-                data = data.dropna()
-                data = data[(data[googleticker] != 'NA')]
+                # Views on the parsed sheet, the missing values ('NA') are dropped
+                dates, prices = self.getSheetStore().series(googleticker, minDate, edate)
                                 
-                Dates =  pd.DataFrame(data.DATE,columns=['DATE']).reset_index(drop=True)
-                Ticker = pd.DataFrame([stockCode] * len(data.DATE),columns=['Ticker'])
-                Price =  pd.DataFrame(data[googleticker],columns=[googleticker]).reset_index(drop=True)
+                Dates =  pd.DataFrame({'DATE': utils.toDatetimes(dates)})
+                Ticker = pd.DataFrame([stockCode] * len(dates),columns=['Ticker'])
+                Price =  pd.DataFrame({googleticker: prices})
                 
             stockDataFrame =  pd.concat([Dates, Ticker, Price], axis = 1)
         
         stockDataFrame.columns = self.HISTORICAL_COLUMNS
-        stockDataFrame.ignore_index=True
-               
-        # Add to SQL database
-        self.addToDatabase(stockDataFrame, self.HISTORICAL_TABLE_NAME)
+        # Daily dates without time zone and numeric prices, whatever the source
+        dates = pd.to_datetime(stockDataFrame[self.DATE])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        stockDataFrame[self.DATE] = dates.dt.normalize()
+        stockDataFrame[self.PRICE] = pd.to_numeric(stockDataFrame[self.PRICE])
+        return stockDataFrame.reset_index(drop = True)
+
+    # Date from which each ticker needs new prices, read with a single query: the
+    # first session of its exchange after its latest price. Tickers without prices
+    # start from DEFAULT_STARTDATE, tickers that are up to date (e.g. when the days
+    # since the latest price are weekends or holidays) are left out.
+    def planRefresh(self, tickers):
+        sqlQuery = """SELECT {}, max({}) FROM {} WHERE {} in ({}) GROUP BY {}""" \
+            .format(self.IB_TICKER, self.DATE, self.HISTORICAL_TABLE_NAME, self.IB_TICKER,
+                    self._placeholders(tickers), self.IB_TICKER)
+        latest = dict(self.getConnection().execute(sqlQuery, list(tickers)).fetchall())
+        
+        today = datetime.now()
+        today = today.replace(hour=0, minute=0, second=0, microsecond=0)
+        nextSessions = self.nextSessions(latest)
+        plan = {}
+        for ticker in tickers:
+            if ticker not in latest:
+                plan[ticker] = utils.DEFAULT_STARTDATE
+                continue
+            minDate = nextSessions[ticker]
+            if utils.convertDate(minDate) < today:
+                plan[ticker] = minDate
+            else:
+                print("Data for {} are already up to date. Module: planRefresh.".format(ticker))
+        return plan
+
+    # Trading calendar of each ticker (see TradingCalendar.py), from its IB_EXCHANGE
+    # and GOOGLE_FINANCE_SYMBOL. Derived series are quoted every day. The calendars
+    # are kept until DIM_STOCKS changes.
+    def getCalendars(self, tickers):
+        if self._calendars is None:
+            self._calendars = {}
+        tickers = list(dict.fromkeys(tickers))
+        missing = [ticker for ticker in tickers if ticker not in self._calendars]
+        self._calendars.update({ticker: DAILY for ticker in missing if self.isDerivedSeries(ticker)})
+        missing = [ticker for ticker in missing if ticker not in self._calendars]
+        if missing:
+            info = self.getStockInfo(missing)
+            self._calendars.update({ticker: getCalendar(exchange, symbol) for ticker, exchange, symbol
+                                    in zip(info[self.IB_TICKER], info[self.IB_EXCHANGE], info[self.GOOGLE_FINANCE_SYMBOL])})
+            # Tickers not in DIM_STOCKS trade on weekdays
+            self._calendars.update({ticker: getCalendar(None) for ticker in missing if ticker not in self._calendars})
+        return {ticker: self._calendars[ticker] for ticker in tickers}
+
+    # First session after the date of each ticker in the dictionary ticker -> date,
+    # as "yyyy-mm-dd 00:00:00" strings
+    def nextSessions(self, dates):
+        calendars = self.getCalendars(list(dates))
+        return {ticker: str(calendars[ticker].nextSession(utils.toDays(date) + 1)) + " 00:00:00"
+                for ticker, date in dates.items()}
+
+    # Code of each ticker in the source (GOOGLE_FINANCE_SYMBOL or YAHOO_SYMBOL)
+    def getSymbols(self, tickers, source = "GOOGLEFINANCE"):
+        symbolField = self.YAHOO_SYMBOL if source == "YAHOOFINANCE" else self.GOOGLE_FINANCE_SYMBOL
+        info = self.getStockInfo(list(tickers))
+        return dict(zip(info[self.IB_TICKER], info[symbolField]))
+
+    # Refreshes the prices of many tickers at once. The tickers needing data are
+    # planned with one query, downloaded concurrently by at most maxWorkers threads
+    # and all the new rows are written in a single transaction. fetcher is called as
+    # fetcher(stockCode, source, minDate, symbol) and defaults to fetchStockData, it
+    # can be replaced by a local stand-in provider. A failure on one ticker is
+    # reported and does not stop the others.
+    # Returns the number of rows added per ticker and the errors per ticker.
+    def refreshAll(self, tickers, source = "GOOGLEFINANCE", maxWorkers = REFRESH_WORKERS, fetcher = None):
+        tickers = [ticker for ticker in dict.fromkeys(tickers) if not self.isDerivedSeries(ticker)]
+        if not tickers:
+            return {}, {}
+        plan = self.planRefresh(tickers)
+        symbols = self.getSymbols(list(plan), source) if plan else {}
+        if fetcher is None:
+            fetcher = self.fetchStockData
+            if source == "GOOGLEFINANCE" and plan:
+                # Parse the sheet before the workers share it
+                self.getSheetStore()
+        
+        results = {}
+        errors = {}
+        # The workers only download, all the database access stays in this thread
+        with ThreadPoolExecutor(max_workers = maxWorkers) as pool:
+            futures = {pool.submit(fetcher, ticker, source, minDate, symbols.get(ticker)): ticker
+                       for ticker, minDate in plan.items()}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    results[ticker] = future.result()
+                except Exception as error:
+                    errors[ticker] = error
+                    print("{} data not updated. {}: {}. Module: refreshAll.".format(ticker, type(error).__name__, error))
+        
+        frames = [frame for frame in results.values() if not frame.empty]
+        if frames:
+            self.addToDatabase(pd.concat(frames, ignore_index = True), self.HISTORICAL_TABLE_NAME, onConflict = "UPDATE")
+        print("Refreshed {} of {} tickers using {}.".format(len(results), len(plan), source))
+        return {ticker: len(frame) for ticker, frame in results.items()}, errors
+    
+    # Ingests the Google Finance sheet for every ticker of DIM_STOCKS (or of tickers)
+    # with a GOOGLE_FINANCE_SYMBOL in the sheet, in a single pass: the date from
+    # which each ticker needs prices comes from one query, the wide sheet is melted
+    # into (DATE, IB_TICKER, PRICE) rows keeping only the new prices up to today and
+    # all the rows are written at once. Returns the number of rows added per ticker.
+    def ingestSheet(self, tickers = None):
+        sqlQuery = """SELECT {}, {} FROM {} WHERE {} IS NOT NULL""" \
+            .format(self.IB_TICKER, self.GOOGLE_FINANCE_SYMBOL, self.STOCKS_TABLE_NAME, self.GOOGLE_FINANCE_SYMBOL)
+        symbols = dict(self.getConnection().execute(sqlQuery).fetchall())
+        if tickers is not None:
+            symbols = {ticker: symbols[ticker] for ticker in tickers if ticker in symbols}
+        store = self.getSheetStore()
+        symbols = {ticker: symbol for ticker, symbol in symbols.items() if symbol in store.symbols}
+        
+        plan = self.planRefresh(list(symbols)) if symbols else {}
+        added = {ticker: 0 for ticker in symbols}
+        if plan:
+            planned = np.array(list(plan), dtype = object)
+            prices = store.prices[[store.symbols.index(symbols[ticker]) for ticker in planned]]
+            start = utils.toDays(list(plan.values())).astype(np.int64)
+            today = utils.toDays(datetime.now()).astype(np.int64)
+            # tickers x dates mask of the prices to add
+            mask = ~np.isnan(prices) & (store.dates >= start[:, np.newaxis]) & (store.dates <= today)
+            rows, cols = np.nonzero(mask)
+            data = pd.DataFrame({self.DATE: utils.toDatetimes(store.dates[cols]),
+                                 self.IB_TICKER: planned[rows],
+                                 self.PRICE: prices[rows, cols]})
+            self.addToDatabase(data, self.HISTORICAL_TABLE_NAME, onConflict = "UPDATE")
+            added.update(zip(planned, mask.sum(axis = 1).tolist()))
+        self._ingested = getattr(self, "_ingested", set()) | set(symbols)
+        print("Ingested {} prices of {} tickers from the Google Finance sheet.".format(sum(added.values()), len(added)))
+        return added
     
     # DB Names
     
@@ -247,6 +919,9 @@ class PortfolioDB(Database):
     QUANTITY_SOLD = "QUANTITY_SOLD"
     COMMISSION = "COMMISSION"
     
+    # Currency in which the commissions are paid
+    COMMISSION_CURRENCY = "CHF"
+
     # Calculated fields
     TOTAL_SOLD = "TOTAL_SOLD"
     TOTAL_BOUGHT = "TOTAL_BOUGHT"
@@ -303,4 +978,59 @@ class PortfolioDB(Database):
     
     DIVIDEND_COLUMNS = [DIVIDEND_DATE, IB_TICKER, DIVIDEND_AMOUNT]  
        
-    DIVIDEND_COLUMN_LIST =  "{} DATE, {} TEXT, {} REAL".format(DIVIDEND_DATE,  IB_TICKER,  DIVIDEND_AMOUNT)
\ No newline at end of file
+    DIVIDEND_COLUMN_LIST =  "{} DATE, {} TEXT, {} REAL".format(DIVIDEND_DATE,  IB_TICKER,  DIVIDEND_AMOUNT)
+
+    ## Positions table
+    # Materialized running totals of FACT_TRANSACTIONS. One row per instrument and per
+    # date with transactions, holding the totals up to and including that date.
+    # Maintained by refreshPositions when transactions are written or removed. The
+    # EUR amounts are valued with the prices known at that time and valued again by
+    # revaluePositions when prices or rates on or before their dates are written.
+    # Table Name
+    POSITIONS_TABLE_NAME = "FACT_POSITIONS"
+
+    # Table Columns
+    TOTAL_PRICEPAID_EUR = "TOTAL_PRICEPAID_EUR"
+    TOTAL_COMMISSION_EUR = "TOTAL_COMMISSION_EUR"
+
+    POSITIONS_COLUMNS = [DATE, IB_TICKER, TOTAL_BOUGHT, TOTAL_SOLD, TOTAL_OWNED, TOTAL_PRICEPAID_EUR, TOTAL_COMMISSION_EUR]
+
+    POSITIONS_COLUMN_LIST = "{} DATETIME NOT NULL, {} TEXT NOT NULL, {} REAL NOT NULL, {} REAL NOT NULL, {} REAL NOT NULL, {} REAL NOT NULL, {} REAL NOT NULL, PRIMARY KEY ({}, {})" \
+        .format(DATE, IB_TICKER, TOTAL_BOUGHT, TOTAL_SOLD, TOTAL_OWNED, TOTAL_PRICEPAID_EUR, TOTAL_COMMISSION_EUR, IB_TICKER, DATE)
+
+    ## Risk table
+    # Rolling risk metrics of the instruments and of the portfolio (IB_TICKER
+    # "Portfolio") on each weekday. Maintained by RiskMetrics.RiskEngine, the rows
+    # made stale by new prices or transactions are deleted by invalidateRisk.
+    # Table Name
+    RISK_TABLE_NAME = "FACT_RISK"
+
+    # Table Columns
+    VOLATILITY = "VOLATILITY"
+    MAX_DRAWDOWN = "MAX_DRAWDOWN"
+    SHARPE = "SHARPE"
+    SORTINO = "SORTINO"
+    BETA = "BETA"
+
+    RISK_COLUMNS = [DATE, IB_TICKER, VOLATILITY, MAX_DRAWDOWN, SHARPE, SORTINO, BETA]
+
+    RISK_COLUMN_LIST = "{} DATETIME NOT NULL, {} TEXT NOT NULL, {} REAL, {} REAL, {} REAL, {} REAL, {} REAL, PRIMARY KEY ({}, {})" \
+        .format(DATE, IB_TICKER, VOLATILITY, MAX_DRAWDOWN, SHARPE, SORTINO, BETA, IB_TICKER, DATE)
+
+    FACT_TABLES = [TRANSACTIONS_TABLE_NAME, HISTORICAL_TABLE_NAME, DIVIDEND_TABLE_NAME]
+
+    ## Schema migrations
+    # List of (version, statements, name of a PortfolioDB method to run after the
+    # statements or None). Add new migrations at the end and bump SCHEMA_VERSION.
+    MIGRATIONS = [
+        (1, ["CREATE INDEX IF NOT EXISTS IDX_HISTPRICES_TICKER_DATE ON {} ({}, {}, {})".format(HISTORICAL_TABLE_NAME, IB_TICKER, DATE, PRICE),
+             "CREATE INDEX IF NOT EXISTS IDX_DIVIDENDS_TICKER_DATE ON {} ({}, {}, {})".format(DIVIDEND_TABLE_NAME, IB_TICKER, DIVIDEND_DATE, DIVIDEND_AMOUNT),
+             "CREATE INDEX IF NOT EXISTS IDX_TRANSACTIONS_BOUGHT_DATE ON {} ({}, {})".format(TRANSACTIONS_TABLE_NAME, INSTRUMENT_BOUGHT, DATE),
+             "CREATE INDEX IF NOT EXISTS IDX_TRANSACTIONS_SOLD_DATE ON {} ({}, {})".format(TRANSACTIONS_TABLE_NAME, INSTRUMENT_SOLD, DATE)],
+         None),
+        (2, ["CREATE TABLE IF NOT EXISTS {} ({})".format(POSITIONS_TABLE_NAME, POSITIONS_COLUMN_LIST)],
+         "rebuildPositions"),
+        (3, ["CREATE TABLE IF NOT EXISTS {} ({})".format(RISK_TABLE_NAME, RISK_COLUMN_LIST)],
+         None),
+    ]
+    SCHEMA_VERSION = 3
@@ -42,6 +42,30 @@ Modified 7/12/2016:
     based on how much you want to increase the portfolio value by, whether selling is 
     allowed or not and what the minimum transaction is to keep the portfolio weightings
     to the desired allocation.
+Modified 18/10/2026:
+    * getValue() and plotPortfolio() use ValuationEngine, which values all the
+    stocks at once on aligned numpy arrays instead of looping and merging one
+    dataframe per stock. Values are in EUR.
+    * getValue(), getCurrentPercentages() and valuePath() use the last available
+    price of each stock on or before the date (getHoldingsAsOf()) instead of
+    stepping back one day at a time until every stock has a price.
+    * Plotting moved to Plotting.py, imported only when plotting, so importing
+    this module does not load matplotlib and seaborn. The testing code only runs
+    when the file is executed. printPurchases reads FACT_TRANSACTIONS through
+    the PortfolioDB names instead of the removed stockContract module.
+    * Added iterValuation() and exportValuation(), which value the portfolio in
+    chunks of dates so that long histories can be streamed to a csv file.
+    plotPortfolio() builds the totals chunk by chunk.
+    * Added getLotValuation(), the cost basis and realized / unrealized profit &
+    loss of the stocks by FIFO, LIFO or average cost lots (see LotEngine.py). The
+    lots are saved next to the database and only the new transactions are
+    processed at the next call.
+    * Added getReturns(), the time weighted and money weighted (XIRR) returns of
+    every stock and of the whole portfolio, solved in one batched call (see
+    Analytics.py).
+    * Added updateRisk() and getRisk(): rolling volatility, max drawdown,
+    Sharpe and Sortino ratios and beta of every stock and of the portfolio,
+    stored in FACT_RISK and updated only for the new days (see RiskMetrics.py).
     
 
 To Do:
@@ -53,16 +77,22 @@ To Do:
 from Stock import Stock
 from ValueStock import ValueStock
 from Database import Database
-import stockContract as SC
+from PortfolioDB import PortfolioDB
+from ValuationEngine import ValuationEngine, CHUNK_DAYS
+from LotEngine import LotEngine
+import Analytics
+from RiskMetrics import RiskEngine
+import utils
+from utils import DEFAULT_DATE, DEFAULT_STARTDATE, convertDate
 import datetime
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
 import numpy as np
 import pandas as pd
 
 ###############
 ## Constants ##
 ###############
+DEFAULT_STOCKCODE = "All" # all the stocks of the portfolio
 
    
 # Portfolio class for holding all of the stock objects that the user holds in
@@ -70,11 +100,15 @@ import pandas as pd
 
 class Portfolio: 
     # Class initializer
-    def __init__(self, databaseName):
+    def __init__(self, databaseName, googledatatable = None):
         self.databasePath = "" + databaseName + ".db"
         # Create SQL database
-        self.stockDatabase = PortfolioDB(self.databasePath);
-        self.stockList = self.getStockList()
+        self.stockDatabase = PortfolioDB(self.databasePath, googledatatable);
+        # Stocks of the database, with a weighting of 0 until it is set by addStock
+        self.stockList = []
+        if self.stockDatabase._tableExists(self.stockDatabase.STOCKS_TABLE_NAME):
+            self.stockList = [ValueStock(stockCode, 0, self.stockDatabase, updateData = False)
+                              for stockCode in self.getStockList()]
 
     # Class string method
     def __str__(self):
@@ -86,34 +120,100 @@ class Portfolio:
         .format(self.getCost(DEFAULT_DATE), self.getValue(DEFAULT_DATE), self.getDividends(DEFAULT_DATE), self.getValue(DEFAULT_DATE) + self.getDividends(DEFAULT_DATE))
         return returnString
 
+    # Tickers of all the stocks in the database
     def getStockList(self):
         sqlQuery = '''
-           	SELECT IB_TICKER FROM DIM_STOCKS;     
+           	SELECT {} FROM {};     
         ''' \
-            .format(tickers_str)
-        data = self.readDatabase(sqlQuery)
-        return data.to_list()
+            .format(self.stockDatabase.IB_TICKER, self.stockDatabase.STOCKS_TABLE_NAME)
+        data = self.stockDatabase.readDatabase(sqlQuery)
+        return data[self.stockDatabase.IB_TICKER].tolist()
         
-    # Add a new stock with code "stockCode" to the portfolio
-    def addStock(self, stockCode, percentage):
-        newStock = ValueStock(stockCode, percentage, self.stockDatabase)
-        self.stockList.append(newStock)
+    # Add a new stock with code "stockCode" to the portfolio. With updateData = False
+    # the prices are not downloaded, call refreshData() once all the stocks are added.
+    # A stock already in the portfolio is replaced, keeping its place in the list.
+    def addStock(self, stockCode, percentage, updateData = True):
+        newStock = ValueStock(stockCode, percentage, self.stockDatabase, updateData)
+        codes = [stock.stockCode for stock in self.stockList]
+        if stockCode in codes:
+            self.stockList[codes.index(stockCode)] = newStock
+        else:
+            self.stockList.append(newStock)
         return newStock
     
+    # Downloads the new prices of all the stocks concurrently, in a single transaction
+    def refreshData(self, source = utils.datasource):
+        return self.stockDatabase.refreshAll([stock.stockCode for stock in self.stockList], source)
+    
     # Calculate the total value of the portfolio on a particular date
     def getValue(self, date = DEFAULT_DATE):
-        result = None
-        while result is None:
-            try:
-                totalValue = 0
-                for stock in self.stockList:
-                    totalValue += stock.getValue(date)
-                result = totalValue
-            except:
-                # decrement date by one day
-                date = decrementDate(date)
+        return self.getHoldingsAsOf(date)["Value"].sum()
+        
+    # Value all the stocks of the portfolio for every day in the date range
+    def getValuation(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
+        engine = ValuationEngine(self.stockDatabase)
+        return engine.run([stock.stockCode for stock in self.stockList], dateStart, dateEnd)
+        
+    # Generator of the valuations of all the stocks of the portfolio for each chunk of
+    # chunkDays days in the date range (see ValuationEngine.iterRun)
+    def iterValuation(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE, chunkDays = CHUNK_DAYS):
+        engine = ValuationEngine(self.stockDatabase)
+        return engine.iterRun([stock.stockCode for stock in self.stockList], dateStart, dateEnd, chunkDays)
 
-        return result
+    # Writes the portfolio totals by date (Valuation.totals()) to the csv file at path,
+    # one chunk of dates at a time. Returns the number of dates written.
+    def exportValuation(self, path, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE, chunkDays = CHUNK_DAYS):
+        rowsWritten = 0
+        with open(path, "w", newline = "") as file:
+            for valuation in self.iterValuation(dateStart, dateEnd, chunkDays):
+                valuation.totals().to_csv(file, header = rowsWritten == 0, index = False)
+                rowsWritten += len(valuation.dates)
+        print("Valuation of {} dates exported to {}.".format(rowsWritten, path))
+        return rowsWritten
+        
+    # Dataframe with the time weighted return (total and annualized) and the money
+    # weighted return (XIRR) of each stock of the portfolio and of the portfolio as
+    # a whole over the date range
+    def getReturns(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
+        valuation = self.getValuation(dateStart, dateEnd)
+        return Analytics.returnsSummary(valuation, Analytics.cashFlows(self.stockDatabase, valuation))
+        
+    # Computes the rolling risk metrics of the stocks of the portfolio and of the
+    # portfolio as a whole for the days not in FACT_RISK yet. Returns the rows added.
+    def updateRisk(self, dateEnd = DEFAULT_DATE):
+        engine = RiskEngine(self.stockDatabase)
+        return engine.update([stock.stockCode for stock in self.stockList], dateEnd)
+        
+    # Dataframe of the stored risk metrics of the stocks and of the portfolio
+    # (Stock Code "Portfolio") in the date range, updated first
+    def getRisk(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
+        self.updateRisk(dateEnd)
+        return self.stockDatabase.getRisk([stock.stockCode for stock in self.stockList] + [utils.PORTFOLIO], dateStart, dateEnd)
+        
+    # Cost basis, realized and unrealized profit & loss of all the stocks of the
+    # portfolio for every day in the date range, by lots closed with method (FIFO,
+    # LIFO or AVERAGE). The lots are resumed from and saved to a json file next to
+    # the database, so only the transactions added since the last call are processed.
+    def getLotValuation(self, method = "FIFO", dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
+        engine = LotEngine(self.stockDatabase, method)
+        statePath = "{}.lots-{}.json".format(os.path.splitext(self.databasePath)[0], method.lower())
+        engine.load(statePath)
+        valuation = engine.run([stock.stockCode for stock in self.stockList], dateStart, dateEnd)
+        engine.save(statePath)
+        return valuation
+        
+    # Dataframe with, for each stock, the last available price on or before date (in
+    # EUR), the date of that price and the value of the holding in EUR. Prices are
+    # resolved per stock with one array search, so weekends and market closures do
+    # not need any retry.
+    def getHoldingsAsOf(self, date = DEFAULT_DATE):
+        valuation = self.getValuation(date, date)
+        index = valuation.dateIndex(date)
+        _, priceDates = self.stockDatabase.getPricesAsOf(valuation.tickers, date)
+        return pd.DataFrame({"Stock Code": valuation.tickers,
+                             "Price": valuation.prices[index] * valuation.fx[index],
+                             "Price Date": priceDates,
+                             "Value": valuation.value[index]})
         
         
     # Calculate the total cost of the portfolio on a particular date
@@ -136,20 +236,12 @@ class Portfolio:
     # For each ValueStock in the portfolio calculate its current percentage of the
     # total value and set it to the currentPercentage value in the ValueStock.
     def getCurrentPercentages(self):
-        date = DEFAULT_DATE
-        result = False
-        while not result:
-            try:
-                totalDesired = 0
-                portfolioValue = self.getValue(date)
-                for valueStock in self.stockList:
-                    stockValue = valueStock.getValue(date)
-                    valueStock.currentPercentage = 100*stockValue/portfolioValue
-                    totalDesired += valueStock.setPercentage
-                result = True
-            except:
-                # decrement date by one day
-                date = decrementDate(date)
+        holdings = self.getHoldingsAsOf(DEFAULT_DATE)
+        portfolioValue = holdings["Value"].sum()
+        totalDesired = 0
+        for valueStock, stockValue in zip(self.stockList, holdings["Value"]):
+            valueStock.currentPercentage = 100*stockValue/portfolioValue
+            totalDesired += valueStock.setPercentage
                 
         # Make sure the desired portfolio percentages add to 0
         if totalDesired != 100:
@@ -164,27 +256,19 @@ class Portfolio:
     #   buy or sell per transaction. Usually want to limit this to avoid excess
     #   transaction fees.
     def valuePath(self, portfolioIncrease, sellingAllowed, minimumTransaction):
-        date = DEFAULT_DATE
-        result = False
-        while not result:
-            try:
-                currentTotalValue = self.getValue(date)
-                desiredTotalValue = currentTotalValue + portfolioIncrease
-                totalSpent = 0
-                for stock in self.stockList:
-                    currentStockValue = stock.getValue(date)
-                    desiredStockValue = stock.setPercentage / 100 * desiredTotalValue
-                    if desiredStockValue - currentStockValue > minimumTransaction:
-                        stock.desiredBuy = round((desiredStockValue - currentStockValue)/stock.getPrice(date))
-                    elif sellingAllowed and desiredStockValue - currentStockValue < -minimumTransaction:
-                        stock.desiredBuy = round((desiredStockValue - currentStockValue)/stock.getPrice(date))
-                    else:
-                        stock.desiredBuy = 0
-                    totalSpent += stock.desiredBuy * stock.getPrice(date)
-                result = True
-            except:
-                # decrement date by one day
-                date = decrementDate(date)
+        holdings = self.getHoldingsAsOf(DEFAULT_DATE)
+        currentTotalValue = holdings["Value"].sum()
+        desiredTotalValue = currentTotalValue + portfolioIncrease
+        totalSpent = 0
+        for stock, currentStockValue, stockPrice in zip(self.stockList, holdings["Value"], holdings["Price"]):
+            desiredStockValue = stock.setPercentage / 100 * desiredTotalValue
+            if desiredStockValue - currentStockValue > minimumTransaction:
+                stock.desiredBuy = round((desiredStockValue - currentStockValue)/stockPrice)
+            elif sellingAllowed and desiredStockValue - currentStockValue < -minimumTransaction:
+                stock.desiredBuy = round((desiredStockValue - currentStockValue)/stockPrice)
+            else:
+                stock.desiredBuy = 0
+            totalSpent += stock.desiredBuy * stockPrice
         
         # Print out value path  
         print("\n")
@@ -197,25 +281,25 @@ class Portfolio:
         desiredAllocation = []
         finalAllocation = []
         
-        for stock in self.stockList:
-            cost = stock.getPrice(date) * stock.desiredBuy
-            finalWeight = 100 * (stock.getValue(date) + cost) / (currentTotalValue + totalSpent)
+        for stock, stockValue, stockPrice in zip(self.stockList, holdings["Value"], holdings["Price"]):
+            cost = stockPrice * stock.desiredBuy
+            finalWeight = 100 * (stockValue + cost) / (currentTotalValue + totalSpent)
             numBuy.append(int(stock.desiredBuy))
             code.append(stock.stockCode)
-            price.append(stock.getPrice(date))
+            price.append(stockPrice)
             costArray.append(cost)
             desiredAllocation.append(stock.setPercentage)
             finalAllocation.append("{:.1f}".format(finalWeight))
         
         valueData = pd.DataFrame({"Stock Code": code,
                                   "To Buy": numBuy,
-                                  "Price ($)": price,
-                                  "Total Cost ($)": costArray,
+                                  "Price (EUR)": price,
+                                  "Total Cost (EUR)": costArray,
                                   "Desired (%)": desiredAllocation,
                                   "Final (%)": finalAllocation
-                                  }, columns=['Stock Code', 'To Buy', 'Price ($)', "Total Cost ($)", "Desired (%)", "Final (%)"])
+                                  }, columns=['Stock Code', 'To Buy', 'Price (EUR)', "Total Cost (EUR)", "Desired (%)", "Final (%)"])
         print(valueData)
-        print("Total to spend: ${:.2f}. Total portfolio value after purchase: ${:.2f}.".format(totalSpent, totalSpent + currentTotalValue))
+        print("Total to spend: EUR {:.2f}. Total portfolio value after purchase: EUR {:.2f}.".format(totalSpent, totalSpent + currentTotalValue))
                             
                 
     # Print values
@@ -229,22 +313,26 @@ class Portfolio:
     # Setting stockCode to "All" prints all stocks. Otherwise prints list of 
     # purchases for stockCode.    
     def printPurchases(self, stockCode = DEFAULT_STOCKCODE, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
+        db = self.stockDatabase
         sqlQuery = '''SELECT * FROM {}
-            WHERE {} BETWEEN date("{}") and date("{}")'''\
-            .format(SC.TABLE_NAME, SC.DATE, dateStart, dateEnd)
+            WHERE {} BETWEEN datetime(?) and datetime(?)'''\
+            .format(db.TRANSACTIONS_TABLE_NAME, db.DATE)
+        params = [dateStart, dateEnd]
         
         if stockCode != DEFAULT_STOCKCODE:
-            sqlQuery += ''' AND {} LIKE '{}' '''.format(SC.CODE, stockCode)
+            sqlQuery += ''' AND ({} = ? OR {} = ?) '''.format(db.INSTRUMENT_BOUGHT, db.INSTRUMENT_SOLD)
+            params += [stockCode, stockCode]
         
-        sqlQuery += ''' ORDER BY {}, {} '''.format(SC.CODE, SC.DATE)    
-        queryDataFrame = self.stockDatabase.readDatabase(sqlQuery)
+        sqlQuery += ''' ORDER BY {}, {} '''.format(db.DATE, db.TRANSACTION_ID)    
+        queryDataFrame = db.readDatabase(sqlQuery, params = params)
         print(queryDataFrame)
         
     
     # Plots the stocks in the list stockList over the daterange. If stockList == "All",
     # it plots all of the stocks in the portfolio.
     def plot(self, stockList = DEFAULT_STOCKCODE, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
-        plt.close("all")
+        import Plotting
+        Plotting.closeAll()
         if stockList == DEFAULT_STOCKCODE:
             stockList = self.stockList
         for stock in stockList:
@@ -253,241 +341,188 @@ class Portfolio:
             
     # Plots the total portfolio value, amount spent and profit        
     def plotPortfolio(self, dateStart = DEFAULT_STARTDATE, dateEnd = DEFAULT_DATE):
-        plt.close("all")
-        # Make an empty dataframe for merging using the date values in the first stock
-        # in stockList.
-        date = self.stockList[0].getValueRange(dateStart, dateEnd)[SC.HISTORICAL_DATE].tolist()
-        spent = pd.DataFrame({SC.HISTORICAL_DATE: date, SC.TOTAL_SPENT: list(np.zeros(len(date)))})
-        value = pd.DataFrame({SC.HISTORICAL_DATE: date, "Value": list(np.zeros(len(date)))})
-        dividends = pd.DataFrame({SC.HISTORICAL_DATE: date, "DIVIDEND_TOTAL": list(np.zeros(len(date)))})
-        
-        # Loop over the stocks in stockList merging their data into the total
-        # dataFrames (performs outer join).
-        for s in self.stockList:
-            spent = pd.merge(spent, s.getSpentRange(dateStart, dateEnd), how = "outer", on = SC.HISTORICAL_DATE)
-            value = pd.merge(value, s.getValueRange(dateStart, dateEnd), how = "outer", on = SC.HISTORICAL_DATE)
-            dividends = pd.merge(dividends, s.getDividendRange(dateStart, dateEnd), how = "outer", on = SC.HISTORICAL_DATE)
-        
-        # Forward fill missing data, for dates that don't exist in db
-        spent = spent.fillna(method = "ffill")
-        value = value.fillna(method = "ffill")
-        dividends = dividends.fillna(method = "ffill") 
-        
-        # Create total value column by summing the merged columns (except date)
-        spent["Total"] = spent.sum(axis = 1)
-        value["Total"] = value.sum(axis = 1)
-        dividends["Total"] = dividends.sum(axis = 1)
-        
-        # Create date column from merged data for plotting
-        date = list(map(convertDate, spent[SC.HISTORICAL_DATE]))
-        
-#         Do plotting
-        fig = plt.figure()
-        plt.clf()
-        
-        ax = fig.add_subplot(511)
-        plt.title("Portfolio Totals", fontsize = 16)
-        ax.plot(date, spent["Total"])
-        plt.ylabel("Spent ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(512)
-        ax.plot(date, value["Total"])
-        plt.ylabel("Value ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(513)
-        ax.plot(date, dividends["Total"])
-        plt.ylabel("Dividends ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(514)
-        plt.plot(date, value["Total"] - spent["Total"])
-        plt.plot(date, value["Total"] - spent["Total"] + dividends["Total"])
-        plt.legend(["Share Value Profit", "Share Value Profit + Dividend"], loc = "upper left")
-        plt.ylabel("Profit ($)", fontsize = 14)
-        
-        ax = fig.add_subplot(515)
-        plt.plot(date, 100*(value["Total"] - spent["Total"])/spent["Total"])
-        plt.plot(date, 100*(value["Total"] - spent["Total"] + dividends["Total"])/spent["Total"])
-        plt.legend(["Share Value Profit", "Share Value Profit + Dividend"], loc = "upper left")
-        plt.ylabel("% Profit ($)", fontsize = 14)
-        plt.xlabel("Date", fontsize = 14)
-        
-        plt.show() 
+        import Plotting
+        # Value all the stocks at once, dates without data are forward filled. Only
+        # the totals of each chunk of dates are kept.
+        totals = pd.concat([valuation.totals() for valuation in self.iterValuation(dateStart, dateEnd)], ignore_index = True)
+        Plotting.plotPortfolio(totals)
         
 
 
             
 # Testing code
-try:         
-    myPortfolio = Portfolio("myPortfolio")
-    vap = myPortfolio.addStock("VAP.AX", 10.0)
-    ijr = myPortfolio.addStock("IJR.AX", 25.0)
-    veu = myPortfolio.addStock("VEU.AX", 15.0)
-    vas = myPortfolio.addStock("VAS.AX", 25.0)
-    vgb = myPortfolio.addStock("VGB.AX", 12.5)
-    vaf = myPortfolio.addStock("VAF.AX", 12.5)
-    myPortfolio.getCurrentPercentages()
+if __name__ == "__main__":
+    try:         
+        myPortfolio = Portfolio("myPortfolio")
+        vap = myPortfolio.addStock("VAP.AX", 10.0)
+        ijr = myPortfolio.addStock("IJR.AX", 25.0)
+        veu = myPortfolio.addStock("VEU.AX", 15.0)
+        vas = myPortfolio.addStock("VAS.AX", 25.0)
+        vgb = myPortfolio.addStock("VGB.AX", 12.5)
+        vaf = myPortfolio.addStock("VAF.AX", 12.5)
+        myPortfolio.getCurrentPercentages()
     
-#    print(myPortfolio)
+    #    print(myPortfolio)
     
-#    vaf.buy(31, 48.22, "2014-04-29")
-#    vaf.buy(1, 0, "2015-01-19")
-#    vaf.buy(27, 50.39, "2015-04-29")
-#    vaf.buy(21, 49.8, "2015-07-29")
-#    vaf.buy(1, 0, "2015-10-19")
-#    vaf.buy(1, 49.01, "2016-01-19")
-#    vaf.buy(1, 49.58, "2016-04-19")
-#    vaf.buy(1, 50.02, "2016-07-18")
-#    vaf.buy(1, 49.92, "2016-10-19")
-#    
-#    vgb.buy(32, 46.81, "2014-04-29")
-#    vgb.buy(74, 47.51, "2014-10-29")
-#    vgb.buy(1, 0, "2015-01-19")
-#    vgb.buy(1, 49.74, "2015-20-04")
-#    vgb.buy(1, 0, "2015-10-19")
-#    vgb.buy(1, 48.57, "2016-01-19")
-#    vgb.buy(1, 50.53, "2016-07-18")
-#    vgb.buy(1, 50.47, "2016-10-19")
-#    
-#    vas.buy(44, 70.87, "2014-07-29")
-#    vas.buy(14, 70.90, "2014-07-31")
-#    vas.buy(14, 68.98, "2014-10-29")
-#    vas.buy(1, 0, "2015-01-19")
-#    vas.buy(20, 75.22, "2015-02-26")
-#    vas.buy(1, 74.66, "2015-04-15")
-#    vas.buy(17, 74.46, "2015-04-29")
-#    vas.buy(1, 69.25, "2015-07-16")
-#    vas.buy(17, 71.54, "2015-07-29")
-#    vas.buy(2, 0, "2015-10-19")
-#    vas.buy(2, 67.00, "2016-01-19")
-#    vas.buy(1, 64.35, "2016-04-19")
-#    vas.buy(1, 66.68, "2016-07-18")
-#    vas.buy(2, 69.68, "2016-10-19")
-#    
-#    vap.buy(26, 76.11, "2015-02-26")
-#    vap.buy(18, 74.66, "2015-04-29")
-#    vap.buy(1, 0, "2015-10-19")
-#    vap.buy(1, 74.56, "2016-01-19")
-#    vap.buy(1, 84.44, "2016-07-18")
-#    
-#    ijr.buy(61, 115.22, "2014-04-29")
-#    
-#    veu.buy(27, 55.25, "2014-05-13")
-#    veu.buy(20, 55.26, "2014-05-20")
-#    veu.buy(25, 56.08, "2014-07-29")
-#    veu.buy(16, 65.60, "2015-07-29")
+    #    vaf.buy(31, 48.22, "2014-04-29")
+    #    vaf.buy(1, 0, "2015-01-19")
+    #    vaf.buy(27, 50.39, "2015-04-29")
+    #    vaf.buy(21, 49.8, "2015-07-29")
+    #    vaf.buy(1, 0, "2015-10-19")
+    #    vaf.buy(1, 49.01, "2016-01-19")
+    #    vaf.buy(1, 49.58, "2016-04-19")
+    #    vaf.buy(1, 50.02, "2016-07-18")
+    #    vaf.buy(1, 49.92, "2016-10-19")
+    #    
+    #    vgb.buy(32, 46.81, "2014-04-29")
+    #    vgb.buy(74, 47.51, "2014-10-29")
+    #    vgb.buy(1, 0, "2015-01-19")
+    #    vgb.buy(1, 49.74, "2015-20-04")
+    #    vgb.buy(1, 0, "2015-10-19")
+    #    vgb.buy(1, 48.57, "2016-01-19")
+    #    vgb.buy(1, 50.53, "2016-07-18")
+    #    vgb.buy(1, 50.47, "2016-10-19")
+    #    
+    #    vas.buy(44, 70.87, "2014-07-29")
+    #    vas.buy(14, 70.90, "2014-07-31")
+    #    vas.buy(14, 68.98, "2014-10-29")
+    #    vas.buy(1, 0, "2015-01-19")
+    #    vas.buy(20, 75.22, "2015-02-26")
+    #    vas.buy(1, 74.66, "2015-04-15")
+    #    vas.buy(17, 74.46, "2015-04-29")
+    #    vas.buy(1, 69.25, "2015-07-16")
+    #    vas.buy(17, 71.54, "2015-07-29")
+    #    vas.buy(2, 0, "2015-10-19")
+    #    vas.buy(2, 67.00, "2016-01-19")
+    #    vas.buy(1, 64.35, "2016-04-19")
+    #    vas.buy(1, 66.68, "2016-07-18")
+    #    vas.buy(2, 69.68, "2016-10-19")
+    #    
+    #    vap.buy(26, 76.11, "2015-02-26")
+    #    vap.buy(18, 74.66, "2015-04-29")
+    #    vap.buy(1, 0, "2015-10-19")
+    #    vap.buy(1, 74.56, "2016-01-19")
+    #    vap.buy(1, 84.44, "2016-07-18")
+    #    
+    #    ijr.buy(61, 115.22, "2014-04-29")
+    #    
+    #    veu.buy(27, 55.25, "2014-05-13")
+    #    veu.buy(20, 55.26, "2014-05-20")
+    #    veu.buy(25, 56.08, "2014-07-29")
+    #    veu.buy(16, 65.60, "2015-07-29")
     
-#    vap.remove(1, 0, "2016-04-19")
-#    vap.remove(1, 0, "2016-10-18")
+    #    vap.remove(1, 0, "2016-04-19")
+    #    vap.remove(1, 0, "2016-10-18")
 
-#    veu.sell(10, 100, "2016-06-01")
-#    veu.buy(20, 100, "2016-06-02")
-#    veu.sell(10, 100, "2014-06-01")
-#    veu.remove(-10, 52.3, "2014-06-01")
-#    veu.remove(20, 59.3, "2016-06-02")
-#    veu.remove(-10, 59.3, "2016-06-01")
-##    veu.remove(100, 100, "2016-12-01")
+    #    veu.sell(10, 100, "2016-06-01")
+    #    veu.buy(20, 100, "2016-06-02")
+    #    veu.sell(10, 100, "2014-06-01")
+    #    veu.remove(-10, 52.3, "2014-06-01")
+    #    veu.remove(20, 59.3, "2016-06-02")
+    #    veu.remove(-10, 59.3, "2016-06-01")
+    ##    veu.remove(100, 100, "2016-12-01")
     
-#    vaf.addDividend(19.10, "2014-07-16")
-#    vaf.addDividend(14.61, "2014-10-17")
-#    vaf.addDividend(16.85, "2015-01-19")
-#    vaf.addDividend(13.97, "2015-04-20")
-#    vaf.addDividend(28.10, "2015-07-16")
-#    vaf.addDividend(42.88, "2015-10-19")
-#    vaf.addDividend(40.18, "2016-01-19")
-#    vaf.addDividend(35.02, "2016-04-19")
-#    vaf.addDividend(78.50, "2016-07-18")
-#    vaf.addDividend(35.35, "2016-10-19")
-#    
-#    vap.addDividend(14.63, "2015-04-20")
-#    vap.addDividend(56.19, "2015-07-16")
-#    vap.addDividend(25.04, "2015-10-19")
-#    vap.addDividend(53.65, "2016-01-19")
-#    vap.addDividend(27.02, "2016-04-19")
-#    vap.addDividend(68.13, "2016-07-18")
-#    vap.addDividend(27.07, "2016-10-19")
-#    
-#    vas.addDividend(56.65, "2014-10-17")
-#    vas.addDividend(54.51, "2015-01-19")
-#    vas.addDividend(62.95, "2015-04-20")
-#    vas.addDividend(61.32, "2015-07-16")
-#    vas.addDividend(121.75, "2015-10-19")
-#    vas.addDividend(142.11, "2016-01-19")
-#    vas.addDividend(112.61, "2016-04-19")
-#    vas.addDividend(24.22, "2016-07-18")
-#    vas.addDividend(137.72, "2016-10-19")
-#    
-#    veu.addDividend(25.88, "2014-07-17")
-#    veu.addDividend(18.82, "2014-10-17")
-#    veu.addDividend(28.34, "2015-01-19")
-#    veu.addDividend(12.80, "2015-04-29")
-#    veu.addDividend(45.71, "2015-07-28")
-#    veu.addDividend(23.55, "2015-10-28")
-#    veu.addDividend(36.34, "2016-01-25")
-#    veu.addDividend(14.52, "2016-04-18")
-#    veu.addDividend(52.75, "2016-07-14")
-#    veu.addDividend(25.05, "2016-10-13")
-#    
-#    vgb.addDividend(24.42, "2014-07-16")
-#    vgb.addDividend(11.40, "2014-10-17")
-#    vgb.addDividend(35.16, "2015-01-19")
-#    vgb.addDividend(33.83, "2015-04-20")
-#    vgb.addDividend(36.84, "2015-07-16")
-#    vgb.addDividend(31.40, "2015-10-19")
-#    vgb.addDividend(34.17, "2016-01-19")
-#    vgb.addDividend(35.35, "2016-04-19")
-#    vgb.addDividend(34.87, "2016-07-18")
-#    vgb.addDividend(32.41, "2016-10-19")
-#    
-#    ijr.addDividend(17.49, "2014-07-16")
-#    ijr.addDividend(18.60, "2014-10-17")
-#    ijr.addDividend(28.78, "2015-01-28")
-#    ijr.addDividend(28.12, "2015-04-27")
-#    ijr.addDividend(24.96, "2015-07-23")
-#    ijr.addDividend(25.45, "2015-10-27")
-#    ijr.addDividend(37.23, "2016-01-28")
-#    ijr.addDividend(27.93, "2016-04-27")
-#    ijr.addDividend(0, "2016-07-14")
-#    ijr.addDividend(0, "2016-10-13")
+    #    vaf.addDividend(19.10, "2014-07-16")
+    #    vaf.addDividend(14.61, "2014-10-17")
+    #    vaf.addDividend(16.85, "2015-01-19")
+    #    vaf.addDividend(13.97, "2015-04-20")
+    #    vaf.addDividend(28.10, "2015-07-16")
+    #    vaf.addDividend(42.88, "2015-10-19")
+    #    vaf.addDividend(40.18, "2016-01-19")
+    #    vaf.addDividend(35.02, "2016-04-19")
+    #    vaf.addDividend(78.50, "2016-07-18")
+    #    vaf.addDividend(35.35, "2016-10-19")
+    #    
+    #    vap.addDividend(14.63, "2015-04-20")
+    #    vap.addDividend(56.19, "2015-07-16")
+    #    vap.addDividend(25.04, "2015-10-19")
+    #    vap.addDividend(53.65, "2016-01-19")
+    #    vap.addDividend(27.02, "2016-04-19")
+    #    vap.addDividend(68.13, "2016-07-18")
+    #    vap.addDividend(27.07, "2016-10-19")
+    #    
+    #    vas.addDividend(56.65, "2014-10-17")
+    #    vas.addDividend(54.51, "2015-01-19")
+    #    vas.addDividend(62.95, "2015-04-20")
+    #    vas.addDividend(61.32, "2015-07-16")
+    #    vas.addDividend(121.75, "2015-10-19")
+    #    vas.addDividend(142.11, "2016-01-19")
+    #    vas.addDividend(112.61, "2016-04-19")
+    #    vas.addDividend(24.22, "2016-07-18")
+    #    vas.addDividend(137.72, "2016-10-19")
+    #    
+    #    veu.addDividend(25.88, "2014-07-17")
+    #    veu.addDividend(18.82, "2014-10-17")
+    #    veu.addDividend(28.34, "2015-01-19")
+    #    veu.addDividend(12.80, "2015-04-29")
+    #    veu.addDividend(45.71, "2015-07-28")
+    #    veu.addDividend(23.55, "2015-10-28")
+    #    veu.addDividend(36.34, "2016-01-25")
+    #    veu.addDividend(14.52, "2016-04-18")
+    #    veu.addDividend(52.75, "2016-07-14")
+    #    veu.addDividend(25.05, "2016-10-13")
+    #    
+    #    vgb.addDividend(24.42, "2014-07-16")
+    #    vgb.addDividend(11.40, "2014-10-17")
+    #    vgb.addDividend(35.16, "2015-01-19")
+    #    vgb.addDividend(33.83, "2015-04-20")
+    #    vgb.addDividend(36.84, "2015-07-16")
+    #    vgb.addDividend(31.40, "2015-10-19")
+    #    vgb.addDividend(34.17, "2016-01-19")
+    #    vgb.addDividend(35.35, "2016-04-19")
+    #    vgb.addDividend(34.87, "2016-07-18")
+    #    vgb.addDividend(32.41, "2016-10-19")
+    #    
+    #    ijr.addDividend(17.49, "2014-07-16")
+    #    ijr.addDividend(18.60, "2014-10-17")
+    #    ijr.addDividend(28.78, "2015-01-28")
+    #    ijr.addDividend(28.12, "2015-04-27")
+    #    ijr.addDividend(24.96, "2015-07-23")
+    #    ijr.addDividend(25.45, "2015-10-27")
+    #    ijr.addDividend(37.23, "2016-01-28")
+    #    ijr.addDividend(27.93, "2016-04-27")
+    #    ijr.addDividend(0, "2016-07-14")
+    #    ijr.addDividend(0, "2016-10-13")
     
-#    vgb.addDividend(100)
-#    vgb.removeDividend(100, "2016-12-05")
+    #    vgb.addDividend(100)
+    #    vgb.removeDividend(100, "2016-12-05")
     
     
-    myPortfolio.printPurchases()
-#    myPortfolio.printPurchases("VEU.AX", "2014-01-01", "2015-01-01")
-#    myPortfolio.printPurchases("VAF.AX")
-    print(myPortfolio)
-#    myPortfolio.printValues()
-    myPortfolio.valuePath(3000, False, 500)
+        myPortfolio.printPurchases()
+    #    myPortfolio.printPurchases("VEU.AX", "2014-01-01", "2015-01-01")
+    #    myPortfolio.printPurchases("VAF.AX")
+        print(myPortfolio)
+    #    myPortfolio.printValues()
+        myPortfolio.valuePath(3000, False, 500)
     
 
     
-#    print(veu.getOwned())
-#    print(veu.getPrice("2016-11-28"))
-#    print("VEU ${:.2f} ${:.2f}".format(veu.getValue("2016-11-29"), veu.totalCost))
-#    print("IJR ${:.2f} ${:.2f}".format(ijr.getValue("2016-11-29"), ijr.totalCost))
-#    print("VAP ${:.2f} ${:.2f}".format(vap.getValue("2016-11-29"), vap.totalCost))
-#    print(vap.getPriceRange("2015-02-26", "2016-01-19"))
-#    print(veu.getOwnedRange("2016-05-26"))
-#    print(vas.getValueRange("2014-05-12"))
-#    print(vas.getPriceRange("2014-05-12"))
-#    print(vas.getDividendRange("2014-01-01"))
-#    veu.plot("2014-03-01")
+    #    print(veu.getOwned())
+    #    print(veu.getPrice("2016-11-28"))
+    #    print("VEU ${:.2f} ${:.2f}".format(veu.getValue("2016-11-29"), veu.totalCost))
+    #    print("IJR ${:.2f} ${:.2f}".format(ijr.getValue("2016-11-29"), ijr.totalCost))
+    #    print("VAP ${:.2f} ${:.2f}".format(vap.getValue("2016-11-29"), vap.totalCost))
+    #    print(vap.getPriceRange("2015-02-26", "2016-01-19"))
+    #    print(veu.getOwnedRange("2016-05-26"))
+    #    print(vas.getValueRange("2014-05-12"))
+    #    print(vas.getPriceRange("2014-05-12"))
+    #    print(vas.getDividendRange("2014-01-01"))
+    #    veu.plot("2014-03-01")
 
-#    myPortfolio.plot([vas, ijr, vap], "2014-01-01")
-#    myPortfolio.plotPortfolio("2014-01-01")
+    #    myPortfolio.plot([vas, ijr, vap], "2014-01-01")
+    #    myPortfolio.plotPortfolio("2014-01-01")
     
-#    sqlQuery = '''SELECT * FROM {} 
-#    WHERE Stock_Code LIKE 'VGB.AX' 
-#    AND Date BETWEEN date("2014-01-01") AND date("2016-12-02")'''.format(SC.HISTORICAL_TABLE_NAME)
-#    print(myPortfolio.stockDatabase.readDatabase(sqlQuery))
+    #    sqlQuery = '''SELECT * FROM {} 
+    #    WHERE Stock_Code LIKE 'VGB.AX' 
+    #    AND Date BETWEEN date("2014-01-01") AND date("2016-12-02")'''.format(SC.HISTORICAL_TABLE_NAME)
+    #    print(myPortfolio.stockDatabase.readDatabase(sqlQuery))
     
 
-# The line below is just so we don't readd the data every time.
-finally:
-    print("\n")
-#    myPortfolio.stockDatabase.removeTable(SC.TABLE_NAME)
-#    myPortfolio.stockDatabase.clearTable(SC.DIVIDEND_TABLE_NAME)
-#    myPortfolio.stockDatabase.clearTable(SC.TABLE_NAME)
+    # The line below is just so we don't readd the data every time.
+    finally:
+        print("\n")
+    #    myPortfolio.stockDatabase.removeTable(SC.TABLE_NAME)
+    #    myPortfolio.stockDatabase.clearTable(SC.DIVIDEND_TABLE_NAME)
+    #    myPortfolio.stockDatabase.clearTable(SC.TABLE_NAME)
 
 
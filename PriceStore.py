@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory store of the historical price series held in FACT_HISTPRICES.
+
+A ticker's full series is loaded once into two compact numpy arrays (dates as
+datetime64[D] and prices as float64) and any date slice is then served from memory.
+The least recently used series are evicted when the store grows beyond its memory
+budget. PortfolioDB invalidates the series of a ticker whenever it writes new prices.
+
+The store is process wide: PRICE_STORE is shared by every PortfolioDB and entries
+are keyed by database path and ticker.
+
+Created on Sun Oct 18 2026
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+###############
+## Constants ##
+###############
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024  # bytes
+
+class PriceStore:
+    # Class initializer
+    def __init__(self, memoryBudget = DEFAULT_MEMORY_BUDGET):
+        self.memoryBudget = memoryBudget
+        self._series = OrderedDict()  # (databasePath, ticker) -> (dates, prices)
+        self._lock = threading.RLock()
+        self.memoryUsed = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Class string method
+    def __str__(self):
+        return "PriceStore - {} series, {:.1f} of {:.1f} MB used, {} hits, {} misses, {} evictions." \
+            .format(len(self._series), self.memoryUsed / 2**20, self.memoryBudget / 2**20,
+                    self.hits, self.misses, self.evictions)
+
+    # Returns the (dates, prices) arrays of the full series of each ticker. Tickers
+    # that are not in memory are read with a single call to database.loadPriceSeries.
+    def getSeries(self, database, tickers):
+        result = {}
+        missing = []
+        with self._lock:
+            for ticker in tickers:
+                key = (database.databasePath, ticker)
+                if key in self._series:
+                    self._series.move_to_end(key)
+                    result[ticker] = self._series[key]
+                    self.hits += 1
+                else:
+                    missing.append(ticker)
+                    self.misses += 1
+        if missing:
+            loaded = database.loadPriceSeries(missing)
+            with self._lock:
+                for ticker in missing:
+                    result[ticker] = loaded[ticker]
+                    self._put((database.databasePath, ticker), loaded[ticker])
+                self._evict(keep = len(missing))
+        return result
+
+    # Returns the (dates, prices) views of the series of ticker between startDate and
+    # endDate included. Dates are datetime64[D].
+    def getRange(self, database, ticker, startDate, endDate):
+        dates, prices = self.getSeries(database, [ticker])[ticker]
+        first = np.searchsorted(dates, startDate, side = "left")
+        last = np.searchsorted(dates, endDate, side = "right")
+        return dates[first:last], prices[first:last]
+
+    # Drops the series of tickers (all the series of the database if tickers is None)
+    # so that they are read again from the database on the next request
+    def invalidate(self, databasePath, tickers = None):
+        with self._lock:
+            if tickers is None:
+                keys = [key for key in self._series if key[0] == databasePath]
+            else:
+                keys = [(databasePath, ticker) for ticker in tickers]
+            for key in keys:
+                if key in self._series:
+                    self.memoryUsed -= self._nbytes(self._series.pop(key))
+
+    # Empties the store and resets the counters
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self.memoryUsed = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    # Returns the counters of the store, to size memoryBudget
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {"series": len(self._series),
+                    "memoryUsed": self.memoryUsed,
+                    "memoryBudget": self.memoryBudget,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "hitRate": self.hits / requests if requests else 0.0}
+
+    def _put(self, key, series):
+        if key in self._series:
+            self.memoryUsed -= self._nbytes(self._series.pop(key))
+        self._series[key] = series
+        self.memoryUsed += self._nbytes(series)
+
+    # Evicts least recently used series until the store fits in memoryBudget. The
+    # last keep series, just loaded, are never evicted.
+    def _evict(self, keep = 0):
+        while self.memoryUsed > self.memoryBudget and len(self._series) > keep:
+            key, series = self._series.popitem(last = False)
+            self.memoryUsed -= self._nbytes(series)
+            self.evictions += 1
+
+    @staticmethod
+    def _nbytes(series):
+        return sum(array.nbytes for array in series)
+
+
+PRICE_STORE = PriceStore()
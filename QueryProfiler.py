@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in instrumentation of the sql queries run by Database.
+
+When the profiler is enabled every query run through Database.readDatabase or a
+connection returned by Database.getConnection is timed. The profiler records the
+wall time, the rows returned (or changed), the method that ran the query (for
+example PortfolioDB.getPositions or Stock.update) and a fingerprint of the sql in
+which literals and IN lists are replaced by "?", so that the same query with other
+values is counted once. Queries slower than slowQueryMs are printed to stderr as
+they complete, and a summary by fingerprint (count, total time, percentiles, rows
+and callers) can be printed at the exit of the process.
+
+The profiler is off by default and then costs a single attribute check per query.
+It is enabled with QUERY_PROFILER.enable() or by setting the environment variable
+PORTFOLIO_QUERY_PROFILE=1 (PORTFOLIO_SLOW_QUERY_MS sets the slow query threshold).
+
+The profiler is process wide: QUERY_PROFILER is shared by every Database.
+
+Created on Sun Oct 18 2026
+"""
+
+import atexit
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+import numpy as np
+import pandas as pd
+
+###############
+## Constants ##
+###############
+SLOW_QUERY_MS = 100     # queries slower than this are printed as they complete
+SUMMARY_LIMIT = 20      # fingerprints printed by printSummary, slowest in total first
+PERCENTILES = (50, 95, 99)
+FINGERPRINT_WIDTH = 100 # characters of the fingerprints printed by printSummary
+
+# Frames of these files are skipped when looking for the method that ran a query
+_SKIPPED_FILES = {os.path.splitext(os.path.abspath(__file__))[0],
+                  os.path.join(os.path.dirname(os.path.abspath(__file__)), "Database")}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+# Normalized sql: literals are replaced by ?, IN lists by "in (...)" and blanks collapsed
+def fingerprint(sqlQuery):
+    sqlQuery = _STRING.sub("?", sqlQuery)
+    sqlQuery = _NUMBER.sub("?", sqlQuery)
+    sqlQuery = _LIST.sub("in (...)", sqlQuery)
+    return _SPACE.sub(" ", sqlQuery).strip()
+
+class QueryProfiler:
+    # Class initializer
+    def __init__(self):
+        self.enabled = False
+        self.slowQueryMs = SLOW_QUERY_MS
+        self._lock = threading.Lock()
+        self._fingerprints = {}                 # sql -> fingerprint, to normalize each text once
+        self._times = defaultdict(list)         # fingerprint -> seconds of each run
+        self._rows = Counter()                  # fingerprint -> rows returned or changed
+        self._callers = defaultdict(Counter)    # fingerprint -> caller -> runs
+        self._summaryRegistered = False
+
+    # Class string method
+    def __str__(self):
+        return "QueryProfiler - {}, {} queries in {} fingerprints, {:.1f} ms." \
+            .format("enabled" if self.enabled else "disabled", sum(len(times) for times in self._times.values()),
+                    len(self._times), 1000 * sum(sum(times) for times in self._times.values()))
+
+    # Starts recording the queries. With summaryAtExit the summary is printed when
+    # the process exits.
+    def enable(self, slowQueryMs = SLOW_QUERY_MS, summaryAtExit = True):
+        self.slowQueryMs = slowQueryMs
+        self.enabled = True
+        if summaryAtExit and not self._summaryRegistered:
+            atexit.register(self.printSummary)
+            self._summaryRegistered = True
+
+    # Stops recording, the queries recorded so far are kept
+    def disable(self):
+        self.enabled = False
+
+    # Forgets the queries recorded so far
+    def reset(self):
+        with self._lock:
+            self._times.clear()
+            self._rows.clear()
+            self._callers.clear()
+
+    # Returns the connection wrapped so that the queries run on it are recorded
+    def wrap(self, conn):
+        return _ProfiledConnection(self, conn)
+
+    # Records a query that took seconds and returned (or changed) rows
+    def record(self, sqlQuery, seconds, rows):
+        key = self._fingerprints.get(sqlQuery)
+        if key is None:
+            key = self._fingerprints.setdefault(sqlQuery, fingerprint(sqlQuery))
+        caller = self._caller()
+        with self._lock:
+            self._times[key].append(seconds)
+            self._rows[key] += max(rows, 0)
+            self._callers[key][caller] += 1
+        if 1000 * seconds >= self.slowQueryMs:
+            print("Slow query: {:.1f} ms, {} rows, in {}: {}".format(1000 * seconds, rows, caller, key), file = sys.stderr)
+
+    # Method that ran the query: the first method outside Database and this module on
+    # the call stack, as Class.method (module.function for plain functions), followed
+    # by the first method of another class that called it (e.g.
+    # "PortfolioDB.getPositions < Stock.update")
+    @staticmethod
+    def _caller():
+        names = []
+        owners = []
+        frame = sys._getframe(2)
+        while frame is not None and len(names) < 2:
+            code = frame.f_code
+            if os.path.splitext(code.co_filename)[0] not in _SKIPPED_FILES and "contextlib" not in code.co_filename:
+                owner = type(frame.f_locals["self"]) if "self" in frame.f_locals else None
+                if not names:
+                    module = os.path.basename(os.path.splitext(code.co_filename)[0])
+                    names.append("{}.{}".format(owner.__name__ if owner else module, code.co_name))
+                    owners.append(owner)
+                elif owner is not None and owner not in owners and not issubclass(owners[0] or object, owner):
+                    names.append("{}.{}".format(owner.__name__, code.co_name))
+            frame = frame.f_back
+        return " < ".join(names) if names else "unknown"
+
+    # Dataframe with one row per fingerprint, slowest in total first: number of
+    # runs, total, mean and percentile times in ms, rows and the main caller
+    def summary(self):
+        with self._lock:
+            items = [(key, np.array(times), self._rows[key], self._callers[key]) for key, times in self._times.items()]
+        data = pd.DataFrame([dict({"count": len(times),
+                                   "total ms": 1000 * times.sum(),
+                                   "mean ms": 1000 * times.mean()},
+                                  **{"p{} ms".format(p): 1000 * value for p, value in zip(PERCENTILES, np.percentile(times, PERCENTILES))},
+                                  rows = rows,
+                                  callers = ", ".join("{} ({})".format(caller, count) for caller, count in callers.most_common(3)),
+                                  fingerprint = key)
+                             for key, times, rows, callers in items])
+        if data.empty:
+            return data
+        return data.sort_values("total ms", ascending = False).reset_index(drop = True)
+
+    # Prints the summary of the limit slowest fingerprints to stderr
+    def printSummary(self, limit = SUMMARY_LIMIT):
+        data = self.summary()
+        if data.empty:
+            return
+        print("\nSql queries by total time ({} queries, {:.1f} ms):".format(data["count"].sum(), data["total ms"].sum()), file = sys.stderr)
+        data = data.head(limit)
+        for row in data.itertuples(index = False):
+            print("{:>7} runs {:>10.2f} ms  mean {:.2f}  {}  {:>8} rows  {}\n    {}".format(
+                row[0], row[1], row[2], "  ".join("p{} {:.2f}".format(p, value) for p, value in zip(PERCENTILES, row[3:3 + len(PERCENTILES)])),
+                row.rows, row.callers, row.fingerprint[:FINGERPRINT_WIDTH]), file = sys.stderr)
+
+# Connection proxy recording the statements run with execute and executemany
+class _ProfiledConnection:
+    def __init__(self, profiler, conn):
+        self._profiler = profiler
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, sql, parameters = ()):
+        started = time.perf_counter()
+        cursor = self._conn.execute(sql, parameters)
+        return self._track(cursor, sql, started)
+
+    def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        cursor = self._conn.executemany(sql, parameters)
+        return self._track(cursor, sql, started)
+
+    # Statements that return rows are recorded when the rows are fetched
+    def _track(self, cursor, sql, started):
+        if cursor.description is None:
+            self._profiler.record(sql, time.perf_counter() - started, cursor.rowcount)
+            return cursor
+        return _ProfiledCursor(self._profiler, cursor, sql, started)
+
+# Cursor proxy recording the query on the first fetch, with the rows fetched
+class _ProfiledCursor:
+    def __init__(self, profiler, cursor, sql, started):
+        self._profiler = profiler
+        self._cursor = cursor
+        self._sql = sql
+        self._started = started
+        self._recorded = False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._record(len(rows))
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._record(int(row is not None))
+        return row
+
+    def _record(self, rows):
+        if not self._recorded:
+            self._recorded = True
+            self._profiler.record(self._sql, time.perf_counter() - self._started, rows)
+
+QUERY_PROFILER = QueryProfiler()
+if os.environ.get("PORTFOLIO_QUERY_PROFILE", "") not in ("", "0"):
+    QUERY_PROFILER.enable(float(os.environ.get("PORTFOLIO_SLOW_QUERY_MS", SLOW_QUERY_MS)))
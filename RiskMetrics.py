@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Rolling risk metrics of the holdings and of the whole portfolio.
+
+For each holding the level series is its price in EUR (FACT_HISTPRICES times the
+exchange rate), for the portfolio it is the index of its time weighted return
+(see Analytics.py), so that the cash flows do not count as gains or losses. The
+levels are sampled on weekdays and, over a window of WINDOW daily returns, the
+engine computes:
+
+    * VOLATILITY: annualized standard deviation of the returns
+    * MAX_DRAWDOWN: largest fall from a peak of the level within the window (<= 0)
+    * SHARPE: annualized mean excess return over the volatility
+    * SORTINO: annualized mean excess return over the downside deviation
+    * BETA: covariance with the returns of the benchmark (the portfolio by
+      default) over the variance of the benchmark
+
+A metric is NaN until its window is full of returns.
+
+rollingMetrics computes the history at once on strided numpy windows of the
+levels. RollingAccumulator updates the metrics when a new day arrives, in O(1)
+per day for the moments (running sums of the returns entering and leaving the
+window) and in one vectorized pass over the window for the drawdown.
+
+RiskEngine stores the metrics in FACT_RISK. update() backfills the table the
+first time and then only computes, for each series, the days after its last one
+stored, starting the accumulators from the levels of the window before them.
+PortfolioDB deletes the stored rows that new prices or transactions make stale,
+and they are computed again at the next update.
+
+Created on Sun Oct 18 2026
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import utils
+import Analytics
+from TradingCalendar import WEEKDAYS
+from ValuationEngine import ValuationEngine
+
+###############
+## Constants ##
+###############
+WINDOW = 63                     # daily returns per window (about 3 months)
+TRADING_DAYS_PER_YEAR = 252     # annualization of the daily metrics
+RISK_FREE_RATE = 0.0            # annual rate of the excess returns of the Sharpe and Sortino ratios
+BLOCK_ELEMENTS = 4000000        # window elements processed at a time by rollingMetrics
+METRICS = ["VOLATILITY", "MAX_DRAWDOWN", "SHARPE", "SORTINO", "BETA"]
+
+# Daily risk free return of the annual rate
+def _dailyRate(riskFreeRate):
+    return (1 + riskFreeRate) ** (1 / TRADING_DAYS_PER_YEAR) - 1
+
+# Metrics from the sums over windows of count returns: sum of the returns, of their
+# squares, of the squared shortfalls below the risk free return, of the returns
+# times the benchmark returns and the sums of the benchmark returns and squares
+def _metricsFromSums(count, returns, squares, shortfalls, crossProducts, benchmark, benchmarkSquares, riskFreeRate):
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        mean = returns / count
+        variance = np.maximum(squares - returns * mean, 0) / (count - 1)
+        deviation = np.sqrt(variance)
+        excess = mean - _dailyRate(riskFreeRate)
+        annualization = np.sqrt(TRADING_DAYS_PER_YEAR)
+        benchmarkVariance = benchmarkSquares - benchmark * benchmark / count
+        metrics = {"VOLATILITY": deviation * annualization,
+                   "SHARPE": excess / deviation * annualization,
+                   "SORTINO": excess / np.sqrt(shortfalls / count) * annualization,
+                   "BETA": (crossProducts - returns * benchmark / count) / benchmarkVariance}
+    return {name: np.where(np.isfinite(values), values, np.nan) for name, values in metrics.items()}
+
+# Largest fall from a peak along axis of the levels (<= 0)
+def _maxDrawdown(levels, axis):
+    return (levels / np.maximum.accumulate(levels, axis = axis) - 1).min(axis = axis)
+
+# Metrics of every date of the levels (dates x series), over the window returns
+# ending on each date, against the returns of benchmarkLevels (one per date).
+# Returns a dictionary metric -> dates x series matrix, NaN until a window is full.
+def rollingMetrics(levels, benchmarkLevels, window = WINDOW, riskFreeRate = RISK_FREE_RATE):
+    levels = np.asarray(levels, dtype = float)
+    benchmarkLevels = np.asarray(benchmarkLevels, dtype = float)
+    metrics = {name: np.full(levels.shape, np.nan) for name in METRICS}
+    if len(levels) <= window:
+        return metrics
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        returns = levels[1:] / levels[:-1] - 1
+        benchmarkReturns = benchmarkLevels[1:] / benchmarkLevels[:-1] - 1
+    # Windows along the last axis: dates x series x window
+    returnWindows = sliding_window_view(returns, window, axis = 0)
+    benchmarkWindows = sliding_window_view(benchmarkReturns, window)
+    levelWindows = sliding_window_view(levels, window + 1, axis = 0)
+    riskFree = _dailyRate(riskFreeRate)
+    block = max(1, BLOCK_ELEMENTS // (levels.shape[1] * (window + 1)))
+    for first in range(0, len(returnWindows), block):
+        r = returnWindows[first:first + block]
+        b = benchmarkWindows[first:first + block][:, np.newaxis, :]
+        sums = _metricsFromSums(window, r.sum(axis = 2), (r * r).sum(axis = 2),
+                                (np.minimum(r - riskFree, 0) ** 2).sum(axis = 2), (r * b).sum(axis = 2),
+                                b.sum(axis = 2), (b * b).sum(axis = 2), riskFreeRate)
+        # Row window of the output is the first date with a full window
+        rows = slice(window + first, window + first + len(r))
+        for name, values in sums.items():
+            metrics[name][rows] = values
+        metrics["MAX_DRAWDOWN"][rows] = _maxDrawdown(levelWindows[first:first + block], axis = 2)
+    return metrics
+
+# Rolling sums of the last window returns of several series, updated one date at a time
+class RollingAccumulator:
+    # Class initializer. series is the number of level series.
+    def __init__(self, series, window = WINDOW, riskFreeRate = RISK_FREE_RATE):
+        self.window = window
+        self.riskFreeRate = riskFreeRate
+        self._riskFree = _dailyRate(riskFreeRate)
+        # Ring buffers of the last window returns and window + 1 levels. Missing
+        # returns are stored as 0 and counted as invalid.
+        self._returns = np.zeros((window, series))
+        self._valid = np.zeros((window, series), dtype = bool)
+        self._benchmark = np.zeros(window)
+        self._benchmarkValid = np.zeros(window, dtype = bool)
+        self._levels = np.full((window + 1, series), np.nan)
+        self._lastLevels = np.full(series, np.nan)
+        self._lastBenchmark = np.nan
+        self._position = 0
+        self._count = np.zeros(series, dtype = int)
+        self._benchmarkCount = 0
+        self._sums = {name: np.zeros(series) for name in ("returns", "squares", "shortfalls", "crossProducts")}
+        self._benchmarkSums = {"benchmark": 0.0, "benchmarkSquares": 0.0}
+
+    # Adds the levels of a new date, dropping the returns older than the window
+    def push(self, levels, benchmarkLevel):
+        levels = np.asarray(levels, dtype = float)
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            returns = levels / self._lastLevels - 1
+            benchmarkReturn = benchmarkLevel / self._lastBenchmark - 1
+        valid = np.isfinite(returns)
+        returns = np.where(valid, returns, 0.0)
+        benchmarkValid = bool(np.isfinite(benchmarkReturn))
+        benchmarkReturn = benchmarkReturn if benchmarkValid else 0.0
+
+        # Subtract the return leaving the window and add the new one
+        i = self._position
+        old, oldBenchmark = self._returns[i], self._benchmark[i]
+        sums = self._sums
+        sums["returns"] += returns - old
+        sums["squares"] += returns * returns - old * old
+        sums["shortfalls"] += np.where(valid, np.minimum(returns - self._riskFree, 0) ** 2, 0) \
+            - np.where(self._valid[i], np.minimum(old - self._riskFree, 0) ** 2, 0)
+        sums["crossProducts"] += returns * benchmarkReturn - old * oldBenchmark
+        self._benchmarkSums["benchmark"] += benchmarkReturn - oldBenchmark
+        self._benchmarkSums["benchmarkSquares"] += benchmarkReturn * benchmarkReturn - oldBenchmark * oldBenchmark
+        self._count += valid.astype(int) - self._valid[i]
+        self._benchmarkCount += int(benchmarkValid) - int(self._benchmarkValid[i])
+        self._returns[i], self._valid[i] = returns, valid
+        self._benchmark[i], self._benchmarkValid[i] = benchmarkReturn, benchmarkValid
+        self._position = (i + 1) % self.window
+
+        self._levels = np.roll(self._levels, -1, axis = 0)
+        self._levels[-1] = levels
+        self._lastLevels, self._lastBenchmark = levels, benchmarkLevel
+
+    # Metrics over the current window, NaN for the series without a full window
+    def metrics(self):
+        full = (self._count == self.window) & (self._benchmarkCount == self.window)
+        metrics = _metricsFromSums(self.window, self._sums["returns"], self._sums["squares"], self._sums["shortfalls"],
+                                   self._sums["crossProducts"], self._benchmarkSums["benchmark"],
+                                   self._benchmarkSums["benchmarkSquares"], self.riskFreeRate)
+        metrics["MAX_DRAWDOWN"] = _maxDrawdown(self._levels, axis = 0)
+        # Beta only needs the benchmark, the other metrics only the series
+        return {name: np.where(full if name == "BETA" else self._count == self.window, values, np.nan)
+                for name, values in metrics.items()}
+
+
+class RiskEngine:
+    # Class initializer. currencyField is the DIM_STOCKS column holding the currency
+    # of the prices of each instrument.
+    def __init__(self, database, window = WINDOW, riskFreeRate = RISK_FREE_RATE, currencyField = None):
+        self.database = database
+        self.window = window
+        self.riskFreeRate = riskFreeRate
+        self.currencyField = currencyField if currencyField is not None else database.getCurrencyField()
+
+    # Weekdays between the days start and end, the level of each ticker (price in
+    # EUR) on them and the level of the portfolio of the tickers (index of its time
+    # weighted return, NaN while it is worth nothing)
+    def levels(self, tickers, start, end):
+        db = self.database
+        valuation = ValuationEngine(db, self.currencyField).run(tickers, str(start) + " 00:00:00", str(end) + " 00:00:00")
+        days = WEEKDAYS.sessions(start, end)
+        rows = (days - valuation.dates[0]).astype(int)
+        fx = db.getFXService().rateMatrix(db.getCurrencies(tickers, self.currencyField), valuation.dates, "EUR")
+        prices = (valuation.prices * fx)[rows]
+        values = valuation.value.sum(axis = 1)
+        portfolio = 1 + Analytics.timeWeightedReturns(values, Analytics.cashFlows(db, valuation).sum(axis = 1))
+        portfolio = np.where(np.abs(values) > Analytics.MIN_VALUE, portfolio, np.nan)[rows]
+        return days, np.column_stack([prices, portfolio])
+
+    # Computes the metrics of the tickers and of their portfolio (utils.PORTFOLIO) for
+    # the weekdays up to endDate after the last one in FACT_RISK of each of them, and
+    # stores them. The series without rows are backfilled from the first transaction.
+    # Returns the rows added.
+    def update(self, tickers, endDate = utils.DEFAULT_DATE):
+        db = self.database
+        tickers = list(dict.fromkeys(tickers))
+        names = tickers + [utils.PORTFOLIO]
+        end = WEEKDAYS.previousSession(utils.toDays(endDate))
+        first = db.getConnection().execute("SELECT min({}) FROM {}".format(db.DATE, db.TRANSACTIONS_TABLE_NAME)).fetchone()[0]
+        if first is None:
+            return 0
+        first = utils.toDays(first)
+        lastDates = db.getLastRiskDates(names)
+        # Last day stored of each series, the day before the first transaction if none
+        stored = np.array([utils.toDays(lastDates[name]) if name in lastDates else first - 1 for name in names])
+        if stored.min() >= end:
+            return 0
+        # The levels of the window before the first new day start the accumulators,
+        # their metrics are already stored
+        start = np.busday_offset(stored.min(), -self.window, roll = "backward", busdaycal = WEEKDAYS.busdaycalendar())
+        if start <= first:
+            days, levels = self.levels(tickers, first, end)
+            metrics = rollingMetrics(levels, levels[:, -1], self.window, self.riskFreeRate)
+        else:
+            days, levels = self.levels(tickers, start, end)
+            accumulator = RollingAccumulator(len(names), self.window, self.riskFreeRate)
+            seed = np.searchsorted(days, stored.min(), side = "right")
+            for row in levels[:seed]:
+                accumulator.push(row, row[-1])
+            metrics = {name: np.full((len(days) - seed, len(names)), np.nan) for name in METRICS}
+            for i, row in enumerate(levels[seed:]):
+                accumulator.push(row, row[-1])
+                for name, values in accumulator.metrics().items():
+                    metrics[name][i] = values
+            days = days[seed:]
+        # Only the days after the last one stored of each series
+        rows, columns = np.nonzero(days[:, np.newaxis] > stored)
+        data = pd.DataFrame({db.DATE: utils.toDatetimes(days[rows]),
+                             db.IB_TICKER: np.array(names, dtype = object)[columns]})
+        for name in METRICS:
+            data[name] = metrics[name][rows, columns]
+        db.addToDatabase(data, db.RISK_TABLE_NAME)
+        return len(data)
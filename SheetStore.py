@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Typed columnar store of the Google Finance sheet (googledata.csv / getGoogleSheetData).
+
+The wide sheet (one DATE column and one column of prices per Google Finance symbol)
+is parsed once: dates become int64 days since 1970-01-01 and prices a float64 matrix
+with one contiguous row per symbol and NaN where the sheet has 'NA' or nothing.
+Every ticker is then served as a zero-copy view on its row.
+
+The parsed store is saved next to the csv file as a binary cache keyed by the
+checksum of the file, so that later runs skip the csv parsing until the file changes.
+
+Created on Sun Oct 18 2026
+"""
+
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+import utils
+
+###############
+## Constants ##
+###############
+DATE_COLUMN = "DATE"
+DATE_FORMAT = "%d/%m/%Y"
+CACHE_SUFFIX = ".cache.npz"
+
+class SheetStore:
+    # Class initializer. dates are int64 days since 1970-01-01 in increasing order,
+    # prices is a symbols x dates float64 matrix.
+    def __init__(self, dates, symbols, prices, checksum = ""):
+        self.dates = dates
+        self.symbols = list(symbols)
+        self.prices = prices
+        self.checksum = checksum
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    # Class string method
+    def __str__(self):
+        return "SheetStore - {} symbols x {} dates.".format(len(self.symbols), len(self.dates))
+
+    # Parses the sheet as returned by pd.read_csv or getGoogleSheetData
+    @classmethod
+    def fromDataFrame(cls, dataFrame, checksum = ""):
+        dates = pd.to_datetime(dataFrame[DATE_COLUMN], format = DATE_FORMAT).values.astype('datetime64[D]')
+        order = np.argsort(dates, kind = "stable")
+        symbols = [column for column in dataFrame.columns if column != DATE_COLUMN]
+        prices = np.empty((len(symbols), len(dates)))
+        for i, symbol in enumerate(symbols):
+            # 'NA', empty cells and any other text become NaN
+            prices[i] = pd.to_numeric(dataFrame[symbol], errors = "coerce").values
+        return cls(dates[order].astype(np.int64), symbols, np.ascontiguousarray(prices[:, order]), checksum)
+
+    # Loads the sheet from the csv file, from the binary cache if it was built from
+    # the same file contents, otherwise parsing the csv and refreshing the cache
+    @classmethod
+    def fromCSV(cls, path, useCache = True):
+        with open(path, "rb") as file:
+            checksum = hashlib.sha256(file.read()).hexdigest()
+        cachePath = path + CACHE_SUFFIX
+        if useCache and os.path.exists(cachePath):
+            store = cls.load(cachePath)
+            if store.checksum == checksum:
+                return store
+        store = cls.fromDataFrame(pd.read_csv(path, dtype = str, keep_default_na = False), checksum)
+        if useCache:
+            store.save(cachePath)
+        return store
+
+    # Writes the store to a binary npz file
+    def save(self, path):
+        # np.savez adds .npz to names that do not end with it, write to an open file instead
+        with open(path, "wb") as file:
+            np.savez(file, dates = self.dates, symbols = np.array(self.symbols, dtype = str),
+                     prices = self.prices, checksum = np.array(self.checksum))
+
+    # Reads a store written by save
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle = False) as data:
+            return cls(data["dates"], data["symbols"].tolist(), data["prices"], str(data["checksum"]))
+
+    # Returns a new store with the dates and symbols of both stores. The values of
+    # other replace those of this store on the dates and symbols it holds.
+    def merge(self, other):
+        symbols = self.symbols + [symbol for symbol in other.symbols if symbol not in self._index]
+        index = {symbol: i for i, symbol in enumerate(symbols)}
+        dates = np.union1d(self.dates, other.dates)
+        prices = np.full((len(symbols), len(dates)), np.nan)
+        prices[:len(self.symbols), np.searchsorted(dates, self.dates)] = self.prices
+        rows = [index[symbol] for symbol in other.symbols]
+        prices[np.ix_(rows, np.searchsorted(dates, other.dates))] = other.prices
+        return SheetStore(dates, symbols, prices)
+
+    # Zero-copy views of the dates (int64 days) and prices of symbol between startDate
+    # and endDate included. Prices are NaN where the sheet has no value.
+    def column(self, symbol, startDate = utils.MIN_DATE, endDate = utils.MAX_DATE):
+        if symbol not in self._index:
+            raise KeyError("{} is not in the sheet. Method: SheetStore.column.".format(symbol))
+        first = np.searchsorted(self.dates, utils.toDays(startDate).astype(np.int64), side = "left")
+        last = np.searchsorted(self.dates, utils.toDays(endDate).astype(np.int64), side = "right")
+        return self.dates[first:last], self.prices[self._index[symbol], first:last]
+
+    # Dates and prices of symbol between startDate and endDate, without the missing values
+    def series(self, symbol, startDate = utils.MIN_DATE, endDate = utils.MAX_DATE):
+        dates, prices = self.column(symbol, startDate, endDate)
+        available = ~np.isnan(prices)
+        return dates[available].astype('datetime64[D]'), prices[available]
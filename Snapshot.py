@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar snapshot of the fact tables of a PortfolioDB, in Parquet files.
+
+The snapshot is a directory next to the database (myPortfolio.snapshot for
+myPortfolio.db) holding:
+    * prices.parquet: FACT_HISTPRICES with one row group per ticker, sorted by date.
+    * dividends.parquet: FACT_DIVIDENDS with one row group per ticker, sorted by date.
+    * transactions.parquet: FACT_TRANSACTIONS sorted by date, in row groups of
+    TRANSACTIONS_ROW_GROUP rows.
+Dates are stored typed (date32, timestamp for the transactions), so reading them
+needs no string parsing. The key-value metadata of the ticker files lists, in row
+group order, each ticker with its number of rows, last date and checksum, so a read
+decodes only the row groups of the requested tickers.
+
+A refresh rewrites a file copying the row groups of the unchanged tickers and
+reading from the database only the tickers that changed. sync() finds the changed
+tickers by comparing the metadata with the row counts, last dates and checksums in
+the database, so a snapshot behind writes of another process is brought up to date
+incrementally. The checksum is an integer sum over the rows of the values (in
+millionths) times their day numbers, modulo CHECKSUM_MODULUS, so that values
+revised in place are detected as well as appends. The transactions file keeps the
+number of rows, the last TRANSACTION_ID and a checksum of the ids, dates,
+quantities and commissions.
+
+Parquet support needs pyarrow, imported on first use.
+
+Created on Sun Oct 18 2026
+"""
+
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import utils
+
+###############
+## Constants ##
+###############
+SNAPSHOT_SUFFIX = ".snapshot"
+PRICES_FILE = "prices.parquet"
+DIVIDENDS_FILE = "dividends.parquet"
+TRANSACTIONS_FILE = "transactions.parquet"
+TRANSACTIONS_ROW_GROUP = 10000 # rows per row group of the transactions file
+METADATA_KEY = b"portfolio"    # key of the metadata in the Parquet files
+CHECKSUM_MODULUS = 1000003     # the terms of the checksums are reduced modulo this prime
+
+# SQL of the checksum of the rows of a ticker: sum of the values in millionths times
+# the day numbers, each reduced modulo CHECKSUM_MODULUS so that the integer sum
+# cannot overflow and does not depend on the order of the rows
+def _checksumSql(dateColumn, valueColumns):
+    terms = " + ".join("CAST(round(coalesce({}, 0) * 1000000) AS INTEGER) * {}".format(column, i + 1)
+                       for i, column in enumerate(valueColumns))
+    return "sum((({0}) % {1}) * (CAST(julianday({2}) AS INTEGER) % {1}))".format(terms, CHECKSUM_MODULUS, dateColumn)
+
+class Snapshot:
+    # Class initializer. path defaults to the database path with SNAPSHOT_SUFFIX
+    # instead of its extension.
+    def __init__(self, database, path = None):
+        self.database = database
+        self.path = os.path.splitext(database.databasePath)[0] + SNAPSHOT_SUFFIX if path is None else path
+        db = database
+        # file -> (table, date column, value column) of the files with a row group per ticker
+        self._tickerTables = {PRICES_FILE: (db.HISTORICAL_TABLE_NAME, db.DATE, db.PRICE),
+                              DIVIDENDS_FILE: (db.DIVIDEND_TABLE_NAME, db.DIVIDEND_DATE, db.DIVIDEND_AMOUNT)}
+
+    # Class string method
+    def __str__(self):
+        return "Snapshot - {}{}.".format(self.path, "" if self.exists() else " (not written)")
+
+    # True if every file of the snapshot has been written
+    def exists(self):
+        return all(os.path.exists(os.path.join(self.path, name))
+                   for name in (PRICES_FILE, DIVIDENDS_FILE, TRANSACTIONS_FILE))
+
+    # Writes the whole snapshot from the database
+    def write(self):
+        os.makedirs(self.path, exist_ok = True)
+        for name in self._tickerTables:
+            self._writeTickerFile(name)
+        self._writeTransactions()
+        print("Snapshot written to {}.".format(self.path))
+
+    # Rewrites the rows of the tickers in prices and dividends (None for no change,
+    # True for all the tickers) and, if transactions, the transactions
+    def refresh(self, prices = None, dividends = None, transactions = False):
+        if not self.exists():
+            self.write()
+            return
+        for name, tickers in ((PRICES_FILE, prices), (DIVIDENDS_FILE, dividends)):
+            if tickers is True:
+                self._writeTickerFile(name)
+            elif tickers:
+                self._writeTickerFile(name, tickers)
+        if transactions:
+            self._writeTransactions()
+
+    # Brings the snapshot up to date with the database, refreshing only the tickers
+    # whose number of rows, last date or checksum differ. Returns the tickers refreshed
+    # per file and whether the transactions were rewritten.
+    def sync(self):
+        if not self.exists():
+            self.write()
+            return {PRICES_FILE: True, DIVIDENDS_FILE: True, TRANSACTIONS_FILE: True}
+        refreshed = {}
+        for name in self._tickerTables:
+            current = self._tickerStates(name)
+            stored = {entry[0]: entry[1:] for entry in self._metadata(name)["tickers"]}
+            refreshed[name] = sorted(ticker for ticker in current.keys() | stored.keys()
+                                     if current.get(ticker) != stored.get(ticker))
+        refreshed[TRANSACTIONS_FILE] = self._transactionsState() != self._metadata(TRANSACTIONS_FILE)["state"]
+        self.refresh(refreshed[PRICES_FILE], refreshed[DIVIDENDS_FILE], refreshed[TRANSACTIONS_FILE])
+        return refreshed
+
+    # Full series of the tickers between startDate and endDate as a dictionary
+    # ticker -> (dates as datetime64[D], prices as float64), as PortfolioDB.loadPriceSeries.
+    # Tickers that are not in the snapshot get empty series.
+    def readPrices(self, tickers, startDate = utils.MIN_DATE, endDate = utils.MAX_DATE):
+        return self._readSeries(PRICES_FILE, tickers, startDate, endDate)
+
+    # Rows of FACT_DIVIDENDS of the tickers between startDate and endDate, with the
+    # dividend dates as datetimes
+    def readDividends(self, tickers, startDate = utils.MIN_DATE, endDate = utils.MAX_DATE):
+        db = self.database
+        series = self._readSeries(DIVIDENDS_FILE, tickers, startDate, endDate)
+        tickers = list(series)
+        return pd.DataFrame({db.DIVIDEND_DATE: utils.toDatetimes(np.concatenate([series[t][0] for t in tickers]) if tickers else []),
+                             db.IB_TICKER: np.repeat(tickers, [len(series[t][0]) for t in tickers]).astype(object),
+                             db.DIVIDEND_AMOUNT: np.concatenate([series[t][1] for t in tickers]) if tickers else np.array([])})
+
+    # Rows of FACT_TRANSACTIONS between startDate and endDate buying (direction
+    # "BOUGHT"), selling ("SOLD") or either (None) one of the tickers (all the
+    # transactions if tickers is None), with the dates as datetimes, in the order of
+    # PortfolioDB.getTransactions. Only the row groups that can hold the dates are read.
+    def readTransactions(self, tickers = None, startDate = utils.MIN_DATE, endDate = utils.MAX_DATE, direction = None):
+        import pyarrow.parquet as pq
+        db = self.database
+        dates = [(db.DATE, ">=", datetime.fromisoformat(startDate)), (db.DATE, "<=", datetime.fromisoformat(endDate))]
+        columns = {"BOUGHT": [db.INSTRUMENT_BOUGHT], "SOLD": [db.INSTRUMENT_SOLD], None: [db.INSTRUMENT_BOUGHT, db.INSTRUMENT_SOLD]}
+        if direction not in columns:
+            raise ValueError("Invalid option provided")
+        if tickers is None:
+            filters = dates
+        else:
+            filters = [dates + [(column, "in", list(tickers))] for column in columns[direction]]
+        data = pq.read_table(os.path.join(self.path, TRANSACTIONS_FILE), filters = filters).to_pandas()
+        data[db.DATE] = data[db.DATE].astype(utils.DATETIME_DTYPE)
+        return data.sort_values(db.TRANSACTION_ID).reset_index(drop = True)
+
+    # Metadata of a file of the snapshot
+    def _metadata(self, name):
+        import pyarrow.parquet as pq
+        return json.loads(pq.read_metadata(os.path.join(self.path, name)).metadata[METADATA_KEY])
+
+    # Reads the row groups of the tickers from a file with a row group per ticker
+    def _readSeries(self, name, tickers, startDate, endDate):
+        import pyarrow.parquet as pq
+        _, dateColumn, valueColumn = self._tickerTables[name]
+        empty = (np.array([], dtype = 'datetime64[D]'), np.array([], dtype = float))
+        series = {ticker: empty for ticker in tickers}
+        file = pq.ParquetFile(os.path.join(self.path, name))
+        index = {entry[0]: i for i, entry in enumerate(json.loads(file.metadata.metadata[METADATA_KEY])["tickers"])}
+        found = sorted((index[ticker], ticker) for ticker in set(tickers) if ticker in index)
+        if not found:
+            return series
+        data = file.read_row_groups([group for group, _ in found], columns = [dateColumn, valueColumn])
+        dates = data.column(dateColumn).to_numpy().astype('datetime64[D]')
+        values = data.column(valueColumn).to_numpy()
+        start, end = utils.toDays(startDate), utils.toDays(endDate)
+        offsets = np.cumsum([0] + [file.metadata.row_group(group).num_rows for group, _ in found])
+        for (_, ticker), first, last in zip(found, offsets[:-1], offsets[1:]):
+            # Dates are sorted within each row group
+            tickerDates = dates[first:last]
+            last = first + np.searchsorted(tickerDates, end, side = "right")
+            first = first + np.searchsorted(tickerDates, start, side = "left")
+            series[ticker] = (dates[first:last], values[first:last])
+        return series
+
+    # Writes a file with a row group per ticker. The row groups of the tickers not in
+    # tickers are copied from the current file, the others read from the database
+    # (all of them if tickers is None).
+    def _writeTickerFile(self, name, tickers = None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        db = self.database
+        table, dateColumn, valueColumn = self._tickerTables[name]
+        path = os.path.join(self.path, name)
+        old = None
+        stored = {}
+        if tickers is not None and os.path.exists(path):
+            old = pq.ParquetFile(path)
+            stored = {entry[0]: (i, entry) for i, entry in enumerate(json.loads(old.metadata.metadata[METADATA_KEY])["tickers"])}
+        changed = None if tickers is None else sorted(set(tickers))
+
+        sqlQuery = """SELECT {0}, {1}, {2} FROM {3}{4} ORDER BY {0}, {1}""" \
+            .format(db.IB_TICKER, dateColumn, valueColumn, table,
+                    "" if changed is None else " WHERE {} in ({})".format(db.IB_TICKER, db._placeholders(changed)))
+        # The rows and their states are read in one transaction, so that they match
+        with db.transaction() as conn:
+            rows = conn.execute(sqlQuery, [] if changed is None else changed).fetchall()
+            states = self._tickerStates(name, changed)
+        fresh = {}
+        if rows:
+            rowTickers, rowDates, rowValues = zip(*rows)
+            rowTickers = np.array(rowTickers)
+            splits = np.flatnonzero(rowTickers[1:] != rowTickers[:-1]) + 1
+            for first, last in zip(np.r_[0, splits], np.r_[splits, len(rowTickers)]):
+                fresh[rowTickers[first]] = (utils.toDays(rowDates[first:last]), np.array(rowValues[first:last], dtype = float))
+
+        schema = pa.schema([(db.IB_TICKER, pa.string()), (dateColumn, pa.date32()), (valueColumn, pa.float64())])
+        kept = [ticker for ticker in stored if ticker not in (changed or [])]
+        index = []
+        with pq.ParquetWriter(path + ".tmp", schema) as writer:
+            for ticker in sorted(set(kept) | set(fresh)):
+                if ticker in fresh:
+                    dates, values = fresh[ticker]
+                    group = pa.table([pa.array([ticker] * len(dates), pa.string()), pa.array(dates, pa.date32()),
+                                      pa.array(values, pa.float64())], schema = schema)
+                    entry = [ticker] + states[ticker]
+                else:
+                    i, entry = stored[ticker]
+                    group = old.read_row_group(i).cast(schema)
+                writer.write_table(group, row_group_size = max(1, group.num_rows))
+                index.append(entry)
+            writer.add_key_value_metadata({METADATA_KEY: json.dumps({"tickers": index}).encode()})
+        os.replace(path + ".tmp", path)
+
+    # Dictionary ticker -> [number of rows, last date, checksum] of the tickers (all of
+    # them if None) in the table of a file with a row group per ticker
+    def _tickerStates(self, name, tickers = None):
+        db = self.database
+        table, dateColumn, valueColumn = self._tickerTables[name]
+        sqlQuery = """SELECT {0}, count(*), max({1}), {2} FROM {3}{4} GROUP BY {0}""" \
+            .format(db.IB_TICKER, dateColumn, _checksumSql(dateColumn, [valueColumn]), table,
+                    "" if tickers is None else " WHERE {} in ({})".format(db.IB_TICKER, db._placeholders(tickers)))
+        rows = db.getConnection().execute(sqlQuery, [] if tickers is None else list(tickers)).fetchall()
+        return {row[0]: list(row[1:]) for row in rows}
+
+    # Number of rows, last TRANSACTION_ID and checksum of FACT_TRANSACTIONS, to detect changes
+    def _transactionsState(self):
+        db = self.database
+        checksum = _checksumSql(db.DATE, [db.TRANSACTION_ID, db.QUANTITY_BOUGHT, db.QUANTITY_SOLD, db.COMMISSION])
+        sqlQuery = """SELECT count(*), max({}), {} FROM {}""".format(db.TRANSACTION_ID, checksum, db.TRANSACTIONS_TABLE_NAME)
+        return list(db.getConnection().execute(sqlQuery).fetchone())
+
+    # Writes the transactions file from the database
+    def _writeTransactions(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        db = self.database
+        sqlQuery = """SELECT {} FROM {} ORDER BY {}, {}""" \
+            .format(", ".join(db.TRANSACTIONS_COLUMNS), db.TRANSACTIONS_TABLE_NAME, db.DATE, db.TRANSACTION_ID)
+        with db.transaction() as conn:
+            rows = conn.execute(sqlQuery).fetchall()
+            state = self._transactionsState()
+        columns = list(zip(*rows)) if rows else [[] for _ in db.TRANSACTIONS_COLUMNS]
+        types = {db.TRANSACTION_ID: pa.int64(), db.DATE: pa.timestamp("s"), db.INSTRUMENT_BOUGHT: pa.string(),
+                 db.QUANTITY_BOUGHT: pa.float64(), db.INSTRUMENT_SOLD: pa.string(), db.QUANTITY_SOLD: pa.float64(),
+                 db.COMMISSION: pa.float64()}
+        arrays = []
+        for column, values in zip(db.TRANSACTIONS_COLUMNS, columns):
+            if column == db.DATE:
+                values = pd.to_datetime(pd.Series(values, dtype = object), format = "%Y-%m-%d %H:%M:%S").values.astype("datetime64[s]")
+            arrays.append(pa.array(values, types[column]))
+        schema = pa.schema(list(types.items())).with_metadata({METADATA_KEY: json.dumps({"state": state}).encode()})
+        path = os.path.join(self.path, TRANSACTIONS_FILE)
+        pq.write_table(pa.table(arrays, schema = schema), path + ".tmp", row_group_size = TRANSACTIONS_ROW_GROUP)
+        os.replace(path + ".tmp", path)
@@ -59,14 +59,40 @@ Modified 04/03/2020:
     * Modified getPrice 
     * Added getPricePaid and getCommissions that feed into getSpent. These functions replace the previous implementation of getSpent that did
       not take into account commission nor currency conversion. 
+
+Modified 18/10/2026:
+    * getOwned, getBought, getSold, getPrice, getSpent, getPricePaid, getCommissions
+      and getDividend no longer build a daily range dataframe. They binary search
+      sorted event arrays (transaction and dividend dates with cumulative quantities
+      and EUR amounts), rebuilt when the database is written, and the cached price
+      series.
+    * getOwnedRange, getSpentRange, getPricePaidRange and getCommissionsRange read
+      the running totals maintained in the FACT_POSITIONS table instead of
+      recomputing them from all the transactions.
+    * Added remove() method to remove a transaction from the database.
+    * getValueRange converts currencies with the FX service shared by all the
+      stocks of the database.
+    * seaborn, matplotlib and urllib.request are no longer imported, they were
+      only used by the commented out plot() method (see Plotting.py).
+    * Added iterRange() which yields the daily holdings, price, value, spent,
+      dividends and profit & loss in chunks of dates, for ranges too long to
+      build the dataframes of the *Range methods in one go.
+    * The *Range methods return one row per session of the exchange of the stock
+      (see TradingCalendar.py) instead of one row per calendar day. Transactions
+      and dividends on other days are counted on the next session, or on the last
+      session of the range when they are after it.
+    * The cumulative columns of all the *Range methods count the transactions and
+      dividends before startDate, as getOwnedRange and getSpentRange do from the
+      running totals of FACT_POSITIONS.
     
 """
 import datetime
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import urllib.request
+from urllib.error import URLError
+import numpy as np
 import utils
+from PriceStore import PRICE_STORE
+from ValuationEngine import ValuationEngine, CHUNK_DAYS
 
 
 ###############
@@ -88,9 +114,13 @@ class Stock:
     currency = ""
       
     # Class initializer
-    def __init__(self, stockCode, database, datasource = "GOOGLEFINANCE"): # "YAHOOFINANCE"
+    # updateData = False skips the download of new prices, e.g. when they are
+    # refreshed for all the stocks at once with PortfolioDB.refreshAll
+    def __init__(self, stockCode, database, datasource = "GOOGLEFINANCE", updateData = True): # "YAHOOFINANCE"
       self.stockCode = stockCode
       self.database = database
+      self._events = None
+      self._eventsWriteCount = None
       
       if datasource == "YAHOOFINANCE":
           self.currencyfield = self.database.YAHOO_CURRENCY
@@ -98,10 +128,11 @@ class Stock:
           self.currencyfield = self.database.GOOGLE_FINANCE_CURRENCY
       
       # Updates the database with any price data that it does not have.
-      try:
-          self.database.updateStockData(self.stockCode, utils.datasource)
-      except urllib.request.URLError:
-          print("{} data not updated. URL Error.".format(self.stockCode))
+      if updateData:
+          try:
+              self.database.updateStockData(self.stockCode, utils.datasource)
+          except URLError:
+              print("{} data not updated. URL Error.".format(self.stockCode))
      
     # Class string method
     def __str__(self):
@@ -125,114 +156,151 @@ class Stock:
           self.currency = currency
 
 
-    # Buy a number of stocks at a price and save in the database
-    def buy(self, quantity_bought, instrument_sold, quantity_sold, commission, date = utils.DEFAULT_DATE):
+    # Buy a number of stocks at a price and save in the database. Transactions have no
+    # natural key: pass transaction_id to make the call safe to repeat, the
+    # transaction is then not written again if that id is already in the database.
+    def buy(self, quantity_bought, instrument_sold, quantity_sold, commission, date = utils.DEFAULT_DATE, transaction_id = None):
         purchaseData = pd.DataFrame({self.database.DATE: [date],
                                      self.database.INSTRUMENT_BOUGHT: [self.stockCode],
                                      self.database.QUANTITY_BOUGHT: [quantity_bought],
                                      self.database.INSTRUMENT_SOLD: [instrument_sold],
                                      self.database.QUANTITY_SOLD: quantity_sold,
                                      self.database.COMMISSION: [commission]})
-        self.database.addToDatabase(purchaseData, self.database.TRANSACTIONS_TABLE_NAME)
+        self._addTransaction(purchaseData, transaction_id)
     
-    # Sell a number of stocks at a price and save in the database     
-    def sell(self, quantity_bought, instrument_bought, quantity_sold, commission, date = utils.DEFAULT_DATE):
+    # Sell a number of stocks at a price and save in the database (see buy for transaction_id)
+    def sell(self, quantity_bought, instrument_bought, quantity_sold, commission, date = utils.DEFAULT_DATE, transaction_id = None):
         purchaseData = pd.DataFrame({self.database.DATE: [date],
                                      self.database.INSTRUMENT_BOUGHT: [instrument_bought],
                                      self.database.QUANTITY_BOUGHT: [quantity_bought],
                                      self.database.INSTRUMENT_SOLD: [self.stockCode],
                                      self.database.QUANTITY_SOLD: quantity_sold,
                                      self.database.COMMISSION: [commission]})
-        self.database.addToDatabase(purchaseData, self.database.TRANSACTIONS_TABLE_NAME)
+        self._addTransaction(purchaseData, transaction_id)
+    
+    def _addTransaction(self, transactionData, transaction_id):
+        if transaction_id is None:
+            self.database.addToDatabase(transactionData, self.database.TRANSACTIONS_TABLE_NAME)
+        else:
+            transactionData.insert(0, self.database.TRANSACTION_ID, [transaction_id])
+            self.database.addToDatabase(transactionData, self.database.TRANSACTIONS_TABLE_NAME, onConflict = "IGNORE")
+    
+    # Removes a transaction from the database (in case you made an error when adding it)
+    def remove(self, quantity_bought, instrument_sold, quantity_sold, date):
+        rowsRemoved = self.database.removeTransaction(date, self.stockCode, quantity_bought, instrument_sold, quantity_sold)
+        # Check whether the data removal was succesful. If not, user most likely
+        # made an input error, so throw a ValueError so they know about it.
+        if rowsRemoved == 0:
+            raise ValueError("Transaction of {} {} on {} was not in database. Module: remove.".format(quantity_bought, self.stockCode, date))
     
     # Adds a dividend payment to the dividend database table
     def addDividend(self, payment, date = utils.DEFAULT_DATE):
         dividendData = pd.DataFrame({self.database.DIVIDEND_DATE: [date],
                                      self.database.IB_TICKER: [self.stockCode],
                                      self.database.DIVIDEND_AMOUNT: [payment]})
-        self.database.addToDatabase(dividendData, self.database.DIVIDEND_TABLE_NAME)        
+        # A payment already recorded on the same date is replaced
+        self.database.addToDatabase(dividendData, self.database.DIVIDEND_TABLE_NAME, onConflict = "UPDATE")
     
-    # Removes a divident payment from the dividend database table
+    # Removes a divident payment from the dividend database table. The payment is
+    # matched on the day of date, whatever its time.
     def removeDividend(self, payment, date):
         sqlCommand = '''DELETE FROM {} 
-            WHERE {} LIKE '{}'
-            AND {} == {}
-            AND {} == date("{}")''' \
+            WHERE {} = ?
+            AND {} = ?
+            AND {} >= ? AND {} < ?''' \
             .format(self.database.DIVIDEND_TABLE_NAME, 
-                    self.database.IB_TICKER, self.stockCode,
-                    self.database.DIVIDEND_AMOUNT, payment,
-                    self.database.DIVIDEND_DATE, date)
-        rowsRemoved = self.database.executeCommand(sqlCommand)  
+                    self.database.IB_TICKER,
+                    self.database.DIVIDEND_AMOUNT,
+                    self.database.DIVIDEND_DATE, self.database.DIVIDEND_DATE)
+        day = utils.toDays(date)
+        rowsRemoved = self.database.executeCommand(sqlCommand, [self.stockCode, payment,
+                                                                str(day) + " 00:00:00", str(day + 1) + " 00:00:00"])
+        self.database.afterWrite(self.database.DIVIDEND_TABLE_NAME, [self.stockCode], str(day) + " 00:00:00")
         # Check whether the data removal was succesful. If not, user most likely
         # made an input error, so throw a ValueError so they know about it.
         if rowsRemoved == 0:
             self.totalDividend += payment
             raise ValueError("Dividend payment of ${} was not in database. Module: removeDividend.".format(payment, date))
     
+    # Builds the sorted event arrays used by the point-in-time getters: the dates of
+    # the positions (FACT_POSITIONS) and dividends of the stock with the cumulative
+    # quantities and EUR amounts up to each date.
+    def _buildEvents(self):
+        db = self.database
+        positions = db.getPositions([self.stockCode], utils.MIN_DATE, utils.MAX_DATE)
+        dividends = db.getDividends([self.stockCode], utils.MIN_DATE, utils.MAX_DATE)
+        dividends = dividends.iloc[np.argsort(utils.toDays(dividends[db.DIVIDEND_DATE].values), kind = "stable")]
+
+        return {"positionDates": utils.toDays(positions[db.DATE].values),
+                "boughtCumsum": positions[db.TOTAL_BOUGHT].values,
+                "soldCumsum": positions[db.TOTAL_SOLD].values,
+                "pricePaidCumsum": positions[db.TOTAL_PRICEPAID_EUR].values,
+                "commissionsCumsum": positions[db.TOTAL_COMMISSION_EUR].values,
+                "dividendDates": utils.toDays(dividends[db.DIVIDEND_DATE].values),
+                "dividendCumsum": np.cumsum(dividends[db.DIVIDEND_AMOUNT].values.astype(float))}
+
+    # Returns the event arrays, building them on first use and again after any write
+    # to the database, whether made by this stock, another Stock or an importer
+    def getEvents(self):
+        writeCount = self.database.getWriteCount()
+        if self._events is None or self._eventsWriteCount != writeCount:
+            self._events = self._buildEvents()
+            self._eventsWriteCount = writeCount
+        return self._events
+
+    # Returns the value of the cumulative sum cumsum at date, by binary search in the
+    # sorted event dates. 0 if there are no events up to date.
+    def _cumulativeAt(self, datesName, cumsumName, date):
+        events = self.getEvents()
+        index = np.searchsorted(events[datesName], utils.toDays(date), side = "right")
+        if index == 0:
+            return 0
+        return events[cumsumName][index - 1]
+
     # Get the number of the stock OWNED at date. Default date is today.
     def getOwned(self, date = utils.DEFAULT_DATE):
-        OwnedRange = self.getOwnedRange(startDate = utils.DEFAULT_STARTDATE, endDate = date)
-        Owned_at_date = OwnedRange.loc[OwnedRange[self.database.DATE]==date,"OWNED"]
-        return Owned_at_date.values[0]
+        return self.getBought(date) - self.getSold(date)
         
     # Get the number of the stock sold at date. Default date is today.
     def getSold(self, date = utils.DEFAULT_DATE):
-        data = self.soldRange(startDate = utils.DEFAULT_STARTDATE, endDate = date)
-        # If data is empty return 0
-        if data.empty:
-            print('No data for dates up to {}. Method: Stock.getSold.'.format(date))
-            return 0
-        return data.loc[data[self.database.DATE]==date,"SOLD_CUMSUM"].values[0]
+        return self._cumulativeAt("positionDates", "soldCumsum", date)
 
    # Get the number of the bought sold at date. Default date is today.
     def getBought(self, date = utils.DEFAULT_DATE):
-        data = self.soldRange(startDate = utils.DEFAULT_STARTDATE, endDate = date)
-        # If data is empty return 0
-        if data.empty:
-            print('No data for dates up to {}. Method: Stock.getBought.'.format(date))
-            return 0
-        return data.loc[data[self.database.DATE]==date,"BOUGHT_CUMSUM"].values[0]
+        return self._cumulativeAt("positionDates", "boughtCumsum", date)
                
     # Get the total spent as price paid + commissions
     def getSpent(self, date = utils.DEFAULT_DATE):
-        data = self.getSpentRange(startDate = utils.DEFAULT_STARTDATE, endDate = date)
-        if data.empty:
-            print('No data for dates up to {}. Method: Stock.getSpent.'.format(date))
-            return 0
-        return data.loc[data[self.database.DATE]==date,"SPENT_EUR_CUMSUM"].values[0]
+        return self.getPricePaid(date) + self.getCommissions(date)
     
      # Get the total price paid in Euros for a stock. Default date is today.
     def getPricePaid(self, date = utils.DEFAULT_DATE):
-        data = self.getPricePaidRange(startDate = utils.DEFAULT_STARTDATE, endDate = date)
-        if data.empty:
-            print('No data for dates up to {}. Method: Stock.getPricePaid.'.format(date))
-            return 0
-        return data.loc[data[self.database.DATE]==date,"PRICEPAID_EUR_CUMSUM"].values[0]
+        return self._cumulativeAt("positionDates", "pricePaidCumsum", date)
               
     # Get the total commissions paid in Euros for a stock. Default date is today.
     def getCommissions(self, date = utils.DEFAULT_DATE):
-        data = self.getCommissionsRange(startDate = utils.DEFAULT_STARTDATE, endDate = date)
-        if data.empty:
-            print('No data for dates up to {}. Method: Stock.getCommissions.'.format(date))
-            return 0
-        return data.loc[data[self.database.DATE]==date,"COMMISSION_EUR_CUMSUM"].values[0]
+        return self._cumulativeAt("positionDates", "commissionsCumsum", date)
 
-    # Get the profit & losses in EUR for a stock. Default date is today.
+    # Get the profit & losses in EUR for a stock, on the last session on or before
+    # date (see the *Range methods). Default date is today.
     def Profits_Losses(self, date = utils.DEFAULT_DATE):
         data = self.Profits_LossesRange(startDate  = utils.DEFAULT_STARTDATE, endDate = date)
-        if data.empty:
+        index = np.searchsorted(utils.toDays(data[self.database.DATE].values), utils.toDays(date), side = "right") - 1
+        if index < 0:
             print('No profits and losses for dates up to {}. Method: Stock.Profits_Losses.'.format(date))
             return 0
-        return data.loc[data[self.database.DATE]==date,"P_L"].values[0]
+        return data["P_L"].values[index]
 
     # Get the price of the stock at date. Default date is today.
     def getPrice(self, date = utils.DEFAULT_DATE):
-        data = self.getPriceRange(startDate = utils.DEFAULT_STARTDATE, endDate = date)
+        dates, prices = PRICE_STORE.getSeries(self.database, [self.stockCode])[self.stockCode]
+        day = utils.toDays(date)
+        index = np.searchsorted(dates, day, side = "left")
         
-        # If data is empty raise ValueError
-        if data.empty:
+        # If there is no price on date raise ValueError
+        if index == len(dates) or dates[index] != day:
             raise ValueError(('No price data for {}. Method: Stock.getPrice.'.format(date)))
-        return data.loc[data[self.database.DATE]==date,self.database.PRICE].values[0]
+        return prices[index]
 
     # get the total value of the stock at date. Default date is today.
     def getValue(self, date = utils.DEFAULT_DATE):
@@ -240,12 +308,7 @@ class Stock:
         
     # Get the total amount of dividend payments at date.
     def getDividend(self, date = utils.DEFAULT_DATE):
-        data = self.getDividendRange(startDate = utils.DEFAULT_STARTDATE, endDate = date)          
-        # If data is empty return 0
-        if data.empty:
-            print(('No dividend data for {}. Method: Stock.getDividend.'.format(date)))
-            return 0
-        return data.loc[data[self.database.DIVIDEND_DATE]==date,"DIVIDEND_CUMSUM"].values[0]
+        return self._cumulativeAt("dividendDates", "dividendCumsum", date)
 
     # Get the currencies (YAHOO_CURRENCY or GOOGLE_FINANCE_CURRENCY) of a list of stocks
     def getCurrency(self, tickers):
@@ -270,7 +333,7 @@ class Stock:
         spent = self.getSpentRange(startDate, endDate)
         value = self.getValueRange(startDate, endDate)
         
-        Dates = pd.DataFrame(pd.date_range(startDate, endDate), columns = [self.database.DATE])
+        Dates = self._sessions(startDate, endDate, self.database.DATE)
         dates_spent = pd.merge(Dates, spent, how = "left", on = self.database.DATE)
         dates_spent_value = pd.merge(dates_spent, value, how = "left", on = self.database.DATE)
         dates_spent_value["P_L"] = dates_spent_value["VALUE_EUR"] - dates_spent_value["SPENT_EUR_CUMSUM"]
@@ -281,6 +344,44 @@ class Stock:
             raise ValueError(('No profit & loss data in the range {} - {}. Method: Stock.Profits_LossesRange'.format(startDate, endDate)))
         return data
         
+    # Generator of dataframes with, for every day of a chunk of chunkDays days between
+    # startDate and endDate, the number OWNED, the price (forward filled), the value,
+    # the amount spent, the dividends received and the profit & loss in EUR. The
+    # running totals are carried from one chunk to the next, so the memory used does
+    # not depend on the length of the range.
+    def iterRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE, chunkDays = CHUNK_DAYS):
+        engine = ValuationEngine(self.database, self.currencyfield)
+        for valuation in engine.iterRun([self.stockCode], startDate, endDate, chunkDays):
+            yield pd.DataFrame({self.database.DATE: utils.toDatetimes(valuation.dates),
+                                'OWNED': valuation.holdings[:, 0],
+                                self.database.PRICE: valuation.prices[:, 0],
+                                'VALUE_EUR': valuation.value[:, 0],
+                                'SPENT_EUR_CUMSUM': valuation.spent[:, 0],
+                                'DIVIDEND_CUMSUM': valuation.dividends[:, 0],
+                                'P_L': valuation.profitsLosses[:, 0]})
+
+    # Trading calendar of the exchange of the stock
+    def getCalendar(self):
+        return self.database.getCalendars([self.stockCode])[self.stockCode]
+
+    # Dataframe with a column of the sessions of the stock between startDate and endDate,
+    # the dates of the *Range methods
+    def _sessions(self, startDate, endDate, dateColumn):
+        sessions = self.getCalendar().sessions(utils.toDays(startDate), utils.toDays(endDate))
+        return pd.DataFrame({dateColumn: utils.toDatetimes(sessions)})
+
+    # Session of each day: the first session on or after it, the last session on or
+    # before endDate for the days after it (e.g. a transaction on a weekend endDate)
+    def _toSessions(self, days, endDate):
+        calendar = self.getCalendar()
+        return np.minimum(calendar.nextSession(days), calendar.previousSession(utils.toDays(endDate)))
+
+    # Events up to endDate moved to their session (see _toSessions) and summed by session
+    def _eventsBySession(self, events, dateColumn, column, endDate):
+        events = events[[dateColumn, column]].copy()
+        events[dateColumn] = utils.toDatetimes(self._toSessions(utils.toDays(events[dateColumn].values), endDate))
+        return events.groupby(dateColumn, as_index = False)[column].sum()
+
     # Get a data frame containing the price of the stock over a range of dates    
     def getPriceRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
         tickers = [self.stockCode]
@@ -291,29 +392,38 @@ class Stock:
             raise ValueError(('No price data in the range {} - {}. Method: Stock.getPriceRange'.format(startDate, endDate)))
         return data[[self.database.DATE, self.database.PRICE]]
     
+    # Gets a dataframe with the running totals of FACT_POSITIONS for every date in a range of dates
+    def getPositionsRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
+        positions = self.database.getPositions([self.stockCode], startDate, endDate)
+        Dates = self._sessions(startDate, endDate, self.database.DATE)
+        
+        # Each session takes the last position on or before it, the position before
+        # startDate included. Positions after the last session of the range count on it.
+        positions[self.database.DATE] = utils.toDatetimes(self._toSessions(utils.toDays(positions[self.database.DATE].values), endDate))
+        positions = positions.drop_duplicates(subset = self.database.DATE, keep = "last")
+        data = pd.merge_asof(Dates, positions, on = self.database.DATE, direction = "backward")
+        data = data.ffill().fillna(0)
+        return data
+    
     # Gets a dataframe containing the number of shares OWNED over a range of dates    
     def getOwnedRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
-        bought = self.getBoughtRange(startDate, endDate)
-        sold = self.getSoldRange(startDate, endDate)
-        
-        data = pd.merge(bought, sold, how = 'outer', on = self.database.DATE)
-        data['OWNED'] = data['BOUGHT_CUMSUM'] - data['SOLD_CUMSUM'] 
+        data = self.getPositionsRange(startDate, endDate)
+        data = data.rename(columns = {self.database.TOTAL_BOUGHT: 'BOUGHT_CUMSUM',
+                                      self.database.TOTAL_SOLD: 'SOLD_CUMSUM',
+                                      self.database.TOTAL_OWNED: 'OWNED'})
         
         if data.empty:
             print('No data for dates up to {}. Method: Stock.getOwnedRange.'.format(endDate))
             return 0
-        return data
+        return data[[self.database.DATE, 'BOUGHT_CUMSUM', 'SOLD_CUMSUM', 'OWNED']]
 
-   # Get the number of the stock sold at date over a range of dates. Default end date is today.
+   # Get the number of the stock sold at date over a range of dates, counting the
+   # sales before startDate. Default end date is today.
     def getSoldRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
         sold  = self.database.getTransactions([self.stockCode], startDate, endDate, direction = "SOLD")
-        sold = sold[[self.database.DATE, self.database.QUANTITY_SOLD]]
-        sold[self.database.DATE] = pd.to_datetime(sold[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')# Transform date into datetime
-        Dates = pd.DataFrame(pd.date_range(startDate, endDate), columns = [self.database.DATE])
-        
-        data = pd.merge(Dates, sold, how = "left", on = self.database.DATE)
-        data = data.fillna(0)
-        data['SOLD_CUMSUM'] = data[self.database.QUANTITY_SOLD].cumsum() 
+        data = self._cumulativeDailyRange(sold, self.database.DATE, self.database.QUANTITY_SOLD, startDate, endDate,
+                                          self._totalBefore("positionDates", "soldCumsum", startDate))
+        data = data.rename(columns = {self.database.QUANTITY_SOLD + '_CUMSUM': 'SOLD_CUMSUM'})
         
         # If data is empty return 0
         if data.empty:
@@ -321,67 +431,24 @@ class Stock:
             return 0
         return data
 
-   # Get the number of the bought sold at date over a range of dates. Default end date is today.
+   # Get the number of the bought sold at date over a range of dates, counting the
+   # purchases before startDate. Default end date is today.
     def getBoughtRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
         bought  = self.database.getTransactions([self.stockCode], startDate, endDate, direction = "BOUGHT")
-        bought = bought[[self.database.DATE, self.database.QUANTITY_BOUGHT]]
-        bought[self.database.DATE] = pd.to_datetime(bought[self.database.DATE], format = '%Y-%m-%d %H:%M:%S') # Transform date into datetime
-        Dates = pd.DataFrame(pd.date_range(startDate, endDate), columns = [self.database.DATE])
-        
-        data = pd.merge(Dates, bought, how = "left", on = self.database.DATE)
-        data = data.fillna(0)
-        data['BOUGHT_CUMSUM'] = data[self.database.QUANTITY_BOUGHT].cumsum() 
+        data = self._cumulativeDailyRange(bought, self.database.DATE, self.database.QUANTITY_BOUGHT, startDate, endDate,
+                                          self._totalBefore("positionDates", "boughtCumsum", startDate))
+        data = data.rename(columns = {self.database.QUANTITY_BOUGHT + '_CUMSUM': 'BOUGHT_CUMSUM'})
         # If data is empty return 0
         if data.empty:
             print('No data for dates up to {}. Method: Stock.getBoughtRange.'.format(endDate))
             return 0
         return data
 
-    # Get the total price paid in Euros for a stock for a range of dates. Default enddate is today.
+    # Get the total price paid in Euros for a stock for a range of dates, from the
+    # running totals of FACT_POSITIONS. Default enddate is today.
     def getPricePaidRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
-        # Get the number of sold assets used to buy this stock
-        cost  = self.database.getTransactions([self.stockCode], startDate, endDate, direction = "BOUGHT")
-        cost = cost.sort_values(by=['DATE', 'INSTRUMENT_SOLD'], ascending = True)
-        cost[self.database.DATE] = pd.to_datetime(cost[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')
-        
-        # Get the price of the sold assets on that date (this is CCYEUR exchange rate when a currency is used to pay)
-        tickers_list = cost['INSTRUMENT_SOLD'].drop_duplicates().values.tolist() # list of instruments sold
-        
-        price = self.database.getPrices(tickers_list, startDate, endDate)
-        price = price.sort_values(by=['DATE', 'IB_TICKER'], ascending = True)
-        price.columns = ['DATE', 'INSTRUMENT_SOLD', 'PRICE_INSTRUMENT_SOLD']
-        
-        # Get the currencies of the sold assets
-        currencies = self.getCurrency(tickers_list)
-        currencies['INSTRUMENT_SOLD'] = tickers_list
-        
-        # Assign the currencies to the sold assets in the price table
-        price_curr = pd.merge(price, currencies, how = 'left', on = 'INSTRUMENT_SOLD') 
-        
-        # Get the CCYEUR rates       
-        tickers_list = price_curr[self.currencyfield].drop_duplicates().values.tolist() # list of currencies of the instruments sold
-        priceDATACURR = self.database.getPrices(tickers_list, startDate, endDate) 
-        priceDATACURR[self.database.DATE] = pd.to_datetime(priceDATACURR[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')
-        priceDATACURR = priceDATACURR.sort_values(by=['DATE', 'IB_TICKER'], ascending = True)
-        priceDATACURR.columns = ['DATE', self.currencyfield, 'PRICE_DATA_CURRENCY']
-        
-        # Assign the CCYEUR rates to the price table
-        price_curr2 = pd.merge_asof(price_curr, priceDATACURR, on='DATE', by=self.currencyfield)
-        
-        # Assign the cost in EUR of the instruments sold to the transaction table
-        cost_price_curr2 = pd.merge_asof(cost, price_curr2, on='DATE', by='INSTRUMENT_SOLD')
-        
-        # Calculate the price in EUR per transaction and add the cumulative sum
-        cost_price_curr2['PRICEPAID_EUR'] =  cost_price_curr2['QUANTITY_SOLD'] *  cost_price_curr2['PRICE_INSTRUMENT_SOLD'] * cost_price_curr2['PRICE_DATA_CURRENCY']
-
-        
-        # Now create a series of dates and join to it
-        cost_price_curr2[self.database.DATE] = pd.to_datetime(cost_price_curr2[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')# Transform date into datetime
-        Dates = pd.DataFrame(pd.date_range(startDate, endDate), columns = [self.database.DATE])
-        
-        data = pd.merge(Dates, cost_price_curr2, how = "left", on = self.database.DATE)
-        data = data.fillna(0)
-        data['PRICEPAID_EUR_CUMSUM'] = data['PRICEPAID_EUR'].cumsum()
+        data = self.getPositionsRange(startDate, endDate)
+        data = data.rename(columns = {self.database.TOTAL_PRICEPAID_EUR: 'PRICEPAID_EUR_CUMSUM'})
         
         # If data is empty return 0
         if data.empty:
@@ -389,32 +456,11 @@ class Stock:
             return 0
         return data[[self.database.DATE,'PRICEPAID_EUR_CUMSUM']]
               
-    # Get the total commissions paid in Euros for a stock for a range of dates. Default end date is today.
+    # Get the total commissions paid in Euros for a stock for a range of dates, from
+    # the running totals of FACT_POSITIONS. Default end date is today.
     def getCommissionsRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
-        # Get the commissions paid for a stock
-        commissionsCHF  = self.database.getTransactions([self.stockCode], startDate, endDate, direction = "BOUGHT")
-        commissionsCHF = commissionsCHF.sort_values(by=['DATE'], ascending = True)
-        
-        # Get the CHFEUR rates to convert the commissions to EUR              
-        CHFEUR = self.database.getPrices(["CHF"], startDate, endDate)
-        CHFEUR = CHFEUR.sort_values(by=['DATE'], ascending = True)
-
-        # Transform DATE to datetime and merge the commission date to the previous available date 
-        commissionsCHF[self.database.DATE] = pd.to_datetime(commissionsCHF[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')
-        CHFEUR[self.database.DATE] =  pd.to_datetime(CHFEUR[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')
-               
-        commissionsCHF_L_CHFEUR = pd.merge_asof(commissionsCHF, CHFEUR, on='DATE')
-        
-        # Convert the commission in EUR and add the cumulative sum
-        commissionsCHF_L_CHFEUR['COMMISSION_EUR'] = commissionsCHF_L_CHFEUR['COMMISSION'] * commissionsCHF_L_CHFEUR['PRICE']
-
-        # Now create a series of dates and join to it
-        commissionsCHF_L_CHFEUR[self.database.DATE] = pd.to_datetime(commissionsCHF_L_CHFEUR[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')# Transform date into datetime
-        Dates = pd.DataFrame(pd.date_range(startDate, endDate), columns = [self.database.DATE])
-        
-        data = pd.merge(Dates, commissionsCHF_L_CHFEUR, how = "left", on = self.database.DATE)
-        data = data.fillna(0)
-        data['COMMISSION_EUR_CUMSUM'] = data['COMMISSION_EUR'].cumsum()
+        data = self.getPositionsRange(startDate, endDate)
+        data = data.rename(columns = {self.database.TOTAL_COMMISSION_EUR: 'COMMISSION_EUR_CUMSUM'})
 
         # If data is empty return 0
         if data.empty:
@@ -422,18 +468,33 @@ class Stock:
             return 0
         return data[[self.database.DATE,'COMMISSION_EUR_CUMSUM']]
 
+    # Sums the column of the events by session, joins it to every session of the range
+    # and adds the cumulative sum, starting from initial (the total before startDate),
+    # as column + "_CUMSUM"
+    def _cumulativeDailyRange(self, events, dateColumn, column, startDate, endDate, initial = 0):
+        events = self._eventsBySession(events, dateColumn, column, endDate)
+        Dates = self._sessions(startDate, endDate, dateColumn)
+        
+        data = pd.merge(Dates, events, how = "left", on = dateColumn)
+        data = data.fillna(0)
+        data[column + '_CUMSUM'] = initial + data[column].cumsum()
+        return data
+
+    # Value of the cumulative sum of the event arrays on the day before startDate
+    def _totalBefore(self, datesName, cumsumName, startDate):
+        return self._cumulativeAt(datesName, cumsumName, utils.toDays(startDate) - 1)
+
     # Get the total spent as price paid + commissions for a range of dates. Default end date is today
     def getSpentRange(self,  startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
-        pricepaid = self.getPricePaidRange(startDate, endDate) 
-        commissions = self.getCommissionsRange(startDate, endDate)
-        
-        data = pd.merge(pricepaid, commissions, how = 'inner', on = self.database.DATE)
+        data = self.getPositionsRange(startDate, endDate)
+        data = data.rename(columns = {self.database.TOTAL_PRICEPAID_EUR: 'PRICEPAID_EUR_CUMSUM',
+                                      self.database.TOTAL_COMMISSION_EUR: 'COMMISSION_EUR_CUMSUM'})
         data['SPENT_EUR_CUMSUM'] = data['PRICEPAID_EUR_CUMSUM'] + data['COMMISSION_EUR_CUMSUM'] 
         
         if data.empty:
             print('No data for dates up to {}. Method: Stock.getSpentRange.'.format(endDate))
             return 0
-        return data
+        return data[[self.database.DATE, 'PRICEPAID_EUR_CUMSUM', 'COMMISSION_EUR_CUMSUM', 'SPENT_EUR_CUMSUM']]
     
     # Get a dataframe containing the total value of the stock over a range of dates
     def getValueRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
@@ -442,23 +503,16 @@ class Stock:
         OWNED = self.getOwnedRange(startDate, endDate)
         OWNED[self.database.DATE] = pd.to_datetime(OWNED[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')  # Transform date into datetime
         
-        price_OWNED = pd.merge(price, OWNED, how = "left", on=self.database.DATE)
+        # Prices on days that are not sessions take the holdings of the previous session
+        price_OWNED = pd.merge_asof(price, OWNED, on = self.database.DATE, direction = "backward")
         # Add a column for the total value of the stock
         price_OWNED['Total_Value'] = price_OWNED[self.database.PRICE] * price_OWNED['OWNED']
         
-        # Convert to EUR
-        # 1. Get the currency of the stock and the corresponding CCYEUR rate
-        currencies = self.getCurrency([self.stockCode])
-        currency_list = currencies[self.currencyfield].tolist()
-        # 2. Get the exchange rate
-        priceDATACURR = self.database.getPrices(currency_list, startDate, endDate)
-        priceDATACURR[self.database.DATE] = pd.to_datetime(priceDATACURR[self.database.DATE], format = '%Y-%m-%d %H:%M:%S')
-        priceDATACURR = priceDATACURR.sort_values(by=['DATE', 'IB_TICKER'], ascending = True)
-        priceDATACURR.columns = ['DATE', self.currencyfield, 'PRICE_DATA_CURRENCY']
-        # 3. Merge the exchange rate to the price on the closest (earlier) date
-        data = pd.merge_asof(price_OWNED, priceDATACURR, on='DATE')
-        # 4. Calculate the value of the position in EUR
-        data['VALUE_EUR'] =  data['Total_Value'] * data['PRICE_DATA_CURRENCY']
+        # Convert to EUR with the rate of the currency of the stock on each date
+        currency = self.database.getCurrencies([self.stockCode], self.currencyfield)[0]
+        data = price_OWNED
+        data['VALUE_EUR'] = self.database.getFXService().convert(data['Total_Value'].values, currency,
+                                                                 data[self.database.DATE].values, "EUR")
         
         # For any dates before the first purchase, set the total value to 0.
         data = data.fillna(0)
@@ -470,16 +524,14 @@ class Stock:
             return 0
         return data
         
-    # Gets a dataframe containing the total amount of dividend income over a range of dates    
+    # Gets a dataframe containing the total amount of dividend income over a range of
+    # dates, counting the payments before startDate
     def getDividendRange(self, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
         tickers = [self.stockCode]
         dividends = self.database.getDividends(tickers, startDate, endDate)
-        dividends[self.database.DIVIDEND_DATE] = pd.to_datetime(dividends[self.database.DIVIDEND_DATE], format = '%Y-%m-%d %H:%M:%S') # Transform date into datetime
-        
-        Dates = pd.DataFrame(pd.date_range(startDate, endDate), columns = [self.database.DIVIDEND_DATE])
-        data = pd.merge(Dates, dividends, how = "left", on = self.database.DIVIDEND_DATE)
-        data = data.fillna(0)
-        data['DIVIDEND_CUMSUM'] = data[self.database.DIVIDEND_AMOUNT].cumsum() 
+        data = self._cumulativeDailyRange(dividends, self.database.DIVIDEND_DATE, self.database.DIVIDEND_AMOUNT, startDate, endDate,
+                                          self._totalBefore("dividendDates", "dividendCumsum", startDate))
+        data = data.rename(columns = {self.database.DIVIDEND_AMOUNT + '_CUMSUM': 'DIVIDEND_CUMSUM'})
            
         data = data[[self.database.DIVIDEND_DATE, 'DIVIDEND_CUMSUM']]
 
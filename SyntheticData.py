@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Generator of synthetic portfolio databases, used by Benchmark.py.
+
+Creates a database with the PortfolioDB schema holding a given number of
+instruments quoted in several currencies, daily prices (random walks) for a
+number of years up to today, exchange rates, transactions and dividends. The
+data are drawn from a seeded random generator, so the same arguments always
+give the same database.
+
+Usage: python SyntheticData.py path [instruments] [years] [transactions]
+
+Created on Sun Oct 18 2026
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import utils
+from Database import Database
+from PortfolioDB import PortfolioDB
+
+###############
+## Constants ##
+###############
+CURRENCIES = {"EUR": 1.0, "USD": 0.9, "CHF": 0.93, "GBP": 1.15} # currency -> first rate to EUR
+DIVIDENDS_PER_YEAR = 4
+SELL_FRACTION = 0.2     # fraction of the transactions that sell part of a position
+FX_FRACTION = 0.05      # fraction of the transactions that exchange currencies
+
+# Table definitions, as in the portfolio database
+STOCKS_DEFINITION = "{} TEXT NOT NULL UNIQUE, {} TEXT PRIMARY KEY, {} TEXT, {} TEXT, {} TEXT, {} TEXT, {} TEXT, {} TEXT, {} TEXT, {} TEXT, {} TEXT, {} TEXT, {} TEXT" \
+    .format(*PortfolioDB.STOCKS_COLUMNS)
+HISTORICAL_DEFINITION = "{0} DATETIME NOT NULL, {1} TEXT NOT NULL, {2} REAL NOT NULL, PRIMARY KEY ({0}, {1})" \
+    .format(PortfolioDB.DATE, PortfolioDB.IB_TICKER, PortfolioDB.PRICE)
+DIVIDEND_DEFINITION = "{0} DATETIME NOT NULL, {1} TEXT NOT NULL, {2} REAL NOT NULL, PRIMARY KEY ({0}, {1})" \
+    .format(PortfolioDB.DIVIDEND_DATE, PortfolioDB.IB_TICKER, PortfolioDB.DIVIDEND_AMOUNT)
+TRANSACTIONS_DEFINITION = "{} INTEGER PRIMARY KEY AUTOINCREMENT, {} DATETIME NOT NULL, {} TEXT NOT NULL, {} REAL NOT NULL, {} TEXT, {} REAL NOT NULL, {} REAL NOT NULL" \
+    .format(*PortfolioDB.TRANSACTIONS_COLUMNS)
+
+# Creates the database at path (replacing any existing file) and returns the tickers
+# of the instruments
+def generate(path, instruments = 10, years = 2, transactions = 200, seed = 0):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    random = np.random.default_rng(seed)
+
+    # Create the tables with the schema of the portfolio database, then open it as a
+    # PortfolioDB so that the indexes and FACT_POSITIONS are created
+    database = Database(path, None)
+    for table, definition in ((PortfolioDB.STOCKS_TABLE_NAME, STOCKS_DEFINITION),
+                              (PortfolioDB.HISTORICAL_TABLE_NAME, HISTORICAL_DEFINITION),
+                              (PortfolioDB.DIVIDEND_TABLE_NAME, DIVIDEND_DEFINITION),
+                              (PortfolioDB.TRANSACTIONS_TABLE_NAME, TRANSACTIONS_DEFINITION)):
+        database.createTable(table, definition)
+    database.close()
+    database = PortfolioDB(path, None)
+
+    currencies = list(CURRENCIES)
+    tickers = ["SYN{:04d}".format(i) for i in range(instruments)]
+    quoted = random.choice(currencies, size = instruments)
+    stocks = pd.DataFrame({column: None for column in PortfolioDB.STOCKS_COLUMNS}, index = range(instruments + len(currencies)))
+    stocks[PortfolioDB.NAME] = ["Synthetic {}".format(ticker) for ticker in tickers] + currencies
+    stocks[PortfolioDB.IB_TICKER] = tickers + currencies
+    for column in (PortfolioDB.IB_CURRENCY, PortfolioDB.GOOGLE_FINANCE_CURRENCY, PortfolioDB.YAHOO_CURRENCY):
+        stocks[column] = list(quoted) + currencies
+    database.addToDatabase(stocks, PortfolioDB.STOCKS_TABLE_NAME)
+
+    # Daily random walks up to today, weekdays only for the instruments
+    end = utils.toDays(utils.DEFAULT_DATE)
+    days = np.arange(end - int(365.25 * years), end + 1)
+    weekdays = days[(days.view('int64') - 4) % 7 < 5] # 1970-01-05 was a Monday
+    instrumentPrices = 100 * np.exp(np.cumsum(random.normal(0.0002, 0.01, (len(weekdays), instruments)), axis = 0))
+    rates = np.array(list(CURRENCIES.values())) * np.exp(np.cumsum(random.normal(0, 0.003, (len(days), len(currencies))), axis = 0))
+    rates[:, currencies.index("EUR")] = 1
+    prices = pd.concat([
+        pd.DataFrame({PortfolioDB.DATE: np.repeat(utils.toDatetimes(weekdays), instruments),
+                      PortfolioDB.IB_TICKER: np.tile(tickers, len(weekdays)),
+                      PortfolioDB.PRICE: instrumentPrices.ravel()}),
+        pd.DataFrame({PortfolioDB.DATE: np.repeat(utils.toDatetimes(days), len(currencies) - 1),
+                      PortfolioDB.IB_TICKER: np.tile([c for c in currencies if c != "EUR"], len(days)),
+                      PortfolioDB.PRICE: np.delete(rates, currencies.index("EUR"), axis = 1).ravel()})],
+        ignore_index = True)
+    database.addToDatabase(prices, PortfolioDB.HISTORICAL_TABLE_NAME)
+
+    # Transactions: buys of instruments, partial sells and currency exchanges
+    dayIndex = np.sort(random.integers(0, len(weekdays), transactions))
+    instrument = random.integers(0, instruments, transactions)
+    price = instrumentPrices[dayIndex, instrument]
+    quantity = random.integers(1, 100, transactions).astype(float)
+    kind = random.random(transactions)
+    sell = (kind < SELL_FRACTION) & (dayIndex > 0)
+    fx = kind > 1 - FX_FRACTION
+    quantity[sell] = np.maximum(1, np.floor(quantity[sell] / 4))
+    stockCodes = np.array(tickers, dtype = object)[instrument]
+    cash = quoted[instrument].astype(object)
+    fxBought = np.array(currencies, dtype = object)[random.integers(1, len(currencies), transactions)]
+    trades = pd.DataFrame({PortfolioDB.DATE: utils.toDatetimes(weekdays[dayIndex]),
+                           PortfolioDB.INSTRUMENT_BOUGHT: np.where(fx, fxBought, np.where(sell, cash, stockCodes)),
+                           PortfolioDB.QUANTITY_BOUGHT: np.where(fx, quantity * 100, np.where(sell, quantity * price, quantity)),
+                           PortfolioDB.INSTRUMENT_SOLD: np.where(fx, "EUR", np.where(sell, stockCodes, cash)),
+                           PortfolioDB.QUANTITY_SOLD: np.where(fx, quantity * 100, np.where(sell, quantity, quantity * price)),
+                           PortfolioDB.COMMISSION: np.round(random.uniform(0, 10, transactions), 2)})
+    database.addToDatabase(trades, PortfolioDB.TRANSACTIONS_TABLE_NAME)
+
+    # Dividends paid a few times a year by half of the instruments
+    payers = np.flatnonzero(random.random(instruments) < 0.5)
+    payDays = weekdays[::max(1, len(weekdays) // max(1, int(DIVIDENDS_PER_YEAR * years)))]
+    dividends = pd.DataFrame({PortfolioDB.DIVIDEND_DATE: np.repeat(utils.toDatetimes(payDays), len(payers)),
+                              PortfolioDB.IB_TICKER: np.tile(np.array(tickers, dtype = object)[payers], len(payDays)),
+                              PortfolioDB.DIVIDEND_AMOUNT: np.round(random.uniform(1, 50, len(payDays) * len(payers)), 2)})
+    database.addToDatabase(dividends, PortfolioDB.DIVIDEND_TABLE_NAME)
+    database.close()
+    return tickers
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    arguments = [int(argument) for argument in sys.argv[2:5]]
+    tickers = generate(sys.argv[1], *arguments)
+    print("Created {} with {} instruments.".format(sys.argv[1], len(tickers)))
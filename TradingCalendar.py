@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Trading calendars of the exchanges of DIM_STOCKS.IB_EXCHANGE.
+
+A calendar holds a weekmask and the holidays of its exchange, evaluated once
+from rules for the years FIRST_YEAR to LAST_YEAR into a numpy business day
+calendar, so that the sessions of any date range are found with one vectorized
+test. Crypto currencies and the exchange rates of the Google Finance sheet are
+quoted every day and use the 24/7 DAILY calendar. Exchanges without rules trade
+on weekdays.
+
+The holiday rules cover the regular closures only; one-off closures (e.g. days
+of national mourning) are not included.
+
+Created on Sun Oct 18 2026
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import AbstractHolidayCalendar, Holiday, GoodFriday, EasterMonday, Easter, Day, \
+    DateOffset, MO, next_monday, next_monday_or_tuesday
+
+###############
+## Constants ##
+###############
+FIRST_YEAR = 1970 # holidays are evaluated between these years, other years only skip weekends
+LAST_YEAR = 2100
+CRYPTO_EXCHANGES = ("CRYPTO", "PAXOS", "ZEROHASH")
+DAILY_SYMBOL_PREFIX = "CURRENCY:" # Google Finance symbols of currencies and crypto currencies
+
+NEW_YEAR = Holiday("New Year's Day", month = 1, day = 1)
+LABOUR_DAY = Holiday("Labour Day", month = 5, day = 1)
+CHRISTMAS_EVE = Holiday("Christmas Eve", month = 12, day = 24)
+CHRISTMAS = Holiday("Christmas Day", month = 12, day = 25)
+BOXING_DAY = Holiday("Boxing Day", month = 12, day = 26)
+NEW_YEARS_EVE = Holiday("New Year's Eve", month = 12, day = 31)
+
+class EuronextHolidays(AbstractHolidayCalendar):
+    rules = [NEW_YEAR, GoodFriday, EasterMonday, LABOUR_DAY, CHRISTMAS, BOXING_DAY]
+
+class XetraHolidays(AbstractHolidayCalendar):
+    rules = [NEW_YEAR, GoodFriday, EasterMonday, LABOUR_DAY, CHRISTMAS_EVE, CHRISTMAS, BOXING_DAY, NEW_YEARS_EVE]
+
+class BorsaItalianaHolidays(AbstractHolidayCalendar):
+    rules = [NEW_YEAR, GoodFriday, EasterMonday, LABOUR_DAY, CHRISTMAS_EVE, CHRISTMAS, BOXING_DAY, NEW_YEARS_EVE]
+
+class SixHolidays(AbstractHolidayCalendar):
+    rules = [NEW_YEAR, Holiday("Berchtoldstag", month = 1, day = 2), GoodFriday, EasterMonday, LABOUR_DAY,
+             Holiday("Ascension Day", month = 1, day = 1, offset = [Easter(), Day(39)]),
+             Holiday("Whit Monday", month = 1, day = 1, offset = [Easter(), Day(50)]),
+             Holiday("Swiss National Day", month = 8, day = 1),
+             CHRISTMAS_EVE, CHRISTMAS, BOXING_DAY, NEW_YEARS_EVE]
+
+class LondonHolidays(AbstractHolidayCalendar):
+    rules = [Holiday("New Year's Day", month = 1, day = 1, observance = next_monday), GoodFriday, EasterMonday,
+             Holiday("Early May Bank Holiday", month = 5, day = 1, offset = DateOffset(weekday = MO(1))),
+             Holiday("Spring Bank Holiday", month = 5, day = 31, offset = DateOffset(weekday = MO(-1))),
+             Holiday("Summer Bank Holiday", month = 8, day = 31, offset = DateOffset(weekday = MO(-1))),
+             Holiday("Christmas Day", month = 12, day = 25, observance = next_monday),
+             Holiday("Boxing Day", month = 12, day = 26, observance = next_monday_or_tuesday)]
+
+# Trading days of an exchange. weekmask has one flag per weekday from Monday.
+class TradingCalendar:
+    # Class initializer. holidays is an AbstractHolidayCalendar class, None for none.
+    def __init__(self, name, weekmask = "1111100", holidays = None):
+        self.name = name
+        self.weekmask = weekmask
+        self._holidayRules = holidays
+        self._calendar = None
+
+    # Class string method
+    def __str__(self):
+        return "TradingCalendar - {}.".format(self.name)
+
+    # numpy business day calendar with the holidays, built on first use
+    def busdaycalendar(self):
+        if self._calendar is None:
+            holidays = []
+            if self._holidayRules is not None:
+                holidays = self._holidayRules().holidays("{}-01-01".format(FIRST_YEAR), "{}-12-31".format(LAST_YEAR))
+            self._calendar = np.busdaycalendar(weekmask = self.weekmask, holidays = np.asarray(holidays, dtype = 'datetime64[D]'))
+        return self._calendar
+
+    # True for the days (datetime64[D]) that are sessions
+    def isSession(self, days):
+        return np.is_busday(np.asarray(days, dtype = 'datetime64[D]'), busdaycal = self.busdaycalendar())
+
+    # Sessions between the days start and end included, as datetime64[D]
+    def sessions(self, start, end):
+        days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+        return days[self.isSession(days)]
+
+    # First session on or after the days
+    def nextSession(self, days):
+        return np.busday_offset(np.asarray(days, dtype = 'datetime64[D]'), 0, roll = "forward", busdaycal = self.busdaycalendar())
+
+    # Last session on or before the days
+    def previousSession(self, days):
+        return np.busday_offset(np.asarray(days, dtype = 'datetime64[D]'), 0, roll = "backward", busdaycal = self.busdaycalendar())
+
+DAILY = TradingCalendar("DAILY", weekmask = "1111111")
+WEEKDAYS = TradingCalendar("WEEKDAYS")
+# IB_EXCHANGE -> calendar
+EXCHANGE_CALENDARS = {"AEB": TradingCalendar("Euronext Amsterdam", holidays = EuronextHolidays),
+                      "SBF": TradingCalendar("Euronext Paris", holidays = EuronextHolidays),
+                      "EBS": TradingCalendar("SIX Swiss Exchange", holidays = SixHolidays),
+                      "IBIS2": TradingCalendar("Xetra", holidays = XetraHolidays),
+                      "LSEETF": TradingCalendar("London Stock Exchange", holidays = LondonHolidays),
+                      "LSE": TradingCalendar("London Stock Exchange", holidays = LondonHolidays),
+                      "BVME.ETF": TradingCalendar("Borsa Italiana", holidays = BorsaItalianaHolidays)}
+EXCHANGE_CALENDARS.update({exchange: DAILY for exchange in CRYPTO_EXCHANGES})
+
+# Calendar of an instrument from its IB_EXCHANGE and GOOGLE_FINANCE_SYMBOL: DAILY
+# for crypto exchanges and currency symbols, WEEKDAYS for unknown exchanges
+def getCalendar(exchange, symbol = None):
+    if isinstance(symbol, str) and symbol.startswith(DAILY_SYMBOL_PREFIX):
+        return DAILY
+    return EXCHANGE_CALENDARS.get(exchange, WEEKDAYS)
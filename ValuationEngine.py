@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized valuation of a whole portfolio.
+
+Holdings (from the running totals of FACT_POSITIONS), prices and exchange rates are
+built as aligned dates x instruments numpy arrays and the value, spent, dividend and
+profit & loss series of every instrument are computed in one pass, instead of
+merging one dataframe per stock and per quantity. The cost is linear in the number of dates times the number of instruments.
+
+Long histories can be valued in chunks of dates with iterRun, which yields one
+Valuation per chunk and carries the holdings, amounts spent and dividends from
+one chunk to the next, so the memory used does not grow with the range.
+
+Dividends are converted into the reporting currency with the rate of the day they
+are paid (0 before the first rate of their currency).
+
+Created on Sun Oct 18 2026
+"""
+
+import numpy as np
+import pandas as pd
+import utils
+
+###############
+## Constants ##
+###############
+CHUNK_DAYS = 366 # days valued at a time by iterRun
+
+# Result of ValuationEngine.run. All the matrices have one row per calendar day in
+# dates and one column per instrument in tickers. Amounts are in the reporting
+# currency of the FX service (EUR by default), except prices which are in the
+# currency of each instrument.
+class Valuation:
+    # Class initializer
+    def __init__(self, dates, tickers, holdings, prices, fx, spent, dividends):
+        self.dates = dates
+        self.tickers = tickers
+        self.holdings = holdings
+        self.prices = prices
+        self.fx = fx
+        self.spent = spent
+        self.dividends = dividends
+        # Dates before the first price or rate are worth 0
+        self.value = np.nan_to_num(holdings * prices * fx)
+        self.profitsLosses = self.value - self.spent
+
+    # Index of date in the date axis
+    def dateIndex(self, date):
+        index = np.searchsorted(self.dates, utils.toDays(date))
+        if index == len(self.dates) or self.dates[index] != utils.toDays(date):
+            raise ValueError("{} is outside the valuation range. Method: Valuation.dateIndex.".format(date))
+        return index
+
+    # Dataframe with the portfolio totals by date
+    def totals(self):
+        return pd.DataFrame({"DATE": utils.toDatetimes(self.dates),
+                             "SPENT_EUR": self.spent.sum(axis = 1),
+                             "VALUE_EUR": self.value.sum(axis = 1),
+                             "DIVIDEND_TOTAL": self.dividends.sum(axis = 1),
+                             "P_L": self.profitsLosses.sum(axis = 1)})
+
+    # Dataframe with the matrix (e.g. "value") of each instrument by date
+    def byInstrument(self, name):
+        data = pd.DataFrame(getattr(self, name), columns = self.tickers)
+        data.insert(0, "DATE", utils.toDatetimes(self.dates))
+        return data
+
+
+class ValuationEngine:
+    # Class initializer. currencyField is the DIM_STOCKS column holding the currency
+    # of the prices of each instrument.
+    def __init__(self, database, currencyField = None):
+        self.database = database
+        self.currencyField = currencyField if currencyField is not None else database.getCurrencyField()
+
+    # Values the instruments in tickers for every day between startDate and endDate.
+    # Positions and dividends before startDate, from the start of the history, are
+    # carried into the first day.
+    def run(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE):
+        valuation, _ = self._runChunk(list(dict.fromkeys(tickers)), utils.toDays(startDate), utils.toDays(endDate))
+        return valuation
+
+    # Values the instruments as run does, yielding one Valuation for each chunk of
+    # chunkDays days between startDate and endDate. The holdings, amounts spent and
+    # dividends at the end of a chunk are carried into the next one.
+    def iterRun(self, tickers, startDate = utils.DEFAULT_STARTDATE, endDate = utils.DEFAULT_DATE, chunkDays = CHUNK_DAYS):
+        tickers = list(dict.fromkeys(tickers))
+        end = utils.toDays(endDate)
+        carry = None
+        for chunkStart in np.arange(utils.toDays(startDate), end + 1, chunkDays):
+            chunkEnd = min(chunkStart + chunkDays - 1, end)
+            valuation, carry = self._runChunk(tickers, chunkStart, chunkEnd, carry)
+            yield valuation
+
+    # Values the instruments between the days start and end. carry holds the
+    # holdings, amounts spent (in EUR) and dividends of the day before start, None
+    # to read them from the database. Returns the valuation and the carry of end.
+    def _runChunk(self, tickers, start, end, carry = None):
+        db = self.database
+        columns = {ticker: i for i, ticker in enumerate(tickers)}
+        startDate, endDate = str(start) + " 00:00:00", str(end) + " 00:00:00"
+
+        # Prices of all instruments, and the rate from the currency of each instrument
+        # to the reporting currency
+        fxService = db.getFXService()
+        dates, _, prices = db.getPriceMatrix(tickers, startDate, endDate)
+        currencies = np.array(db.getCurrencies(tickers, self.currencyField), dtype = object)
+        fx = fxService.rateMatrix(currencies, dates)
+
+        # Running totals of the positions, forward filled from the last change before each date
+        positions = db.getPositions(tickers, startDate, endDate)
+        rows = np.clip((utils.toDays(positions[db.DATE].values) - dates[0]).astype(int) + 1, 0, None)
+        cols = positions[db.IB_TICKER].map(columns).values.astype(int)
+        # The extra first row holds the positions before startDate
+        shape = (len(dates) + 1, len(tickers))
+        holdings = np.full(shape, np.nan)
+        spent = np.full(shape, np.nan)
+        if carry is not None:
+            holdings[0], spent[0] = carry["holdings"], carry["spent"]
+        holdings[rows, cols] = positions[db.TOTAL_OWNED].values
+        spent[rows, cols] = positions[db.TOTAL_PRICEPAID_EUR].values + positions[db.TOTAL_COMMISSION_EUR].values
+        holdings = np.nan_to_num(utils.forwardFill(holdings)[1:])
+        spentEUR = np.nan_to_num(utils.forwardFill(spent)[1:])
+        # Positions hold EUR amounts
+        spent = spentEUR * fxService.rate("EUR", fxService.reportingCurrency, dates)[:, np.newaxis]
+
+        # The first chunk counts all the dividends paid up to its end, the next ones
+        # add the dividends of the chunk to the total carried. Each payment is
+        # converted from the currency of its instrument with the rate of its date.
+        dividends = np.zeros((len(dates), len(tickers)))
+        if carry is None:
+            paid = db.getDividends(tickers, utils.MIN_DATE, endDate)
+        else:
+            paid = db.getDividends(tickers, startDate, endDate)
+            dividends[0] = carry["dividends"]
+        paidColumns = paid[db.IB_TICKER].map(columns).values
+        amounts = fxService.convert(paid[db.DIVIDEND_AMOUNT].values, currencies[paidColumns.astype(int)],
+                                    paid[db.DIVIDEND_DATE].values)
+        self._addEvents(dividends, dates, paid[db.DIVIDEND_DATE].values, paidColumns, np.nan_to_num(amounts))
+
+        # Cumulative sum over the date axis turns the daily payments into running totals
+        np.cumsum(dividends, axis = 0, out = dividends)
+        carry = {"holdings": holdings[-1], "spent": spentEUR[-1], "dividends": dividends[-1]}
+        return Valuation(dates, np.array(tickers), holdings, prices, fx, spent, dividends), carry
+
+    # Adds the amounts of the events to the daily flow matrix. Events before the first
+    # date are added to the first day.
+    @staticmethod
+    def _addEvents(matrix, dates, eventDates, columns, amounts):
+        if len(eventDates) == 0:
+            return
+        rows = np.clip((utils.toDays(eventDates) - dates[0]).astype(int), 0, None)
+        inRange = rows < len(dates)
+        np.add.at(matrix, (rows[inRange], columns[inRange].astype(int)), amounts[inRange].astype(float))
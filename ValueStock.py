@@ -19,8 +19,8 @@ class ValueStock(Stock):
     desiredBuy = 0
     
     # Class initializer, calls initializer from parent class
-    def __init__(self, stockCode, percentage, database):
-      super().__init__(stockCode, database)
+    def __init__(self, stockCode, percentage, database, updateData = True):
+      super().__init__(stockCode, database, updateData = updateData)
       self.setPercentage = percentage
       
     # Class string method
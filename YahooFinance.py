@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+Yahoo Finance price provider, imported by PortfolioDB.fetchStockData only when
+the source is YAHOOFINANCE so that yfinance is not loaded otherwise.
+
+Created on Sun Oct 18 2026
+"""
+
+import yfinance as yf # https://aroussi.com/post/python-yahoo-finance
+# pip install yfinance --upgrade --no-cache-dir
+
+# Daily history of the Yahoo symbol from startDate (datetime). Returns the dataframe
+# of yfinance, indexed by date with a Close column.
+def getHistory(symbol, startDate):
+    stock = yf.Ticker(symbol)
+    return stock.history(interval="1d", start = startDate)
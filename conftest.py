@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures shared by the tests: a small synthetic portfolio database (see
+SyntheticData.py) created in the temporary directory of each test.
+
+Created on Sun Oct 18 2026
+"""
+
+import pytest
+import SyntheticData
+from PortfolioDB import PortfolioDB
+
+###############
+## Constants ##
+###############
+INSTRUMENTS = 5
+YEARS = 1
+TRANSACTIONS = 60
+
+# Path of a new synthetic database
+@pytest.fixture
+def databasePath(tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    SyntheticData.generate(path, INSTRUMENTS, YEARS, TRANSACTIONS)
+    return path
+
+# PortfolioDB opened on the synthetic database
+@pytest.fixture
+def database(databasePath):
+    database = PortfolioDB(databasePath, None)
+    yield database
+    database.close()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the return analytics against closed-form cases.
+
+Created on Sun Oct 18 2026
+"""
+
+import numpy as np
+import pytest
+import Analytics
+
+# A flow of -100 growing to 100 * (1 + rate) ** n after n periods has an irr of rate,
+# every column being solved in the same call. Flows of one sign have no rate.
+def test_irrClosedForm():
+    flows = np.array([[-100.0, -100.0, 100.0],
+                      [0.0, 50.0, 10.0],
+                      [121.0, 100.0 * 1.2 ** 2 - 50.0 * 1.2, 10.0]])
+    rates = Analytics.irr(flows)
+    assert rates[:2] == pytest.approx([0.1, 0.2], abs = 1e-9)
+    assert np.isnan(rates[2])
+    assert Analytics.irr([-100.0, 110.0]) == pytest.approx(0.1, abs = 1e-9)
+
+# An investment of 1000 returned with 8% a year after 730 days (2 years of
+# DAYS_PER_YEAR) has an xirr of 8%, whatever the flows in between that are
+# reinvested at the same rate
+def test_xirrClosedForm():
+    days = np.array(["2020-01-01", "2020-12-31", "2021-12-31"], dtype = "datetime64[D]")
+    assert Analytics.xirr([-1000.0, 0.0, 1000.0 * 1.08 ** 2], days) == pytest.approx(0.08, abs = 1e-9)
+    flows = [-1000.0, -500.0, 1000.0 * 1.08 ** 2 + 500.0 * 1.08]
+    assert Analytics.xirr(flows, days.astype(str)) == pytest.approx(0.08, abs = 1e-9)
+
+# Deposits and withdrawals do not move the time weighted return of a holding
+# growing by 1% a day, nor do the days before it has any value
+def test_timeWeightedReturnsIgnoreFlows():
+    growth = 1.01 ** np.arange(6)
+    flows = np.array([0.0, 0.0, 500.0, 0.0, -300.0, 0.0])
+    # Value at the end of each day: the units held times the growth
+    units = 100.0 + np.cumsum(flows / growth)
+    values = np.column_stack([100.0 * growth, units * growth, np.r_[0.0, 0.0, 500.0 * growth[2:] / growth[2]]])
+    flows = np.column_stack([np.zeros(6), flows, np.r_[0.0, 0.0, 500.0, 0.0, 0.0, 0.0]])
+    returns = Analytics.timeWeightedReturns(values, flows)
+    assert returns[:, 0] == pytest.approx(growth - 1)
+    assert returns[:, 1] == pytest.approx(growth - 1)
+    assert returns[:, 2] == pytest.approx(np.r_[0.0, 0.0, 0.0, growth[1:4] - 1])
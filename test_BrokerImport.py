@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the import of Interactive Brokers trades on a synthetic database (see
+conftest.py).
+
+Created on Sun Oct 18 2026
+"""
+
+import csv
+import pandas as pd
+import utils
+from BrokerImport import IBImporter, FLEX_COLUMNS
+from RiskMetrics import RiskEngine
+
+# Writes the trades (tuples of the values of FLEX_COLUMNS) to a Flex query csv at path
+def writeFlex(path, trades):
+    with open(path, "w", newline = "") as file:
+        writer = csv.writer(file)
+        writer.writerow(list(FLEX_COLUMNS))
+        writer.writerows(trades)
+    return str(path)
+
+# Buy of quantity SYN0000 on day for proceeds in its currency
+def buyTrade(db, day, quantity, proceeds):
+    currency = db.getCurrencies(["SYN0000"], db.IB_CURRENCY)[0]
+    return ("STK", currency, "SYN0000", str(day).replace("-", ""), quantity, -proceeds, -1.5, currency)
+
+# The import deletes the risk metrics of the portfolio and of the instruments traded
+# from the first trade onwards, so that the next update computes them again
+def test_importInvalidatesRisk(database, tmp_path):
+    db = database
+    tickers = ["SYN0000", "SYN0001"]
+    RiskEngine(db).update(tickers)
+    day = utils.toDays(utils.DEFAULT_DATE) - 30
+    path = writeFlex(tmp_path / "trades.csv", [buyTrade(db, day, 10, 1000)])
+
+    report = IBImporter(db).importFile(path)
+    assert report["rowsAdded"] == 1
+    risk = db.getRisk(tickers + [utils.PORTFOLIO], utils.MIN_DATE, utils.MAX_DATE)
+    last = risk.groupby(db.IB_TICKER)[db.DATE].max()
+    assert last["SYN0000"] < pd.Timestamp(day) and last[utils.PORTFOLIO] < pd.Timestamp(day)
+    assert last["SYN0001"] >= pd.Timestamp(day)
+
+# Activity statement with two identical stock fills, a closed lot row that is not an
+# order and a forex trade (commission in EUR), on day
+def writeActivity(path, db, day):
+    currency = db.getCurrencies(["SYN0000"], db.IB_CURRENCY)[0]
+    stamp = "{}, 10:15:00".format(day)
+    rows = [["Statement", "Header", "Field Name", "Field Value"],
+            ["Trades", "Header", "DataDiscriminator", "Asset Category", "Currency", "Symbol", "Date/Time", "Quantity", "Proceeds", "Comm/Fee"],
+            ["Trades", "Data", "Order", "Stocks", currency, "SYN0000", stamp, "10", "-1,000.00", "-1.50"],
+            ["Trades", "Data", "Order", "Stocks", currency, "SYN0000", stamp, "10", "-1,000.00", "-1.50"],
+            ["Trades", "Data", "ClosedLot", "Stocks", currency, "SYN0000", stamp, "10", "", ""],
+            ["Trades", "Header", "DataDiscriminator", "Asset Category", "Currency", "Symbol", "Date/Time", "Quantity", "Proceeds", "Comm in EUR"],
+            ["Trades", "Data", "Order", "Forex", "USD", "EUR.USD", stamp, "500", "-550", "-2"]]
+    with open(path, "w", newline = "") as file:
+        csv.writer(file).writerows(rows)
+    return str(path)
+
+# Importing a statement adds its orders once (identical fills included), updates the
+# positions and invalidates the risk metrics. Importing it again adds nothing.
+def test_activityStatementRoundTrip(database, tmp_path):
+    db = database
+    day = utils.toDays(utils.DEFAULT_DATE) - 20
+    date = str(day) + " 00:00:00"
+    RiskEngine(db).update(["SYN0000"])
+    owned = db.getPositions(["SYN0000"], date, date)[db.TOTAL_OWNED].iloc[-1]
+    path = writeActivity(tmp_path / "statement.csv", db, day)
+
+    report = IBImporter(db).importFile(path)
+    assert (report["rowsRead"], report["rowsAdded"], report["duplicates"]) == (3, 3, 0)
+    added = db.getTransactions(["SYN0000", "EUR"], date, date)
+    assert len(added[added[db.INSTRUMENT_BOUGHT] == "SYN0000"]) == 2
+    forex = added[added[db.INSTRUMENT_BOUGHT] == "EUR"].iloc[0]
+    assert (forex[db.QUANTITY_BOUGHT], forex[db.INSTRUMENT_SOLD], forex[db.QUANTITY_SOLD]) == (500, "USD", 550)
+    assert db.getPositions(["SYN0000"], date, date)[db.TOTAL_OWNED].iloc[-1] == owned + 20
+    assert max(db.getLastRiskDates(["SYN0000", utils.PORTFOLIO]).values()) < date
+
+    count = db.getConnection().execute("SELECT count(*) FROM {}".format(db.TRANSACTIONS_TABLE_NAME)).fetchone()[0]
+    report = IBImporter(db).importFile(path)
+    assert (report["rowsAdded"], report["duplicates"]) == (0, 3)
+    assert db.getConnection().execute("SELECT count(*) FROM {}".format(db.TRANSACTIONS_TABLE_NAME)).fetchone()[0] == count
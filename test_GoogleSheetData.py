@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the incremental fetch of the Google Finance sheet, against a local fake
+of the Sheets spreadsheets().values().get API.
+
+Created on Sun Oct 18 2026
+"""
+
+import re
+import numpy as np
+import pandas as pd
+import GoogleSheetData
+from SheetStore import SheetStore, DATE_FORMAT
+
+###############
+## Constants ##
+###############
+SPREADSHEET = "spreadsheet"
+SHEET = "Data"
+DAYS = 40
+
+# In-memory sheet answering spreadsheets().values().get(...).execute() like the
+# Sheets API: rows are lists of strings without their trailing empty cells and
+# the empty rows at the end of the range are left out. The ranges requested
+# are recorded.
+class FakeSheets:
+    def __init__(self, grid):
+        self.grid = grid
+        self.ranges = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range):
+        assert spreadsheetId == SPREADSHEET
+        self.ranges.append(range)
+        return FakeRequest(self._read(range))
+
+    def _read(self, a1):
+        sheet, cells = a1.split("!")
+        assert sheet == SHEET
+        (firstColumn, firstRow), (lastColumn, lastRow) = [re.match(r"([A-Z]*)(\d*)$", cell).groups()
+                                                          for cell in cells.split(":")]
+        first = int(firstRow) - 1 if firstRow else 0
+        last = int(lastRow) if lastRow else len(self.grid)
+        left = columnIndex(firstColumn) if firstColumn else 0
+        right = columnIndex(lastColumn) + 1 if lastColumn else len(self.grid[0])
+        rows = [row[left:right] for row in self.grid[first:last]]
+        rows = [row[:max([i + 1 for i, cell in enumerate(row) if cell != ''], default = 0)] for row in rows]
+        while rows and not rows[-1]:
+            rows.pop()
+        return {"values": rows} if rows else {}
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+# 0-based index of the column with A1 notation letters (A -> 0, AA -> 26)
+def columnIndex(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+# Sheet with a row per day and a column of prices per symbol. The prices are filled
+# up to the filled-th day and the later rows only hold their date, as in the sheet
+# where the GOOGLEFINANCE formulas of the future days are still empty.
+def makeGrid(symbols, filled):
+    days = pd.date_range("2026-01-01", periods = DAYS)
+    grid = [["DATE"] + symbols]
+    for i, day in enumerate(days):
+        prices = ["{:.2f}".format(100 + i + j) if i < filled else '' for j in range(len(symbols))]
+        if i == 3:
+            prices[0] = 'NA'
+        grid.append([day.strftime(DATE_FORMAT)] + prices)
+    return grid
+
+# Store parsed from the whole grid, as a full download would give
+def parseGrid(grid):
+    return SheetStore.fromDataFrame(pd.DataFrame(grid[1:], columns = grid[0]))
+
+def assertSameStore(store, expected):
+    assert store.symbols == expected.symbols
+    np.testing.assert_array_equal(store.dates, expected.dates)
+    np.testing.assert_array_equal(store.prices, expected.prices)
+
+# Without a store the whole sheet is read
+def test_firstFetchReadsWholeSheet():
+    grid = makeGrid(["AMS:IWDP", "LON:EIMI"], 20)
+    service = FakeSheets(grid)
+    store = GoogleSheetData.updateGoogleSheetData(None, SPREADSHEET, SHEET, service)
+    assertSameStore(store, parseGrid(grid))
+    assert service.ranges == ["Data!1:1", "Data!A2:C"]
+
+# With a store only the rows from its last date with prices and the new columns are
+# requested, and the merged store is the same as parsing the whole updated sheet
+def test_updateFetchesTailAndNewColumns():
+    store = parseGrid(makeGrid(["AMS:IWDP", "LON:EIMI"], 20))
+    grid = makeGrid(["AMS:IWDP", "LON:EIMI", "CURRENCY:CHFEUR"], 30)
+    service = FakeSheets(grid)
+    store = GoogleSheetData.updateGoogleSheetData(store, SPREADSHEET, SHEET, service)
+    assertSameStore(store, parseGrid(grid))
+    # Row 21 holds the 20th day, the last one with prices
+    assert service.ranges == ["Data!1:1", "Data!A21:D", "Data!A2:A20", "Data!D2:D20"]
+
+# The store is kept in the cache file between calls, the second call only requests
+# the header and the tail
+def test_cacheIsUpdatedIncrementally(tmp_path):
+    cachePath = str(tmp_path / "googledata.cache.npz")
+    GoogleSheetData.getGoogleSheetCache(cachePath, SPREADSHEET, SHEET, FakeSheets(makeGrid(["AMS:IWDP"], 10)))
+    grid = makeGrid(["AMS:IWDP"], 12)
+    service = FakeSheets(grid)
+    store = GoogleSheetData.getGoogleSheetCache(cachePath, SPREADSHEET, SHEET, service)
+    assertSameStore(store, parseGrid(grid))
+    assertSameStore(SheetStore.load(cachePath), parseGrid(grid))
+    assert service.ranges == ["Data!1:1", "Data!A11:B"]
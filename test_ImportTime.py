@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+Import time budget of the modules used by headless runs (see CheckImportTime.py).
+
+Created on Sun Oct 18 2026
+"""
+
+from CheckImportTime import measureImport, HEADLESS_MODULES, FORBIDDEN_MODULES, IMPORT_BUDGET_MS, REPEAT
+
+# The plotting and provider libraries are only imported when they are used
+def test_headlessImportSkipsHeavyModules():
+    _, imported = measureImport(HEADLESS_MODULES)
+    assert [module for module in FORBIDDEN_MODULES if module in imported] == []
+
+# The fastest of REPEAT imports in a fresh interpreter is within the budget
+def test_headlessImportWithinBudget():
+    fastest = min(measureImport(HEADLESS_MODULES)[0] for _ in range(REPEAT))
+    assert fastest <= IMPORT_BUDGET_MS
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the cost basis lots on a synthetic database (see conftest.py) where the
+transactions are replaced by a small known sequence.
+
+Created on Sun Oct 18 2026
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import utils
+from LotEngine import LotEngine
+
+# Buys of 10 SYN0000 for 1000 EUR and 10 for 1200 EUR, then a sale of 15 for 1950 EUR
+TRADES = [("SYN0000", 10, "EUR", 1000), ("SYN0000", 10, "EUR", 1200), ("EUR", 1950, "SYN0000", 15)]
+# Realized profit of the sale: 1950 - 1600 (FIFO), - 1700 (LIFO), - 15 * 110 (AVERAGE)
+REALIZED = {"FIFO": 350.0, "LIFO": 250.0, "AVERAGE": 300.0}
+# Open lots left (quantity, unit cost)
+LOTS = {"FIFO": [(5, 120.0)], "LIFO": [(5, 100.0)], "AVERAGE": [(5, 110.0)]}
+
+# Writes the trades a week apart, the first one first days after a month ago
+def writeTrades(db, trades, first = 0):
+    days = utils.toDays(utils.DEFAULT_DATE) - 30 + first + 7 * np.arange(len(trades))
+    db.addToDatabase(pd.DataFrame({db.DATE: utils.toDatetimes(days),
+                                   db.INSTRUMENT_BOUGHT: [trade[0] for trade in trades],
+                                   db.QUANTITY_BOUGHT: [float(trade[1]) for trade in trades],
+                                   db.INSTRUMENT_SOLD: [trade[2] for trade in trades],
+                                   db.QUANTITY_SOLD: [float(trade[3]) for trade in trades],
+                                   db.COMMISSION: 0.0}), db.TRANSACTIONS_TABLE_NAME)
+
+# Synthetic database holding only the TRADES
+@pytest.fixture
+def knownTrades(database):
+    database.clearTable(database.TRANSACTIONS_TABLE_NAME)
+    writeTrades(database, TRADES)
+    return database
+
+# Each method realizes the profit of its lots, EUR realizes nothing
+@pytest.mark.parametrize("method", sorted(REALIZED))
+def test_realizedProfitByMethod(knownTrades, method):
+    engine = LotEngine(knownTrades, method)
+    valuation = engine.run(["SYN0000", "EUR"])
+    assert valuation.realized[-1].tolist() == pytest.approx([REALIZED[method], 0.0])
+    lots = engine.getLots(["SYN0000"])
+    assert list(zip(lots["QUANTITY"], lots["UNIT_COST_EUR"])) == pytest.approx(LOTS[method])
+    assert valuation.costBasis[-1, 0] == pytest.approx(5 * LOTS[method][0][1])
+
+# The state saved to json and loaded back continues with the new transactions as a
+# new engine walking the whole history would. A state of another method is not loaded.
+def test_stateReload(knownTrades, tmp_path):
+    db = knownTrades
+    path = str(tmp_path / "lots.json")
+    engine = LotEngine(db, "FIFO")
+    engine.update()
+    engine.save(path)
+    writeTrades(db, [("EUR", 650, "SYN0000", 5)], first = 21)
+
+    loaded = LotEngine(db, "FIFO")
+    assert loaded.load(path)
+    assert loaded.update() == 1
+    fresh = LotEngine(db, "FIFO")
+    fresh.update()
+    pd.testing.assert_frame_equal(loaded.getRealized(), fresh.getRealized())
+    pd.testing.assert_frame_equal(loaded.getLots(), fresh.getLots())
+    assert fresh.getLots(["SYN0000"]).empty
+    assert loaded.getRealized(["SYN0000"])["REALIZED_EUR"].sum() == pytest.approx(350.0 + 5 * (130.0 - 120.0))
+    assert not LotEngine(db, "LIFO").load(path)
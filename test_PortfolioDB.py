@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of PortfolioDB on a synthetic database (see conftest.py).
+
+Created on Sun Oct 18 2026
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import utils
+from PriceStore import PRICE_STORE
+
+# Indexes that the range queries of checkQueryPlans must use
+RANGE_INDEXES = ["IDX_TRANSACTIONS_BOUGHT_DATE", "IDX_TRANSACTIONS_SOLD_DATE",
+                 "IDX_HISTPRICES_TICKER_DATE", "IDX_DIVIDENDS_TICKER_DATE"]
+
+# The range queries of the fact tables search the (ticker, date) indexes
+def test_rangeQueriesUseIndexes(database):
+    plans = database.checkQueryPlans()
+    details = " ".join(plans["detail"])
+    for index in RANGE_INDEXES:
+        assert index in details
+    assert not plans["detail"].str.match(r"SCAN (TABLE )?FACT_").any()
+
+# A range query falling back to a full table scan is reported
+def test_fullScanIsReported(database):
+    database.getConnection().execute("DROP INDEX IDX_TRANSACTIONS_BOUGHT_DATE")
+    with pytest.raises(AssertionError, match = "getTransactions BOUGHT"):
+        database.checkQueryPlans()
+
+# refreshAll fetches the tickers needing prices from a local stand-in provider, a
+# ticker that fails does not stop the others and up to date tickers are not fetched
+def test_refreshAllWithStandInProvider(database):
+    db = database
+    stale = ["SYN0000", "SYN0001", "SYN0002"]
+    cutoff = str(utils.toDays(utils.DEFAULT_DATE) - 30) + " 00:00:00"
+    db.getConnection().execute("DELETE FROM {} WHERE {} in (?, ?, ?) and {} >= ?"
+                               .format(db.HISTORICAL_TABLE_NAME, db.IB_TICKER, db.DATE), stale + [cutoff])
+    PRICE_STORE.invalidate(db.databasePath, stale)
+    calls = {}
+    threads = set()
+
+    # Daily prices of 1 from minDate to today, SYN0001 is unavailable
+    def provider(stockCode, source, minDate, symbol):
+        calls[stockCode] = minDate
+        threads.add(threading.current_thread().name)
+        if stockCode == "SYN0001":
+            raise ConnectionError("provider unavailable")
+        days = np.arange(utils.toDays(minDate), utils.toDays(utils.DEFAULT_DATE) + 1)
+        return pd.DataFrame({db.DATE: utils.toDatetimes(days), db.IB_TICKER: stockCode, db.PRICE: 1.0})
+
+    added, errors = db.refreshAll(stale + ["SYN0003"], maxWorkers = 2, fetcher = provider)
+    assert set(calls) == set(stale)
+    assert all(utils.toDays(minDate) >= utils.toDays(cutoff) - 7 for minDate in calls.values())
+    assert len(threads) <= 2
+    assert set(errors) == {"SYN0001"} and isinstance(errors["SYN0001"], ConnectionError)
+    assert set(added) == {"SYN0000", "SYN0002"} and all(rows > 0 for rows in added.values())
+    prices = db.getPrices(stale, cutoff, utils.DEFAULT_DATE)
+    assert (prices.loc[prices[db.IB_TICKER] != "SYN0001", db.PRICE] == 1.0).all()
+    assert prices.groupby(db.IB_TICKER).size().to_dict() == added
+
+# A currency added to DIM_STOCKS after the currencies were first read is a currency
+# and its cross rates are derived series
+def test_currencyAddedLaterIsKnown(database):
+    db = database
+    assert "JPY" not in db.getCurrencyTickers()
+    db.addToDatabase(pd.DataFrame({db.NAME: ["JPY"], db.IB_TICKER: ["JPY"], db.IB_CURRENCY: ["JPY"]}), db.STOCKS_TABLE_NAME)
+    assert "JPY" in db.getCurrencyTickers()
+    assert db.isDerivedSeries("JPYUSD")
+
+# Prices and rates written after the transactions value the positions as a rebuild
+# from the full history would, for an instrument and for a currency
+def test_pricesWrittenLaterRevaluePositions(database):
+    db = database
+    transactions = db.getTransactions(["SYN0000", "SYN0001", "USD"], utils.MIN_DATE, utils.MAX_DATE, direction = "SOLD")
+    for ticker in ["SYN0000", "USD"]:
+        day = transactions.loc[transactions[db.INSTRUMENT_SOLD] == ticker, db.DATE].iloc[0]
+        prices = db.getPrices([ticker], utils.MIN_DATE, day).tail(1)
+        prices[db.PRICE] *= 2
+        prices[db.DATE] = pd.Timestamp(day[:10])
+        db.addToDatabase(prices, db.HISTORICAL_TABLE_NAME, onConflict = "UPDATE")
+        revalued = db.getPositions(list(db.getCurrencyTickers()) + ["SYN0000", "SYN0001"], utils.MIN_DATE, utils.MAX_DATE)
+        db.rebuildPositions()
+        rebuilt = db.getPositions(list(db.getCurrencyTickers()) + ["SYN0000", "SYN0001"], utils.MIN_DATE, utils.MAX_DATE)
+        pd.testing.assert_frame_equal(revalued, rebuilt)
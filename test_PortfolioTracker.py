@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of Portfolio on a synthetic database (see conftest.py).
+
+Created on Sun Oct 18 2026
+"""
+
+from PortfolioTracker import Portfolio
+from ValueStock import ValueStock
+
+# A portfolio opened on an existing database holds its stocks, with a weighting
+# of 0 until addStock sets it, and values them without any addStock
+def test_stockListFromDatabase(databasePath):
+    portfolio = Portfolio(databasePath[:-len(".db")])
+    codes = [stock.stockCode for stock in portfolio.stockList]
+    assert codes == portfolio.getStockList()
+    assert {"SYN0000", "SYN0004", "EUR"} <= set(codes)
+    assert all(isinstance(stock, ValueStock) and stock.setPercentage == 0 for stock in portfolio.stockList)
+    assert portfolio.getValue() > 0
+
+    stock = portfolio.addStock("SYN0001", 40, updateData = False)
+    assert [stock.stockCode for stock in portfolio.stockList] == codes
+    assert portfolio.stockList[codes.index("SYN0001")] is stock and stock.setPercentage == 40
+    portfolio.stockDatabase.close()
+
+# A new database has no stocks until they are added
+def test_newDatabaseIsEmpty(tmp_path):
+    portfolio = Portfolio(str(tmp_path / "empty"))
+    assert portfolio.stockList == []
+    portfolio.stockDatabase.close()
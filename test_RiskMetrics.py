@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the incremental updates of FACT_RISK on a synthetic database (see
+conftest.py).
+
+Created on Sun Oct 18 2026
+"""
+
+import numpy as np
+import pandas as pd
+import utils
+from RiskMetrics import RiskEngine
+
+# Instruments of the synthetic database (the currencies are left out)
+def syntheticTickers(db):
+    return [ticker for (ticker,) in db.getConnection().execute(
+        "SELECT {} FROM {} WHERE {} LIKE 'SYN%' ORDER BY 1".format(db.IB_TICKER, db.STOCKS_TABLE_NAME, db.IB_TICKER))]
+
+# Whole FACT_RISK of the tickers and of the portfolio
+def storedRisk(db, tickers):
+    return db.getRisk(tickers + [utils.PORTFOLIO], utils.MIN_DATE, utils.MAX_DATE)
+
+# Updates resuming each series from its own last day store the same rows as a backfill
+def test_incrementalUpdateEqualsBackfill(database):
+    db = database
+    tickers = syntheticTickers(db)
+    engine = RiskEngine(db)
+    engine.update(tickers)
+    backfill = storedRisk(db, tickers)
+    assert backfill[["VOLATILITY", "MAX_DRAWDOWN"]].notna().any().all()
+    last = backfill[db.DATE].max()
+
+    db.invalidateRisk(None)
+    engine.update(tickers, str((last - pd.Timedelta(days = 40)).date()))
+    # One ticker (and the portfolio) now stops earlier than the others
+    db.invalidateRisk([tickers[1]], str((last - pd.Timedelta(days = 80)).date()))
+    lastDates = db.getLastRiskDates(tickers + [utils.PORTFOLIO])
+    assert len(set(lastDates.values())) == 2
+    added = engine.update(tickers)
+
+    incremental = storedRisk(db, tickers)
+    pd.testing.assert_frame_equal(incremental, backfill, rtol = 1e-7)
+    # Only the days after the last one of each series are written
+    assert added == sum(np.sum(backfill[db.IB_TICKER].values == name) - len(db.getRisk([name], utils.MIN_DATE, date))
+                        for name, date in lastDates.items())
+    assert engine.update(tickers) == 0
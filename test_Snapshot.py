@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the columnar snapshot on a synthetic database (see conftest.py).
+
+Created on Sun Oct 18 2026
+"""
+
+import pytest
+import utils
+from PortfolioDB import PortfolioDB
+from Snapshot import Snapshot, PRICES_FILE, DIVIDENDS_FILE, TRANSACTIONS_FILE
+
+pytest.importorskip("pyarrow")
+
+# sync picks up the rows revised in place by another process, which leave the row
+# counts and last dates unchanged, and nothing else
+def test_syncDetectsRevisionsInPlace(database, databasePath, tmp_path):
+    db = database
+    path = str(tmp_path / "portfolio.snapshot")
+    db.useSnapshot(path)
+    assert Snapshot(db, path).sync() == {PRICES_FILE: [], DIVIDENDS_FILE: [], TRANSACTIONS_FILE: False}
+
+    other = PortfolioDB(databasePath, None)
+    conn = other.getConnection()
+    day = conn.execute("SELECT min(DATE) FROM FACT_HISTPRICES WHERE IB_TICKER = 'SYN0001'").fetchone()[0]
+    conn.execute("UPDATE FACT_HISTPRICES SET PRICE = PRICE + 1 WHERE IB_TICKER = 'SYN0001' and DATE = ?", [day])
+    ticker, dividendDay = conn.execute("SELECT IB_TICKER, min(DIVIDEND_DATE) FROM FACT_DIVIDENDS").fetchone()
+    conn.execute("UPDATE FACT_DIVIDENDS SET DIVIDEND_AMOUNT = DIVIDEND_AMOUNT * 2 WHERE DIVIDEND_DATE = ?", [dividendDay])
+    # The last transaction replaced by another one with the same id
+    last = conn.execute("SELECT * FROM FACT_TRANSACTIONS ORDER BY TRANSACTION_ID DESC LIMIT 1").fetchone()
+    conn.execute("DELETE FROM FACT_TRANSACTIONS WHERE TRANSACTION_ID = ?", [last[0]])
+    conn.execute("INSERT INTO FACT_TRANSACTIONS VALUES (?, ?, ?, ?, ?, ?, ?)", list(last[:3]) + [last[3] + 1] + list(last[4:]))
+    other.close()
+
+    snapshot = Snapshot(db, path)
+    refreshed = snapshot.sync()
+    assert refreshed[PRICES_FILE] == ["SYN0001"]
+    assert ticker in refreshed[DIVIDENDS_FILE]
+    assert refreshed[TRANSACTIONS_FILE]
+    dates, prices = snapshot.readPrices(["SYN0001"], day, day)["SYN0001"]
+    assert utils.toDays(dates[0]) == utils.toDays(day)
+    assert prices[0] == db.getConnection().execute(
+        "SELECT PRICE FROM FACT_HISTPRICES WHERE IB_TICKER = 'SYN0001' and DATE = ?", [day]).fetchone()[0]
+    transactions = snapshot.readTransactions()
+    assert transactions[db.QUANTITY_BOUGHT].iloc[-1] == last[3] + 1
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of Stock on a synthetic database (see conftest.py).
+
+Created on Sun Oct 18 2026
+"""
+
+import utils
+from Stock import Stock
+from BrokerImport import IBImporter
+from test_BrokerImport import writeFlex, buyTrade
+
+# Point-in-time totals of a stock
+def totals(stock):
+    return stock.getOwned(), stock.getSpent(), stock.getPricePaid(), stock.getDividend()
+
+# The totals of a stock read before a write equal those of a new Stock after it,
+# whatever made the write
+def test_eventsFollowWritesOfOtherObjects(database, tmp_path):
+    db = database
+    currency = db.getCurrencies(["SYN0000"], db.IB_CURRENCY)[0]
+    cash = Stock(currency, db, updateData = False)
+    stock = Stock("SYN0000", db, updateData = False)
+    before = totals(cash), totals(stock)
+    day = str(utils.toDays(utils.DEFAULT_DATE) - 10) + " 00:00:00"
+
+    # The other leg of a purchase made through another Stock
+    Stock("SYN0000", db, updateData = False).buy(3, currency, 300, 1.5, day)
+    assert cash.getOwned() == before[0][0] - 300
+    assert totals(cash) == totals(Stock(currency, db, updateData = False))
+    assert totals(stock) == totals(Stock("SYN0000", db, updateData = False))
+
+    db.removeTransaction(day, "SYN0000", 3, currency, 300)
+    assert (totals(cash), totals(stock)) == before
+
+    IBImporter(db).importFile(writeFlex(tmp_path / "trades.csv", [buyTrade(db, day[:10], 5, 500)]))
+    assert stock.getOwned() == before[1][0] + 5
+    assert totals(cash) == totals(Stock(currency, db, updateData = False))
+
+# The price paid and commissions over a range, started mid history, end on the
+# point-in-time totals
+def test_pricePaidRangeMatchesTotals(database):
+    stock = Stock("SYN0000", database, updateData = False)
+    start = str(utils.toDays(utils.DEFAULT_DATE) - 120) + " 00:00:00"
+    end = str(utils.toDays(utils.DEFAULT_DATE) - 1) + " 00:00:00"
+    assert stock.getPricePaidRange(start, end)['PRICEPAID_EUR_CUMSUM'].iloc[-1] == stock.getPricePaid(end)
+    assert stock.getCommissionsRange(start, end)['COMMISSION_EUR_CUMSUM'].iloc[-1] == stock.getCommissions(end)
+
+# The profit & loss on a day that is not a session is the one of the last session before it
+def test_profitsLossesOnWeekend(database):
+    stock = Stock("SYN0000", database, updateData = False)
+    today = utils.toDays(utils.DEFAULT_DATE)
+    saturday = today - 7 - (today.astype(int) - 2) % 7
+    friday = str(saturday - 1) + " 00:00:00"
+    assert stock.Profits_Losses(str(saturday) + " 00:00:00") == stock.Profits_Losses(friday)
+    assert stock.Profits_Losses(friday) == stock.Profits_LossesRange(endDate = friday)["P_L"].iloc[-1]
@@ -13,6 +13,7 @@ import utils
 from datetime import datetime, date
 from GoogleSheetData import getGoogleSheetData
 import GoogleSheetData 
+from SheetStore import SheetStore
 
 databasePath = "MyPortfolio.db"
 
@@ -21,7 +22,8 @@ DEFAULT_STARTDATE = "2020-01-01 00:00:00" #"1975-01-01 00:00:00"
 
 #googledatatable = getGoogleSheetData(GoogleSheetData.SAMPLE_SPREADSHEET_ID, GoogleSheetData.SAMPLE_RANGE_NAME)
 #googledatatable.to_csv("C:/Users/feder/Google Drive/Work/Portfolio Tracker/Code Repo/googledata.csv", header = True, index = False)
-googledatatable = pd.read_csv("C:/Users/feder/Google Drive/Work/Portfolio Tracker/Code Repo/googledata.csv")
+# Parsed once, then read from the googledata.csv.cache.npz file until the csv changes
+googledatatable = SheetStore.fromCSV("C:/Users/feder/Google Drive/Work/Portfolio Tracker/Code Repo/googledata.csv")
 MyPortfolioDB = PortfolioDB(databasePath, googledatatable)
 
 CHF = Stock("CHF", MyPortfolioDB)
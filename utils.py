@@ -7,12 +7,21 @@ Created on Fri Mar  6 16:40:36 2020
 
 
 from datetime import date, timedelta, datetime
+import numpy as np
+import pandas as pd
 
 DEFAULT_DATE = str(date.today())+ " 00:00:00"
 DEFAULT_STARTDATE = "2020-01-01 00:00:00" #"1975-01-01 00:00:00"
+MIN_DATE = "0001-01-01 00:00:00" # open ended date ranges
+MAX_DATE = "9999-12-31 00:00:00"
+PORTFOLIO = "Portfolio" # ticker of the total of all the holdings (returnsSummary, FACT_RISK)
 
 datasource = "GOOGLEFINANCE"
 
+# dtype of the dates parsed by pandas (pd.to_datetime, pd.date_range), so that
+# dates built from numpy arrays can be merged with them
+DATETIME_DTYPE = pd.date_range(DEFAULT_STARTDATE, periods = 1).dtype
+
 # Converts a date in "yyyy-mm-dd" format to a dateTime object
 def convertDate(dateString):
    return datetime.strptime(dateString, '%Y-%m-%d %H:%M:%S')
@@ -27,4 +36,30 @@ def incrementDate(dateString):
         datePlus = dateTime + timedelta(3)
     else:
         datePlus = dateTime + timedelta(1)
-    return str(datePlus)
\ No newline at end of file
+    return str(datePlus)
+
+# Converts a date string ("yyyy-mm-dd" optionally followed by the time), or an array
+# of them, to numpy datetime64[D] days. Datetime objects are accepted as well.
+def toDays(dates):
+    if isinstance(dates, str):
+        return np.datetime64(dates[:10], 'D')
+    if isinstance(dates, (datetime, date, np.datetime64)):
+        return np.datetime64(dates, 'D')
+    dates = np.asarray(dates)
+    if dates.dtype.kind in ('U', 'S', 'O'):
+        return np.array([str(d)[:10] for d in dates], dtype = 'datetime64[D]')
+    return dates.astype('datetime64[D]')
+
+# Forward fills the NaN values of a 1-D or 2-D array along the first axis (dates).
+# Leading NaN values, before the first available value, are left as NaN.
+def forwardFill(values):
+    values = np.asarray(values, dtype = float)
+    rows = np.arange(values.shape[0]).reshape((-1,) + (1,) * (values.ndim - 1))
+    index = np.where(np.isnan(values), 0, rows)
+    np.maximum.accumulate(index, axis = 0, out = index)
+    filled = np.take_along_axis(values, index, axis = 0)
+    return filled
+
+# Converts an array of datetime64[D] days to pandas dates with DATETIME_DTYPE
+def toDatetimes(days):
+    return np.asarray(days, dtype = 'datetime64[D]').astype(DATETIME_DTYPE)